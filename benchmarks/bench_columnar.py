@@ -0,0 +1,114 @@
+"""
+Columnar snapshot benchmark.
+
+Writes synthetic `Attendee` records to a columnar snapshot, then measures opening it,
+reading records by object id and by position, and summing a numeric column,
+against decoding the same records from NDJSON.
+
+Run from the repository root:
+    python -m benchmarks.bench_columnar
+    python -m benchmarks.bench_columnar --records 200000
+    python -m benchmarks.bench_columnar --save-baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.bench_memory import attendee
+from benchmarks.common import compare, load_baseline, save_baseline
+from fuzion.columnar import ColumnarSnapshot, ColumnarWriter
+from fuzion.sinks import encode_ndjson
+
+BASELINE = "columnar"
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def run(records, lookups):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "attendees.fzc")
+    ndjson_path = os.path.join(directory, "attendees.ndjson")
+
+    data = [attendee(i) for i in range(records)]
+    with open(ndjson_path, "wb") as f:
+        f.write(encode_ndjson(data))
+
+    def write():
+        writer = ColumnarWriter(path, object_id_attr_name="fuzion_attendee_id")
+        writer.add_many(data)
+        writer.close()
+
+    _, write_time = timed(write)
+    del data
+
+    def load_ndjson():
+        with open(ndjson_path) as f:
+            return [json.loads(line) for line in f]
+
+    _, ndjson_time = timed(load_ndjson)
+
+    snapshot, open_time = timed(ColumnarSnapshot, path)
+
+    ids = ["{:032X}".format(random.randrange(records)) for _ in range(lookups)]
+    _, get_time = timed(lambda: [snapshot.get(object_id) for object_id in ids])
+
+    rows = [random.randrange(records) for _ in range(lookups)]
+    _, record_time = timed(lambda: [snapshot[row] for row in rows])
+
+    _, sum_time = timed(lambda: sum(snapshot.column("attendee_type_flag").raw))
+
+    results = {
+        "write_s": write_time,
+        "open_ms": open_time * 1000,
+        "get_us": get_time / lookups * 1e6,
+        "record_us": record_time / lookups * 1e6,
+        "column_sum_ms": sum_time * 1000,
+        "ndjson_load_ms": ndjson_time * 1000,
+        "file_bytes_per_record": os.path.getsize(path) / records,
+        "ndjson_bytes_per_record": os.path.getsize(ndjson_path) / records,
+    }
+
+    snapshot.close()
+    os.remove(path)
+    os.remove(ndjson_path)
+    os.rmdir(directory)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar snapshot benchmark")
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    results = {"attendees": run(args.records, args.lookups)}
+
+    if args.save_baseline:
+        save_baseline(BASELINE, results)
+
+    regressions = compare(
+        results,
+        load_baseline(BASELINE),
+        lower_is_better=("open_ms", "get_us", "record_us", "column_sum_ms", "file_bytes_per_record"),
+        threshold=args.threshold,
+    )
+    if args.check and regressions:
+        for benchmark, metric, base, value in regressions:
+            print("REGRESSION {} {}: {:.1f} -> {:.1f}".format(benchmark, metric, base, value))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
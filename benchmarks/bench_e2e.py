@@ -0,0 +1,148 @@
+"""
+End-to-end benchmarks against the in-process fake Fuzion server (`fuzion.fake_server`).
+
+Measures the whole client path (signing, transport, envelope parsing and object construction)
+for single page queries, full pagination, bulk writes and sub-resource fan-out,
+reporting throughput and latency and comparing them with the stored baseline.
+
+Run from the repository root:
+    python -m benchmarks.bench_e2e
+    python -m benchmarks.bench_e2e --latency 0.02 --rate-limit-every 50
+    python -m benchmarks.bench_e2e --save-baseline
+    python -m benchmarks.bench_e2e --check  # exits with 1 on regressions
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import compare, load_baseline, percentile, save_baseline
+from fuzion import Attendee, Exhibitor
+from fuzion.exceptions import FuzionError
+from fuzion.fake_server import FakeFuzionServer
+
+BASELINE = "e2e"
+
+
+def timed_calls(calls, concurrency):
+    """
+    Runs the callables, `concurrency` at a time.
+    Returns the wall time, the sorted latencies and the number of failed calls
+    """
+    latencies = []
+    errors = []
+
+    def run(call):
+        started = time.perf_counter()
+        try:
+            call()
+        except FuzionError:
+            errors.append(1)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run, calls))
+    return time.perf_counter() - started, sorted(latencies), len(errors)
+
+
+def summarize(wall, latencies, errors, items=None):
+    result = {
+        "throughput_rps": len(latencies) / wall,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p95_ms": percentile(latencies, 95) * 1000,
+        "errors": errors,
+    }
+    if items is not None:
+        result["records_per_s"] = items / wall
+    return result
+
+
+def bench_query(server, args):
+    attendees = server.resource(Attendee)
+    calls = [lambda: list(attendees.query(page_size=args.page_size))] * args.calls
+    return summarize(*timed_calls(calls, args.concurrency))
+
+
+def bench_pagination(server, args):
+    attendees = server.resource(Attendee)
+    counts = []
+
+    def paginate():
+        counts.append(len(attendees.query_all(page_size=args.page_size)))
+
+    wall, latencies, errors = timed_calls([paginate] * args.repeat, 1)
+    return summarize(wall, latencies, errors, items=sum(counts))
+
+
+def bench_bulk_writes(server, args):
+    attendees = server.resource(Attendee)
+    calls = [
+        (lambda i=i: attendees.post(registration_number="RN-NEW-{}".format(i), contact={"first_name": "A"}))
+        for i in range(args.calls)
+    ]
+    return summarize(*timed_calls(calls, args.concurrency))
+
+
+def bench_fan_out(server, args):
+    exhibitors = server.resource(Exhibitor).query_all(page_size=args.page_size)
+    calls = [(lambda contacts=exhibitor.contacts: list(contacts.query())) for exhibitor in exhibitors]
+    return summarize(*timed_calls(calls, args.concurrency))
+
+
+BENCHMARKS = {
+    "query": bench_query,
+    "pagination": bench_pagination,
+    "bulk_writes": bench_bulk_writes,
+    "sub_resource_fan_out": bench_fan_out,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks against a fake Fuzion server")
+    parser.add_argument("--records", type=int, default=5000, help="objects per top level path")
+    parser.add_argument("--sub-records", type=int, default=5, help="objects per sub-resource path")
+    parser.add_argument("--record-size", type=int, default=200, help="bytes of free text per object")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0, help="server latency in seconds")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="inject a 429 every n requests")
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--only", choices=sorted(BENCHMARKS), action="append")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    with FakeFuzionServer(
+        records=args.records,
+        sub_records=args.sub_records,
+        record_size=args.record_size,
+        latency=args.latency,
+        max_page_size=args.page_size,
+        rate_limit_every=args.rate_limit_every,
+    ) as server:
+        for name in args.only or BENCHMARKS:
+            results[name] = BENCHMARKS[name](server, args)
+
+    if args.save_baseline:
+        save_baseline(BASELINE, results)
+
+    regressions = compare(
+        results,
+        load_baseline(BASELINE),
+        higher_is_better=("throughput_rps", "records_per_s"),
+        lower_is_better=("latency_p50_ms", "latency_p95_ms"),
+        threshold=args.threshold,
+    )
+    if args.check and regressions:
+        for benchmark, metric, base, value in regressions:
+            print("REGRESSION {} {}: {:.4f} -> {:.4f}".format(benchmark, metric, base, value))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
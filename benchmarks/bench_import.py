@@ -0,0 +1,80 @@
+"""
+Import-time benchmark with a budget check.
+
+Measures, in fresh interpreters, the time to `import fuzion` and to get a single resource
+class (`from fuzion import Attendee`), and verifies neither imports `requests`.
+Exits with 1 if the median time is over `--budget-ms` or `requests` was imported.
+
+Run from the repository root:
+    python -m benchmarks.bench_import
+    python -m benchmarks.bench_import --budget-ms 30 --runs 20
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import compare, load_baseline, save_baseline
+
+BASELINE = "import"
+
+SCENARIOS = {
+    "import_fuzion": "import fuzion",
+    "from_fuzion_import_attendee": "from fuzion import Attendee",
+}
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"elapsed": elapsed, "requests_imported": "requests" in sys.modules}}))
+"""
+
+
+def measure(statement, runs):
+    timings = []
+    requests_imported = False
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, "-c", PROBE.format(statement=statement)]
+        )
+        result = json.loads(output)
+        timings.append(result["elapsed"])
+        requests_imported = requests_imported or result["requests_imported"]
+    return statistics.median(timings) * 1000, requests_imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time benchmark with a budget check")
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    failures = []
+    for name, statement in SCENARIOS.items():
+        median_ms, requests_imported = measure(statement, args.runs)
+        results[name] = {"median_ms": median_ms}
+        if median_ms > args.budget_ms:
+            failures.append("{} took {:.1f}ms, over the {:.1f}ms budget".format(name, median_ms, args.budget_ms))
+        if requests_imported:
+            failures.append("{} imported requests".format(name))
+
+    if args.save_baseline:
+        save_baseline(BASELINE, results)
+
+    compare(results, load_baseline(BASELINE), lower_is_better=("median_ms",), threshold=args.threshold)
+
+    if failures:
+        for failure in failures:
+            print("OVER BUDGET " + failure)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
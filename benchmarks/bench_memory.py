@@ -0,0 +1,190 @@
+"""
+Memory profile of large query results.
+
+Builds synthetic response pages of realistic `Attendee`, `Exhibitor` and `Transaction` records,
+runs them through `process_response` -> `process_payload` under tracemalloc and reports,
+per record, the peak and retained bytes and the number of allocated blocks.
+Compares with the stored baseline like the other benchmarks.
+
+Run from the repository root:
+    python -m benchmarks.bench_memory
+    python -m benchmarks.bench_memory --page-size 5000 --resource Attendee
+    python -m benchmarks.bench_memory --save-baseline
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+
+from benchmarks.common import compare, load_baseline, save_baseline
+from fuzion import Attendee, Exhibitor, Transaction
+
+BASELINE = "memory"
+
+TIMESTAMP = "2017-01-06T16:43:12.000Z"
+
+
+def attendee(i):
+    return {
+        "fuzion_attendee_id": "{:032X}".format(i),
+        "registration_number": "RN{:08d}".format(i),
+        "registration_status_flag": i % 4,
+        "registration_type": "Full Conference",
+        "attendee_type_flag": i % 3,
+        "contact": {
+            "prefix": "Dr.",
+            "first_name": "First{}".format(i),
+            "last_name": "Last{}".format(i),
+            "job_title": "Director of Engineering",
+            "company": "Company {}".format(i % 500),
+            "email": "attendee{}@example.com".format(i),
+            "phone": "+1 555 {:07d}".format(i),
+        },
+        "address": {
+            "line_1": "{} Main Street".format(i),
+            "city": "Springfield",
+            "state": "IL",
+            "postal_code": "62701",
+            "country": "US",
+        },
+        "custom_attributes": '{"badge_color":"blue","dietary":"none"}',
+        "last_mod_timestamp": TIMESTAMP,
+        "create_timestamp": TIMESTAMP,
+    }
+
+
+def exhibitor(i):
+    return {
+        "fuzion_exhibitor_id": "{:032X}".format(i),
+        "exhibitor_name": "Exhibitor {}".format(i),
+        "exhibitor_description": "Makers of fine products since {}. ".format(1900 + i % 100) * 4,
+        "website_url": "https://exhibitor{}.example.com".format(i),
+        "email": "info@exhibitor{}.example.com".format(i),
+        "phone": "+1 555 {:07d}".format(i),
+        "exhibitor_status_flag": i % 2,
+        "custom_attributes": '{"tier":"gold"}',
+        "last_mod_timestamp": TIMESTAMP,
+        "create_timestamp": TIMESTAMP,
+    }
+
+
+def transaction(i):
+    return {
+        "fuzion_transaction_id": "{:032X}".format(i),
+        "fuzion_attendee_id": "{:032X}".format(i // 3),
+        "option_code": "OPT{}".format(i % 40),
+        "transaction_type_flag": i % 2,
+        "quantity": 1 + i % 3,
+        "amount": round(99.5 + i % 400, 2),
+        "currency": "USD",
+        "payment_method": "credit_card",
+        "transaction_timestamp": TIMESTAMP,
+        "last_mod_timestamp": TIMESTAMP,
+        "create_timestamp": TIMESTAMP,
+    }
+
+
+RESOURCES = {
+    "Attendee": (Attendee, attendee),
+    "Exhibitor": (Exhibitor, exhibitor),
+    "Transaction": (Transaction, transaction),
+}
+
+
+class PageResponse:
+    """
+    Stands in for `requests.Response`, decoding the body on `json()` as requests does
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.request = None
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def page_content(generate, page_size):
+    return json.dumps(
+        {
+            "type": "json",
+            "build": "0.1.8",
+            "status": 200,
+            "reason": 0,
+            "message": "Request was successful",
+            "error": False,
+            "date": "2018-01-15 14:30:32.123 EST",
+            "page_size": page_size,
+            "start": 0,
+            "total_count": page_size,
+            "payload": [generate(i) for i in range(page_size)],
+        }
+    ).encode("UTF-8")
+
+
+def profile(resource_class, generate, page_size):
+    resource = resource_class("EV1", api_key="key", api_secret_key="secret_key")
+    response = PageResponse(page_content(generate, page_size))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    baseline_current, _ = tracemalloc.get_traced_memory()
+
+    # the `ResultList` builds its objects on access, listing it builds them all
+    objects = list(resource.process_payload(resource.process_response(response)))
+
+    current, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    blocks = sum(
+        stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0
+    )
+    assert len(objects) == page_size
+    return {
+        "body_bytes_per_record": len(response.content) / page_size,
+        "peak_bytes_per_record": (peak - baseline_current) / page_size,
+        "retained_bytes_per_record": (current - baseline_current) / page_size,
+        "allocations_per_record": blocks / page_size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory profile of large query results")
+    parser.add_argument("--page-size", type=int, default=2000)
+    parser.add_argument("--resource", choices=sorted(RESOURCES), action="append")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.resource or RESOURCES:
+        resource_class, generate = RESOURCES[name]
+        results[name] = profile(resource_class, generate, args.page_size)
+
+    if args.save_baseline:
+        save_baseline(BASELINE, results)
+
+    regressions = compare(
+        results,
+        load_baseline(BASELINE),
+        lower_is_better=(
+            "peak_bytes_per_record",
+            "retained_bytes_per_record",
+            "allocations_per_record",
+        ),
+        threshold=args.threshold,
+    )
+    if args.check and regressions:
+        for benchmark, metric, base, value in regressions:
+            print("REGRESSION {} {}: {:.1f} -> {:.1f}".format(benchmark, metric, base, value))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
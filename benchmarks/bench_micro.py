@@ -0,0 +1,104 @@
+"""
+Micro-benchmarks of the code that runs on every request and for every returned record:
+`extract_options`, `_get_general_request_header`, `_generate_partner_app_signature`,
+`Resource.new` and `SubResource.__init__`.
+
+Every benchmark reports the best per-operation time over several repeats and is compared
+with the stored baseline, `--check` exits with 1 when one is slower by more than `--threshold`.
+
+Run from the repository root:
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro --save-baseline
+    python -m benchmarks.bench_micro --check --threshold 0.15
+"""
+
+import argparse
+import sys
+import timeit
+
+from benchmarks.common import compare, load_baseline, save_baseline
+from fuzion import Attendee, Exhibitor
+
+BASELINE = "micro"
+
+
+def attendee_records(count):
+    return [
+        {
+            "fuzion_attendee_id": "A{}".format(i),
+            "registration_number": "RN{}".format(i),
+            "registration_status_flag": 1,
+            "contact": {"first_name": "First", "last_name": "Last", "email": "a{}@example.com".format(i)},
+            "custom_attributes": '{"badge":"blue"}',
+            "last_mod_timestamp": "2017-01-06T16:43:12.000Z",
+            "create_timestamp": "2017-01-06T16:43:12.000Z",
+        }
+        for i in range(count)
+    ]
+
+
+def build_benchmarks():
+    attendee = Attendee("EV1", api_key="key", api_secret_key="secret_key", host="fuzionapi.com/v1/")
+    exhibitor = Exhibitor(
+        "EV1", api_key="key", api_secret_key="secret_key", fuzion_exhibitor_id="E1"
+    )
+    values = {"registration_status_flag": 1, "fuzion_attendee_id": ["A1", "A2", "A3"]}
+    page = attendee_records(500)
+
+    # name: (callable, operations per call)
+    return {
+        "extract_options": (lambda: attendee.extract_options("attendees", "GET", values), 1),
+        "get_general_request_header": (
+            lambda: attendee._get_general_request_header("attendees", "GET"),
+            1,
+        ),
+        "generate_partner_app_signature": (
+            lambda: attendee._generate_partner_app_signature(1539596918424, "attendees", "GET"),
+            1,
+        ),
+        "resource_new_single": (lambda: Attendee.new("EV1", page[0], api_key="key"), 1),
+        # `new` builds the objects of a page lazily, iterating the result builds them all
+        "resource_new_page_of_500": (
+            lambda: list(Attendee.new("EV1", page, api_key="key", api_secret_key="secret_key")),
+            500,
+        ),
+        "subresource_init": (lambda: exhibitor.contacts, 1),
+    }
+
+
+def run(benchmark, operations, repeat, min_time):
+    timer = timeit.Timer(benchmark)
+    number, _ = timer.autorange()
+    number = max(number, int(number * min_time / 0.2))
+    best = min(timer.repeat(repeat=repeat, number=number))
+    return best / number / operations * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the request building hot paths")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat, roughly")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true")
+    args = parser.parse_args()
+
+    results = {
+        name: {"ns_per_op": run(benchmark, operations, args.repeat, args.min_time)}
+        for name, (benchmark, operations) in build_benchmarks().items()
+    }
+
+    if args.save_baseline:
+        save_baseline(BASELINE, results)
+
+    regressions = compare(
+        results, load_baseline(BASELINE), lower_is_better=("ns_per_op",), threshold=args.threshold
+    )
+    if args.check and regressions:
+        for benchmark, metric, base, value in regressions:
+            print("REGRESSION {} {}: {:.1f} -> {:.1f}".format(benchmark, metric, base, value))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Load benchmark for `fuzion.receiver.WebhookReceiver`.
+
+A local fake sender opens `--connections` keep-alive connections and POSTs
+`--requests` notification deliveries over them, as fast as the receiver acknowledges.
+Reports the acknowledgement throughput and latency percentiles and the end-to-end
+time until the consumer received every event.
+
+Run from the repository root:
+    python -m benchmarks.bench_receiver --requests 20000 --connections 50
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from benchmarks.common import percentile
+from fuzion.receiver import WebhookReceiver
+
+
+async def send(port, count, latencies, statuses):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for i in range(count):
+        body = json.dumps(
+            {
+                "entity_type": "attendee",
+                "entity_operation": "update",
+                "fuzion_attendee_id": "A{}".format(i),
+            }
+        ).encode("utf-8")
+        request = (
+            "POST /fuzion/notifications/ HTTP/1.1\r\n"
+            "Host: 127.0.0.1\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: {}\r\n\r\n".format(len(body))
+        ).encode("latin-1") + body
+
+        started = time.perf_counter()
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b""):
+            pass
+        latencies.append(time.perf_counter() - started)
+        status = int(status_line.split()[1])
+        statuses[status] = statuses.get(status, 0) + 1
+
+    writer.close()
+
+
+async def main(args):
+    received = []
+    done = asyncio.Event()
+
+    def consumer(events):
+        received.extend(events)
+        if len(received) >= args.requests:
+            loop.call_soon_threadsafe(done.set)
+
+    loop = asyncio.get_running_loop()
+    receiver = WebhookReceiver(
+        consumer,
+        port=0,
+        max_queue_size=args.queue_size,
+        batch_size=args.batch_size,
+    )
+    await receiver.start()
+
+    per_connection = args.requests // args.connections
+    total = per_connection * args.connections
+    args.requests = total
+    latencies = []
+    statuses = {}
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(send(receiver.port, per_connection, latencies, statuses) for _ in range(args.connections))
+    )
+    acked = time.perf_counter() - started
+    await asyncio.wait_for(done.wait(), timeout=60)
+    consumed = time.perf_counter() - started
+    await receiver.stop()
+
+    latencies.sort()
+    print("deliveries:       {}".format(total))
+    print("statuses:         {}".format(statuses))
+    print("ack throughput:   {:.0f} req/s".format(total / acked))
+    print("ack latency p50:  {:.3f} ms".format(percentile(latencies, 50) * 1000))
+    print("ack latency p95:  {:.3f} ms".format(percentile(latencies, 95) * 1000))
+    print("ack latency p99:  {:.3f} ms".format(percentile(latencies, 99) * 1000))
+    print("consumed in:      {:.3f} s ({:.0f} events/s)".format(consumed, len(received) / consumed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,63 @@
+"""
+Helpers shared by the benchmark scripts: percentiles, stored baselines and regression checks.
+
+Baselines are JSON files under `benchmarks/baselines/`, mapping every benchmark to its metrics.
+They are machine specific, re-record them (`--save-baseline`) on the machine that runs the checks.
+"""
+
+import json
+import os
+
+BASELINES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def baseline_path(name):
+    return os.path.join(BASELINES_DIR, name + ".json")
+
+
+def load_baseline(name):
+    path = baseline_path(name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(name, results):
+    os.makedirs(BASELINES_DIR, exist_ok=True)
+    with open(baseline_path(name), "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(results, baseline, higher_is_better=(), lower_is_better=(), threshold=0.1):
+    """
+    Prints every metric next to its baseline.
+    Returns the list of regressions: metrics that got worse than the baseline by more than `threshold`
+    """
+    regressions = []
+    for benchmark, metrics in sorted(results.items()):
+        for metric, value in sorted(metrics.items()):
+            base = (baseline or {}).get(benchmark, {}).get(metric)
+            if not base:
+                print("{:<40} {:<22} {:>14.4f}".format(benchmark, metric, value))
+                continue
+
+            change = (value - base) / base
+            print(
+                "{:<40} {:<22} {:>14.4f}  baseline {:>14.4f}  {:+7.1%}".format(
+                    benchmark, metric, value, base, change
+                )
+            )
+            if metric in higher_is_better and change < -threshold:
+                regressions.append((benchmark, metric, base, value))
+            elif metric in lower_is_better and change > threshold:
+                regressions.append((benchmark, metric, base, value))
+    return regressions
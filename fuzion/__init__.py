@@ -41,22 +41,60 @@ exhibitor.booths.delete_relationship(fuzion_booth_id="B456")
 @author: Gabriel Amram, VP R&D @ Everthere.co
 """
 
+import importlib
 import os
-from fuzion.registration import Attendee, Option, Survey, Transaction
-from fuzion.abstract import (
-    Abstract,
-    AbstractAffiliation,
-    AbstractDisclosure,
-    AbstractPoster,
-    AbstractResource,
-)
-from fuzion.exhibitor import Booth, Exhibitor, ExhibitorProduct, ThirdParty
-from fuzion.floor_plan import FloorPlan, FloorPlanObject, Plot, PlotCategory, PlotType
-from fuzion.notification_webhook import NotificationWebhook
-from fuzion.error_webhook import ErrorWebhook
-from fuzion.resource import Resource
+
+# Public classes and the module they live in.
+# They are imported on first access, so importing the package stays cheap
+# and only the resource modules actually used are loaded
+_LAZY_ATTRIBUTES = {
+    "Attendee": "fuzion.registration",
+    "Option": "fuzion.registration",
+    "Survey": "fuzion.registration",
+    "Transaction": "fuzion.registration",
+    "Abstract": "fuzion.abstract",
+    "AbstractAffiliation": "fuzion.abstract",
+    "AbstractDisclosure": "fuzion.abstract",
+    "AbstractPoster": "fuzion.abstract",
+    "AbstractResource": "fuzion.abstract",
+    "Booth": "fuzion.exhibitor",
+    "Exhibitor": "fuzion.exhibitor",
+    "ExhibitorProduct": "fuzion.exhibitor",
+    "ThirdParty": "fuzion.exhibitor",
+    "FloorPlan": "fuzion.floor_plan",
+    "FloorPlanObject": "fuzion.floor_plan",
+    "Plot": "fuzion.floor_plan",
+    "PlotCategory": "fuzion.floor_plan",
+    "PlotType": "fuzion.floor_plan",
+    "NotificationWebhook": "fuzion.notification_webhook",
+    "ErrorWebhook": "fuzion.error_webhook",
+    "Resource": "fuzion.resource",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    module = _LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError("module 'fuzion' has no attribute '{}'".format(name))
+
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 
 api_key = os.getenv("FUZION_API_KEY", None)
 api_secret_key = os.getenv("FUZION_API_SECRET_KEY", None)
 host = os.getenv("FUZION_API_HOST", "fuzionapi.com/v1/")
+
+# Optional transport sending the requests instead of `requests.request`,
+# any object with a `request(method, url, **kwargs)` method returning a `requests.Response`
+transport = None
+
+# Optional cache for GET responses, such as `fuzion.caching.SQLiteCache`
+cache = None
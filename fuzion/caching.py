@@ -0,0 +1,226 @@
+"""
+A persistent, SQLite-backed cache for GET responses.
+
+Entries survive restarts, so freshly deployed workers serve from disk until the
+entries expire instead of re-downloading whole events.
+The database may be shared by several processes (it is opened in WAL mode), response
+bodies are stored zlib-compressed and the total size is bounded.
+
+Usage:
+-----
+import fuzion
+from fuzion.caching import SQLiteCache
+
+fuzion.cache = SQLiteCache("/var/cache/fuzion.sqlite3", ttl=600, max_size=512 * 1024 * 1024)
+
+# or per resource class, with a class specific time to live
+Attendee.cache = SQLiteCache("/var/cache/attendees.sqlite3")
+Attendee.cache_ttl = 60
+"""
+
+import collections
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from fuzion.exceptions import ImproperlyConfigured
+
+
+class CacheEntry(collections.namedtuple("CacheEntry", "value stored_at expires_at")):
+    def staleness(self):
+        """
+        Seconds since the entry expired, negative while it is still fresh
+        """
+        return time.time() - self.expires_at
+
+
+class SQLiteCache:
+    """
+    Caches raw response bodies by key.
+
+    `ttl` is the default time to live of an entry in seconds.
+    `max_size` bounds the total size of the stored (compressed) bodies in bytes,
+    the least recently used entries are evicted first once it is exceeded.
+    `evict_every` is the number of writes between two size checks.
+    """
+
+    # Reading an entry updates its access time at most once per this many seconds,
+    # sparing a write on every hit
+    access_resolution = 60
+
+    def __init__(
+        self,
+        path,
+        ttl=300,
+        max_size=256 * 1024 * 1024,
+        compress_level=6,
+        timeout=30,
+        evict_every=100,
+    ):
+        if ttl <= 0:
+            raise ImproperlyConfigured("ttl must be positive")
+
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.compress_level = compress_level
+        self.timeout = timeout
+        self.evict_every = evict_every
+
+        self._local = threading.local()
+        self._writes = 0
+
+        with self._connection() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fuzion_cache (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    stored_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    stale_until REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS fuzion_cache_scope ON fuzion_cache (scope)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS fuzion_cache_accessed_at ON fuzion_cache (accessed_at)"
+            )
+
+    def _connection(self):
+        """
+        Returns the connection of the current thread, opening a new one
+        in a new thread or after the process was forked
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get_entry(self, key):
+        """
+        Returns the `CacheEntry` for `key`, expired or not,
+        or None if missing or past the staleness it was stored with
+        """
+        now = time.time()
+        connection = self._connection()
+        row = connection.execute(
+            """
+            SELECT value, stored_at, expires_at, stale_until, accessed_at
+            FROM fuzion_cache WHERE key = ?
+            """,
+            (key,),
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        value, stored_at, expires_at, stale_until, accessed_at = row
+        if stale_until <= now:
+            return None
+
+        if now - accessed_at > self.access_resolution:
+            with connection:
+                connection.execute(
+                    "UPDATE fuzion_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+
+        return CacheEntry(zlib.decompress(value), stored_at, expires_at)
+
+    def get(self, key):
+        """
+        Returns the cached body for `key`, or None if missing or expired
+        """
+        entry = self.get_entry(key)
+        if entry is None or entry.staleness() >= 0:
+            return None
+        return entry.value
+
+    def set(self, key, value, ttl=None, scope="", max_staleness=0):
+        """
+        Stores `value` (bytes) under `key` for `ttl` seconds, the default `ttl` if not given.
+        The expired entry is kept for `max_staleness` more seconds to be served stale.
+        `scope` groups entries that are invalidated together
+        """
+        now = time.time()
+        expires_at = now + (ttl or self.ttl)
+        compressed = zlib.compress(value, self.compress_level)
+
+        with self._connection() as connection:
+            connection.execute(
+                """
+                INSERT OR REPLACE INTO fuzion_cache
+                (key, scope, value, size, stored_at, expires_at, stale_until, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    key,
+                    scope,
+                    compressed,
+                    len(compressed),
+                    now,
+                    expires_at,
+                    expires_at + max_staleness,
+                    now,
+                ),
+            )
+
+        self._writes += 1
+        if self._writes % self.evict_every == 0:
+            self.evict()
+
+    def delete(self, key):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM fuzion_cache WHERE key = ?", (key,))
+
+    def invalidate(self, scope):
+        """
+        Deletes all entries stored with the given scope
+        """
+        with self._connection() as connection:
+            connection.execute("DELETE FROM fuzion_cache WHERE scope = ?", (scope,))
+
+    def clear(self):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM fuzion_cache")
+
+    def size(self):
+        """
+        Returns the total size in bytes of the stored entries
+        """
+        row = self._connection().execute("SELECT SUM(size) FROM fuzion_cache").fetchone()
+        return row[0] or 0
+
+    def evict(self):
+        """
+        Deletes the entries that can no longer be served, then the least recently
+        used ones until the total size is below `max_size`
+        """
+        with self._connection() as connection:
+            connection.execute("DELETE FROM fuzion_cache WHERE stale_until <= ?", (time.time(),))
+
+            excess = self.size() - self.max_size
+            if excess <= 0:
+                return
+
+            freed = 0
+            keys = []
+            for key, size in connection.execute(
+                "SELECT key, size FROM fuzion_cache ORDER BY accessed_at"
+            ):
+                keys.append((key,))
+                freed += size
+                if freed >= excess:
+                    break
+            connection.executemany("DELETE FROM fuzion_cache WHERE key = ?", keys)
@@ -0,0 +1,189 @@
+"""
+Record-and-replay of requests at the transport layer, for reproducible offline benchmarks.
+
+`RecordingTransport` sends the requests as usual and appends every request/response pair
+to a gzipped JSON-lines cassette, with the partner app key, signature and timestamp redacted.
+`ReplayTransport` serves the recorded responses without any network access, waiting for the
+recorded duration multiplied by `latency_scale` (0 replays as fast as possible).
+
+Usage:
+-----
+import fuzion
+from fuzion.cassette import RecordingTransport, ReplayTransport
+
+with RecordingTransport("sync.cassette.gz") as fuzion.transport:
+    run_sync()
+
+fuzion.transport = ReplayTransport("sync.cassette.gz", latency_scale=0.5)
+run_sync()
+"""
+
+import collections
+import gzip
+import json
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from fuzion.compression import request_body
+from fuzion.exceptions import RecordingNotFoundError
+
+REDACTED = "REDACTED"
+REDACTED_HEADERS = ("partner_app_key", "partner_app_signature", "request_timestamp")
+
+# Headers that take part in matching a replayed request to its recording
+MATCHED_HEADERS = ("fuzion_event_id", "page_size", "start")
+
+
+def _redact(headers):
+    return {
+        key: (REDACTED if key in REDACTED_HEADERS else value)
+        for key, value in (headers or {}).items()
+    }
+
+
+def _request_key(method, url, params, headers, body):
+    headers = headers or {}
+    return json.dumps(
+        [
+            method.upper(),
+            url,
+            params or {},
+            {key: headers[key] for key in MATCHED_HEADERS if key in headers},
+            body,
+        ],
+        sort_keys=True,
+        default=str,
+    )
+
+
+def _send(method, url, **kwargs):
+    return requests.request(method, url, **kwargs)
+
+
+class RecordingTransport:
+    """
+    Sends requests through `transport` (`requests.request` if not set)
+    and records them to the cassette at `path`
+    """
+
+    def __init__(self, path, transport=None):
+        self.path = path
+        self.transport = transport
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "at", encoding="UTF-8")
+
+    def request(self, method, url, **kwargs):
+        send = _send if self.transport is None else self.transport.request
+
+        started = time.perf_counter()
+        response = send(method, url, **kwargs)
+        content = response.content
+        elapsed = time.perf_counter() - started
+
+        record = {
+            "method": method.upper(),
+            "url": url,
+            "params": kwargs.get("params"),
+            "headers": _redact(kwargs.get("headers")),
+            "body": request_body(kwargs),
+            "status": response.status_code,
+            "response_headers": {
+                key: value
+                for key, value in response.headers.items()
+                if key.lower() == "content-type"
+            },
+            "content": content.decode("UTF-8") if content else "",
+            "elapsed": elapsed,
+        }
+        line = json.dumps(record, separators=(",", ":"), default=str)
+
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.recorded += 1
+
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayTransport:
+    """
+    Serves the responses recorded in the cassette at `path`.
+
+    Identical requests are answered in the order they were recorded, the last one
+    is repeated once they are exhausted. Requests without a recording raise `RecordingNotFoundError`
+    """
+
+    def __init__(self, path, latency_scale=1.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.replayed = 0
+        self._recordings = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+        with gzip.open(path, "rt", encoding="UTF-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    key = _request_key(
+                        record["method"],
+                        record["url"],
+                        record["params"],
+                        record["headers"],
+                        record["body"],
+                    )
+                    self._recordings[key].append(record)
+
+    def __len__(self):
+        return sum(len(records) for records in self._recordings.values())
+
+    def request(self, method, url, **kwargs):
+        key = _request_key(
+            method, url, kwargs.get("params"), kwargs.get("headers"), request_body(kwargs)
+        )
+
+        with self._lock:
+            records = self._recordings.get(key)
+            if not records:
+                raise RecordingNotFoundError(
+                    "No recording of {} {} {}".format(method.upper(), url, kwargs.get("params") or "")
+                )
+            record = records.popleft() if len(records) > 1 else records[0]
+            self.replayed += 1
+
+        if self.latency_scale:
+            time.sleep(record["elapsed"] * self.latency_scale)
+
+        return self._response(record, method, url, kwargs)
+
+    def _response(self, record, method, url, kwargs):
+        request = requests.Request(
+            method.upper(),
+            url,
+            params=kwargs.get("params"),
+            headers=kwargs.get("headers"),
+            json=kwargs.get("json"),
+            data=kwargs.get("data"),
+        ).prepare()
+
+        response = requests.Response()
+        response.status_code = record["status"]
+        response.headers = CaseInsensitiveDict(record["response_headers"])
+        response._content = record["content"].encode("UTF-8")
+        response.encoding = "UTF-8"
+        response.url = request.url
+        response.request = request
+        return response
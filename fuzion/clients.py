@@ -0,0 +1,257 @@
+"""
+Per-tenant clients, for processes serving several partner apps and events.
+
+A `Client` holds the credentials and host of one partner app, and owns its connection pool,
+rate limiter and (optional) cache. It is the transport of the resources it creates,
+so these settings never leak between tenants.
+
+`ClientRegistry` creates the clients on first use, keyed by credentials and host, and shares a
+`FairScheduler` between them: at most `concurrency` requests are in flight at once and, when
+they are all taken, the free slots go to the waiting tenants in turn, so a tenant queueing
+thousands of export requests delays the other tenants by at most one request each.
+
+Usage:
+-----
+from fuzion import Attendee
+from fuzion.clients import ClientRegistry
+
+clients = ClientRegistry(concurrency=20, rate=10, cache_dir="/var/cache/fuzion")
+
+client = clients.get(api_key="KEY1", api_secret_key="SECRET1")
+attendees = client.resource(Attendee, fuzion_event_id="EV123").query()
+
+# or, in one go
+attendee = clients.resource(Attendee, "EV456", api_key="KEY2", api_secret_key="SECRET2").get(
+    fuzion_attendee_id="A123"
+)
+"""
+
+import collections
+import contextlib
+import hashlib
+import os
+import threading
+import time
+
+import fuzion
+from fuzion.transports import PooledTransport
+
+
+class RateLimiter:
+    """
+    A token bucket allowing `rate` requests per second on average, and bursts of `burst` requests
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Takes a token, waiting for one if needed. Returns the seconds waited
+        """
+        waited = 0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class FairScheduler:
+    """
+    Limits the requests in flight to `concurrency`, handing the free slots
+    to the waiting tenants round-robin, each tenant's requests in order
+    """
+
+    def __init__(self, concurrency=10):
+        self.concurrency = concurrency
+        self.active = 0
+        self._queues = collections.OrderedDict()  # tenant -> waiting requests
+        self._lock = threading.Lock()
+
+    @property
+    def waiting(self):
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def acquire(self, tenant):
+        with self._lock:
+            if self.active < self.concurrency and not self._queues:
+                self.active += 1
+                return
+            granted = threading.Event()
+            self._queues.setdefault(tenant, collections.deque()).append(granted)
+        granted.wait()
+
+    def release(self):
+        with self._lock:
+            if not self._queues:
+                self.active -= 1
+                return
+
+            # The slot goes to the next tenant in turn, which then moves to the back of the line
+            tenant, queue = self._queues.popitem(last=False)
+            granted = queue.popleft()
+            if queue:
+                self._queues[tenant] = queue
+            granted.set()
+
+    @contextlib.contextmanager
+    def slot(self, tenant):
+        self.acquire(tenant)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class Client:
+    """
+    The credentials, host and scheme of one partner app, with its own connection pool
+    (`pool_maxsize`, `timeout`, see `PooledTransport`), rate limiter (`rate` requests per second,
+    `burst`, unlimited if `rate` is not set) and `cache`.
+
+    Requests are sent through `scheduler`, if set, under the `key` of the client
+    """
+
+    def __init__(
+        self,
+        api_key,
+        api_secret_key,
+        host=None,
+        scheme="https",
+        rate=None,
+        burst=None,
+        pool_maxsize=10,
+        timeout=None,
+        cache=None,
+        scheduler=None,
+    ):
+        self.api_key = api_key
+        self.api_secret_key = api_secret_key
+        self.host = host or fuzion.host
+        self.scheme = scheme
+        self.cache = cache
+        self.scheduler = scheduler
+
+        self.pool = PooledTransport(pool_connections=1, pool_maxsize=pool_maxsize, timeout=timeout)
+        self.rate_limiter = RateLimiter(rate, burst) if rate else None
+
+    @property
+    def key(self):
+        return (self.api_key, self.api_secret_key, self.host)
+
+    def resource(self, resource_class, fuzion_event_id, **kwargs):
+        """
+        Returns an instance of `resource_class` sending its requests through this client
+        """
+        return resource_class(
+            fuzion_event_id,
+            api_key=self.api_key,
+            api_secret_key=self.api_secret_key,
+            host=self.host,
+            scheme=self.scheme,
+            client=self,
+            **kwargs
+        )
+
+    def request(self, method, url, **kwargs):
+        # Waiting for the rate limiter does not hold one of the scheduler's shared slots
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+        if self.scheduler is None:
+            return self.pool.request(method, url, **kwargs)
+
+        with self.scheduler.slot(self.key):
+            response = self.pool.request(method, url, **kwargs)
+            if not kwargs.get("stream"):
+                return response
+            # Streamed responses are read by the caller, make sure it is done within the slot
+            response.content
+            return response
+
+    def close(self):
+        self.pool.close()
+
+
+class ClientRegistry:
+    """
+    Creates and keeps one `Client` per credentials and host, sharing a `FairScheduler`
+    of `concurrency` slots.
+
+    `rate`, `burst`, `pool_maxsize` and `timeout` are the defaults of every client.
+    If `cache_dir` is set, every client gets its own `SQLiteCache` in that directory
+    """
+
+    def __init__(self, concurrency=10, rate=None, burst=None, pool_maxsize=10, timeout=None, cache_dir=None):
+        self.scheduler = FairScheduler(concurrency)
+        self.defaults = {"rate": rate, "burst": burst, "pool_maxsize": pool_maxsize, "timeout": timeout}
+        self.cache_dir = cache_dir
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __iter__(self):
+        return iter(list(self._clients.values()))
+
+    def _cache(self, key):
+        from fuzion.caching import SQLiteCache
+
+        # Credentials are not written in file names
+        name = hashlib.sha256("|".join(map(str, key)).encode("UTF-8")).hexdigest()[:32]
+        return SQLiteCache(os.path.join(self.cache_dir, name + ".sqlite"))
+
+    def get(self, api_key=None, api_secret_key=None, host=None, **options):
+        """
+        Returns the client of the given credentials and host (defaulting to `fuzion`'s),
+        created with `options` overriding the registry's defaults on first use
+        """
+        key = (
+            api_key or fuzion.api_key,
+            api_secret_key or fuzion.api_secret_key,
+            host or fuzion.host,
+        )
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                options = {**self.defaults, **options}
+                if self.cache_dir is not None:
+                    options.setdefault("cache", self._cache(key))
+                client = self._clients[key] = Client(*key, scheduler=self.scheduler, **options)
+            return client
+
+    def resource(self, resource_class, fuzion_event_id, api_key=None, api_secret_key=None, host=None, **kwargs):
+        return self.get(api_key, api_secret_key, host).resource(resource_class, fuzion_event_id, **kwargs)
+
+    def remove(self, api_key=None, api_secret_key=None, host=None):
+        """
+        Closes and forgets the client of the given credentials and host
+        """
+        key = (
+            api_key or fuzion.api_key,
+            api_secret_key or fuzion.api_secret_key,
+            host or fuzion.host,
+        )
+        with self._lock:
+            client = self._clients.pop(key, None)
+        if client is not None:
+            client.close()
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
@@ -0,0 +1,177 @@
+"""
+Coalescing of webhook notifications before re-fetching the objects they mention.
+
+A single edit often fires several notifications in quick succession, `Coalescer`
+collects them for `window` seconds and emits one de-duplicated `DirtySet`,
+which is then re-fetched with a single batched query per resource path.
+
+Usage:
+-----
+from fuzion import Attendee
+from fuzion.coalesce import Coalescer
+
+def on_flush(dirty_set):
+    changed = dirty_set.refetch(fuzion_event_id="EV123")
+    ...
+
+coalescer = Coalescer(resources={"attendee": Attendee}, on_flush=on_flush, window=2)
+coalescer.add(notification)  # or use `coalescer.add_many` as a `WebhookReceiver` consumer
+"""
+
+import threading
+
+from fuzion.exceptions import ImproperlyConfigured, NotFoundError
+from fuzion.mixins import ListObjectsPaginationMixin
+
+
+def notification_object_id(resource_class, notification):
+    """
+    Returns the id of the object a webhook notification refers to
+    """
+    return notification.get(resource_class.object_id_attr_name) or notification.get(
+        "entity_id"
+    )
+
+
+def fetch_objects(resource, object_ids, page_size=500):
+    """
+    Fetches the current state of the given objects of `resource`'s class.
+
+    Resources that support pagination are fetched with a single query filtered on the
+    list of object ids, others are retrieved one by one
+    """
+    object_ids = list(object_ids)
+    object_id_attr_name = resource.object_id_attr_name
+
+    if isinstance(resource, ListObjectsPaginationMixin):
+        return resource.query_all(page_size=page_size, **{object_id_attr_name: object_ids})
+
+    objects = []
+    for object_id in object_ids:
+        try:
+            objects.append(resource.get(**{object_id_attr_name: object_id}))
+        except NotFoundError:
+            pass
+    return objects
+
+
+class DirtySet:
+    """
+    The objects changed during a coalescing window, by entity type.
+
+    Only the last operation per object is kept, so an object that was
+    inserted and then updated is reported once
+    """
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.entities = {}
+        self.events = 0
+
+    def __len__(self):
+        return sum(len(objects) for objects in self.entities.values())
+
+    def __bool__(self):
+        return bool(self.entities)
+
+    def add(self, entity_type, object_id, operation):
+        self.events += 1
+        self.entities.setdefault(entity_type, {})[object_id] = operation
+
+    def deleted(self, entity_type):
+        return {
+            object_id
+            for object_id, operation in self.entities.get(entity_type, {}).items()
+            if operation == "delete"
+        }
+
+    def changed(self, entity_type):
+        return {
+            object_id
+            for object_id, operation in self.entities.get(entity_type, {}).items()
+            if operation != "delete"
+        }
+
+    def refetch(self, fuzion_event_id, page_size=500, **credentials):
+        """
+        Re-fetches all changed (not deleted) objects, one batched query per resource path.
+        Returns a dict of entity type to the list of fetched objects
+        """
+        fetched = {}
+        for entity_type in self.entities:
+            object_ids = self.changed(entity_type)
+            if object_ids:
+                resource = self.resources[entity_type](fuzion_event_id, **credentials)
+                fetched[entity_type] = fetch_objects(resource, object_ids, page_size)
+        return fetched
+
+
+class Coalescer:
+    """
+    Groups notifications by entity type and object id for `window` seconds,
+    starting at the first notification of the window, then calls `on_flush` with the `DirtySet`.
+
+    `on_flush` is called from a timer thread. Notifications for entity types not in
+    `resources` or without an object id are ignored.
+    """
+
+    def __init__(self, resources, on_flush, window=1.0):
+        if window <= 0:
+            raise ImproperlyConfigured("window must be positive")
+
+        self.resources = dict(resources)
+        self.on_flush = on_flush
+        self.window = window
+
+        self.events = 0
+        self.flushed_objects = 0
+
+        self._lock = threading.Lock()
+        self._dirty = DirtySet(self.resources)
+        self._timer = None
+
+    @property
+    def burst_factor(self):
+        """
+        How many notifications were received per object actually re-fetched
+        """
+        return self.events / self.flushed_objects if self.flushed_objects else 0.0
+
+    def add(self, notification):
+        entity_type = notification.get("entity_type")
+        resource_class = self.resources.get(entity_type)
+        if resource_class is None:
+            return
+
+        object_id = notification_object_id(resource_class, notification)
+        if object_id is None:
+            return
+
+        with self._lock:
+            self.events += 1
+            self._dirty.add(entity_type, object_id, notification.get("entity_operation"))
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def add_many(self, notifications):
+        for notification in notifications:
+            self.add(notification)
+
+    def flush(self):
+        """
+        Emits the current dirty set right away, if there is anything in it
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            dirty, self._dirty = self._dirty, DirtySet(self.resources)
+            self.flushed_objects += len(dirty)
+
+        if dirty:
+            self.on_flush(dirty)
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,619 @@
+"""
+A compact columnar file format for the objects of a resource, opened with mmap.
+
+`ColumnarWriter` (or `write_resource`, from a query) stores every field in a column of its own:
+integers, floats and booleans as fixed-width arrays, strings as indexes in a dictionary of the
+distinct values, anything else (lists, mixed types...) as dictionary encoded JSON. Nested objects
+are flattened to dotted column names (`contact.first_name`) and rebuilt when read.
+Missing and null values are kept in a bitmap per column, and the rows are indexed by object id.
+
+`ColumnarSnapshot` maps the file in memory: opening it only reads the header, columns and records
+are decoded on access, and the numeric columns are exposed without a copy (`Column.raw`).
+
+The file is: 8 bytes of magic, the 8 bytes length of the JSON header, the header, then the
+sections it refers to, every one of them aligned on 8 bytes. Numbers are in the machine's byte order.
+
+Usage:
+-----
+from fuzion import Attendee
+from fuzion.columnar import ColumnarSnapshot, write_resource
+
+write_resource(Attendee(fuzion_event_id="EV123"), "EV123.attendees.fzc")
+
+with ColumnarSnapshot("EV123.attendees.fzc") as attendees:
+    attendee = attendees.get("3C1D2E4F5A6B")
+    statuses = attendees.column("registration_status_flag")
+"""
+
+import array
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+
+from fuzion.exceptions import ImproperlyConfigured
+from fuzion.mixins import ListObjectsPaginationMixin
+
+MAGIC = b"FZCOL\x00\x01\x00"
+SEPARATOR = "."
+
+# Column types and the array type code of their values
+INT, FLOAT, BOOL, STR, JSON = "int", "float", "bool", "str", "json"
+TYPE_CODES = {INT: "q", FLOAT: "d", BOOL: "b", STR: "I", JSON: "I"}
+
+INT_MIN, INT_MAX = -(2 ** 63), 2 ** 63 - 1
+
+
+def _flatten(record, prefix=""):
+    for key, value in record.items():
+        key = prefix + str(key)
+        if isinstance(value, dict) and value:
+            yield from _flatten(value, key + SEPARATOR)
+        else:
+            yield key, value
+
+
+def _type(value):
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, int):
+        return INT if INT_MIN <= value <= INT_MAX else JSON
+    if isinstance(value, float):
+        return FLOAT
+    if isinstance(value, str):
+        return STR
+    return JSON
+
+
+def _encode_json(value):
+    return json.dumps(value, separators=(",", ":"), default=str)
+
+
+class _ColumnBuilder:
+    """
+    The values of a column being written, its type widened as values of other types come
+    """
+
+    def __init__(self, rows):
+        self.type = None
+        self.values = array.array("q", bytes(8 * rows))
+        self.nulls = bytearray(b"\x01" * rows)
+        self.strings = {}  # string -> code, for STR and JSON columns
+
+    def _code(self, string):
+        code = self.strings.get(string)
+        if code is None:
+            code = self.strings[string] = len(self.strings)
+        return code
+
+    def _widen(self, value_type):
+        if self.type is None:
+            self.type = value_type
+            self.values = array.array(TYPE_CODES[value_type], [0] * len(self.values))
+        elif self.type == INT and value_type == FLOAT:
+            self.type = FLOAT
+            self.values = array.array("d", self.values)
+        elif self.type == STR:
+            # The codes are unchanged, only the dictionary's strings are encoded
+            self.type = JSON
+            self.strings = {_encode_json(string): code for string, code in self.strings.items()}
+        else:
+            values, previous_type = self.values, self.type
+            self.type = JSON
+            self.values = array.array("I")
+            for value, null in zip(values, self.nulls):
+                if previous_type == BOOL:
+                    value = bool(value)
+                self.values.append(0 if null else self._code(_encode_json(value)))
+
+    def append(self, value):
+        if value is None:
+            self.values.append(0)
+            self.nulls.append(1)
+            return
+
+        value_type = _type(value)
+        if value_type != self.type and self.type != JSON and not (self.type == FLOAT and value_type == INT):
+            self._widen(value_type)
+
+        if self.type == STR:
+            value = self._code(value)
+        elif self.type == JSON:
+            value = self._code(_encode_json(value))
+        self.values.append(value)
+        self.nulls.append(0)
+
+
+def _add_record(columns, row, record, fields=None):
+    """
+    Appends the record's values (only `fields` if set) as `row` of the column builders
+    """
+    for name, value in _flatten(record):
+        if fields is not None and name not in fields:
+            continue
+        column = columns.get(name)
+        if column is None:
+            column = columns[name] = _ColumnBuilder(row)
+        if len(column.nulls) > row:
+            # A key repeated after flattening ({"a.b": 1, "a": {"b": 2}}), the first one is kept
+            continue
+        column.append(value)
+    for column in columns.values():
+        if len(column.nulls) <= row:
+            column.append(None)
+
+
+class ColumnarWriter:
+    """
+    Writes records to a columnar file at `path`, once closed.
+
+    Rows are indexed by their `object_id_attr_name` value, `metadata` (JSON serializable)
+    is stored in the file's header
+    """
+
+    def __init__(self, path, object_id_attr_name=None, metadata=None):
+        self.path = path
+        self.object_id_attr_name = object_id_attr_name
+        self.metadata = metadata or {}
+        self.rows = 0
+        self._columns = {}
+
+    def add(self, record):
+        _add_record(self._columns, self.rows, record)
+        self.rows += 1
+
+    def add_many(self, records):
+        for record in records:
+            self.add(record)
+
+    def _index(self, columns):
+        column = columns.get(self.object_id_attr_name)
+        if column is None or column.type not in (INT, STR):
+            return None
+
+        if column.type == STR:
+            strings = sorted(column.strings, key=column.strings.get)
+            key = lambda row: strings[column.values[row]]
+        else:
+            key = column.values.__getitem__
+        rows = [row for row in range(self.rows) if not column.nulls[row]]
+        return array.array("I", sorted(rows, key=key))
+
+    def close(self):
+        sections = []
+        offset = 0
+
+        def section(data):
+            nonlocal offset
+            start = offset
+            sections.append(data)
+            offset += len(data)
+            padding = -offset % 8
+            if padding:
+                sections.append(bytes(padding))
+                offset += padding
+            return start
+
+        columns = []
+        for name, builder in self._columns.items():
+            column_type = builder.type or JSON
+            spec = {"name": name, "type": column_type, "values": None, "nulls": None}
+            values = builder.values if builder.type else array.array("I", bytes(4 * self.rows))
+            spec["values"] = section(values.tobytes())
+
+            if any(builder.nulls):
+                bits = bytearray((self.rows + 7) // 8)
+                for row, null in enumerate(builder.nulls):
+                    if null:
+                        bits[row >> 3] |= 1 << (row & 7)
+                spec["nulls"] = section(bytes(bits))
+
+            if column_type in (STR, JSON):
+                strings = [string.encode("UTF-8") for string in sorted(builder.strings, key=builder.strings.get)]
+                offsets = array.array("Q", [0])
+                for string in strings:
+                    offsets.append(offsets[-1] + len(string))
+                spec["dictionary"] = {
+                    "count": len(strings),
+                    "offsets": section(offsets.tobytes()),
+                    "strings": section(b"".join(strings)),
+                }
+            columns.append(spec)
+
+        index = self._index(self._columns)
+        header = {
+            "byteorder": sys.byteorder,
+            "rows": self.rows,
+            "object_id_attr_name": self.object_id_attr_name,
+            "metadata": self.metadata,
+            "columns": columns,
+            "index": section(index.tobytes()) if index is not None else None,
+            "index_count": len(index) if index is not None else 0,
+        }
+        header = json.dumps(header, separators=(",", ":")).encode("UTF-8")
+        header += b" " * (-len(header) % 8)
+        data_start = len(MAGIC) + 8 + len(header)
+
+        # Written aside and renamed, readers never see a partial file
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            assert f.tell() == data_start
+            for data in sections:
+                f.write(data)
+        os.replace(temporary_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+
+
+class Columns(dict):
+    """
+    Query results as one array per field (dotted for nested fields), `rows` long
+    """
+
+    def __init__(self, rows, columns):
+        dict.__init__(self, columns)
+        self.rows = rows
+
+
+def _numpy(use_numpy):
+    if use_numpy is False:
+        return None
+    try:
+        import numpy
+    except ImportError:
+        if use_numpy:
+            raise
+        return None
+    return numpy
+
+
+def _column_array(builder, rows, np):
+    """
+    Returns the values of a column builder as an array: with NumPy, an int64, float64 or bool array,
+    NaN standing for the nulls of numeric columns, other columns as object arrays.
+    Without it an `array.array` for numeric columns without nulls, a list otherwise
+    """
+    column_type = builder.type
+    has_nulls = any(builder.nulls)
+
+    if column_type in (STR, JSON):
+        strings = sorted(builder.strings, key=builder.strings.get)
+        if column_type == JSON:
+            strings = [json.loads(string) for string in strings]
+        strings.append(None)
+        if np is None:
+            return [strings[-1] if null else strings[code] for code, null in zip(builder.values, builder.nulls)]
+        codes = np.frombuffer(builder.values, dtype=np.uint32).astype(np.int64)
+        if has_nulls:
+            codes[np.frombuffer(bytes(builder.nulls), dtype=bool)] = len(strings) - 1
+        table = np.empty(len(strings), dtype=object)
+        table[:] = strings
+        return table[codes]
+
+    if column_type is None:
+        return np.full(rows, None, dtype=object) if np is not None else [None] * rows
+
+    if np is None:
+        if not has_nulls:
+            return builder.values if column_type != BOOL else [bool(value) for value in builder.values]
+        return [
+            None if null else (bool(value) if column_type == BOOL else value)
+            for value, null in zip(builder.values, builder.nulls)
+        ]
+
+    values = np.frombuffer(builder.values, dtype={INT: np.int64, FLOAT: np.float64, BOOL: np.int8}[column_type])
+    if not has_nulls:
+        return values.astype(bool) if column_type == BOOL else values
+
+    nulls = np.frombuffer(bytes(builder.nulls), dtype=bool)
+    if column_type == BOOL:
+        values = values.astype(bool).astype(object)
+        values[nulls] = None
+        return values
+    values = values.astype(np.float64)
+    values[nulls] = np.nan
+    return values
+
+
+def build_columns(pages, fields=None, numpy=None):
+    """
+    Builds `Columns` from pages of decoded payloads (lists of dicts), without building objects.
+
+    Only `fields` are kept if set (missing ones are all None). NumPy arrays are built
+    if `numpy` is True, or if it is None (the default) and NumPy is installed
+    """
+    np = _numpy(numpy)
+    fields = set(fields) if fields is not None else None
+
+    builders = {}
+    rows = 0
+    for page in pages:
+        for record in page:
+            _add_record(builders, rows, record, fields)
+            rows += 1
+
+    for name in fields or ():
+        builders.setdefault(name, _ColumnBuilder(rows))
+
+    return Columns(rows, {name: _column_array(builder, rows, np) for name, builder in builders.items()})
+
+
+def write_resource(resource, path, page_size=500, **values):
+    """
+    Writes all the objects of `resource` (filtered on `values`) to a columnar file at `path`,
+    one page at a time. Returns the number of objects written
+    """
+    writer = ColumnarWriter(
+        path,
+        object_id_attr_name=resource.object_id_attr_name,
+        metadata={
+            "resource": resource.__class__.__name__,
+            "fuzion_event_id": resource.fuzion_event_id,
+            "values": json.loads(_encode_json(values)),
+            "written_at": time.time(),
+        },
+    )
+    if isinstance(resource, ListObjectsPaginationMixin):
+        pages = resource.iter_payloads(page_size, **values)
+    else:
+        pages = [resource.query(**values) or []]
+    for page in pages:
+        writer.add_many(page)
+    writer.close()
+    return writer.rows
+
+
+class Column:
+    """
+    A column of a `ColumnarSnapshot`, its values decoded on access.
+
+    `raw` is a memoryview of the fixed-width values (the dictionary codes of string and JSON columns),
+    straight from the mapped file, valid until the snapshot is closed
+    """
+
+    def __init__(self, snapshot, spec):
+        self.name = spec["name"]
+        self.type = spec["type"]
+        self._rows = snapshot.rows
+        buffer, start = snapshot._buffer, snapshot._data_start
+
+        width = struct.calcsize(TYPE_CODES[self.type])
+        offset = start + spec["values"]
+        self.raw = buffer[offset : offset + width * self._rows].cast(TYPE_CODES[self.type])
+
+        self._nulls = None
+        if spec["nulls"] is not None:
+            offset = start + spec["nulls"]
+            self._nulls = buffer[offset : offset + (self._rows + 7) // 8]
+
+        self._offsets = self._strings = None
+        dictionary = spec.get("dictionary")
+        if dictionary is not None:
+            offset = start + dictionary["offsets"]
+            self._offsets = buffer[offset : offset + 8 * (dictionary["count"] + 1)].cast("Q")
+            offset = start + dictionary["strings"]
+            self._strings = buffer[offset : offset + self._offsets[-1]]
+            self._cache = {}
+
+    def __len__(self):
+        return self._rows
+
+    def is_null(self, row):
+        return self._nulls is not None and bool(self._nulls[row >> 3] & (1 << (row & 7)))
+
+    def string(self, code):
+        """
+        Returns the dictionary's string of `code`
+        """
+        string = self._cache.get(code)
+        if string is None:
+            string = self._cache[code] = str(
+                self._strings[self._offsets[code] : self._offsets[code + 1]], "UTF-8"
+            )
+        return string
+
+    def value(self, row):
+        if self.is_null(row):
+            return None
+        value = self.raw[row]
+        if self.type == STR:
+            return self.string(value)
+        if self.type == JSON:
+            return json.loads(self.string(value))
+        if self.type == BOOL:
+            return bool(value)
+        return value
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.value(i) for i in range(*row.indices(self._rows))]
+        if row < 0:
+            row += self._rows
+        if not 0 <= row < self._rows:
+            raise IndexError("row out of range")
+        return self.value(row)
+
+    def __iter__(self):
+        return (self.value(row) for row in range(self._rows))
+
+    def _release(self):
+        for view in (self.raw, self._nulls, self._offsets, self._strings):
+            if view is not None:
+                view.release()
+
+
+class ColumnarSnapshot:
+    """
+    A columnar file written by `ColumnarWriter`, mapped in memory.
+
+    Rows are read as dicts by position (`snapshot[i]`, slices, iteration) or object id (`get`),
+    `column(name)` gives the `Column` of a field (dotted for nested fields).
+    Fields missing from a record are read as None, except the nested fields of a field
+    that is empty or null in some records, which are left out
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._columns = {}
+        self._index = None
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+
+        if bytes(self._buffer[: len(MAGIC)]) != MAGIC:
+            self.close()
+            raise ImproperlyConfigured("{} is not a columnar snapshot".format(path))
+
+        (header_length,) = struct.unpack_from("<Q", self._buffer, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(self._buffer[header_start : header_start + header_length]))
+        self._data_start = header_start + header_length
+
+        if header["byteorder"] != sys.byteorder:
+            self.close()
+            raise ImproperlyConfigured("{} was written on a {} endian machine".format(path, header["byteorder"]))
+
+        self.rows = header["rows"]
+        self.object_id_attr_name = header["object_id_attr_name"]
+        self.metadata = header["metadata"]
+        self._specs = {spec["name"]: spec for spec in header["columns"]}
+
+        # A nested field empty or null in some records is also a column of its own,
+        # its value only stands for the field when none of its nested fields is set
+        prefixes = {
+            name: [SEPARATOR.join(name.split(SEPARATOR)[:i]) for i in range(1, name.count(SEPARATOR) + 1)]
+            for name in self._specs
+        }
+        self._parents = sorted(
+            {prefix for names in prefixes.values() for prefix in names if prefix in self._specs},
+            key=lambda name: name.count(SEPARATOR),
+            reverse=True,
+        )
+        self._nested = {name for name, names in prefixes.items() if set(names) & set(self._parents)}
+
+        if header["index"] is not None:
+            offset = self._data_start + header["index"]
+            self._index = self._buffer[offset : offset + 4 * header["index_count"]].cast("I")
+
+    @property
+    def columns(self):
+        return list(self._specs)
+
+    def column(self, name):
+        column = self._columns.get(name)
+        if column is None:
+            if name not in self._specs:
+                raise KeyError(name)
+            column = self._columns[name] = Column(self, self._specs[name])
+        return column
+
+    def __len__(self):
+        return self.rows
+
+    def record(self, row):
+        """
+        Returns the record of `row` as a dict, nested fields rebuilt
+        """
+        record = {}
+        parents = set(self._parents)
+        for name in self._specs:
+            if name in parents:
+                continue
+            value = self.column(name).value(row)
+            if value is None and name in self._nested:
+                continue
+            target = record
+            *path, key = name.split(SEPARATOR)
+            for parent in path:
+                target = target.setdefault(parent, {})
+            target[key] = value
+
+        for name in self._parents:
+            value = self.column(name).value(row)
+            *path, key = name.split(SEPARATOR)
+            if value is None and path:
+                continue
+            target = record
+            for parent in path:
+                target = target.setdefault(parent, {}) if isinstance(target, dict) else None
+            if isinstance(target, dict) and key not in target:
+                target[key] = value
+        return record
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.record(i) for i in range(*row.indices(self.rows))]
+        if row < 0:
+            row += self.rows
+        if not 0 <= row < self.rows:
+            raise IndexError("row out of range")
+        return self.record(row)
+
+    def __iter__(self):
+        return (self.record(row) for row in range(self.rows))
+
+    def find_row(self, object_id):
+        """
+        Returns the row of the object with the given id, None if there is none
+        """
+        if self._index is None:
+            raise ImproperlyConfigured("{} has no object id index".format(self.path))
+
+        column = self.column(self.object_id_attr_name)
+        keys = _IndexKeys(self._index, column)
+        position = bisect.bisect_left(keys, object_id)
+        if position < len(keys) and keys[position] == object_id:
+            return self._index[position]
+        return None
+
+    def get(self, object_id, default=None):
+        """
+        Returns the record of the object with the given id
+        """
+        row = self.find_row(object_id)
+        return default if row is None else self.record(row)
+
+    def close(self):
+        if self._mmap is None:
+            return
+        for column in self._columns.values():
+            column._release()
+        self._columns = {}
+        if self._index is not None:
+            self._index.release()
+        self._buffer.release()
+        self._mmap.close()
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class _IndexKeys:
+    """
+    The object ids in index order, for `bisect`
+    """
+
+    def __init__(self, index, column):
+        self.index = index
+        self.column = column
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, position):
+        return self.column.value(self.index[position])
@@ -0,0 +1,68 @@
+"""
+Compression of request and response bodies.
+
+Responses are negotiated by `requests` itself (it sends `Accept-Encoding: gzip, deflate` and
+decompresses the body as it is read). Write request bodies are only compressed when the resource's
+`compress_request_min_bytes` is set, as the server has to accept a `Content-Encoding`.
+
+Usage:
+-----
+from fuzion import Attendee
+
+# gzip the bodies of 16KB or more sent by attendee imports
+Attendee.compress_request_min_bytes = 16 * 1024
+"""
+
+import gzip
+import json
+import zlib
+
+# Supported values of the `Content-Encoding` header
+ENCODINGS = ("gzip", "deflate")
+
+COMPRESS_LEVEL = 6
+
+
+def compress(data, encoding="gzip", level=COMPRESS_LEVEL):
+    if encoding == "gzip":
+        return gzip.compress(data, level)
+    if encoding == "deflate":
+        return zlib.compress(data, level)
+    raise ValueError("Unsupported content encoding {!r}".format(encoding))
+
+
+def decompress(data, encoding):
+    """
+    Returns the `data` decompressed according to its `Content-Encoding` (returned as-is if not set)
+    """
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return data
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "deflate":
+        return zlib.decompress(data)
+    raise ValueError("Unsupported content encoding {!r}".format(encoding))
+
+
+def accepted_encoding(accept_encoding):
+    """
+    Returns the first supported encoding listed in an `Accept-Encoding` header, None if there is none
+    """
+    for item in (accept_encoding or "").split(","):
+        encoding, _, params = item.strip().lower().partition(";")
+        if encoding in ENCODINGS and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            return encoding
+    return None
+
+
+def request_body(kwargs):
+    """
+    Returns the JSON body of a request sent with the `kwargs` of `requests.request`,
+    decoded whether it was sent as `json` or as compressed `data`
+    """
+    if kwargs.get("data") is None:
+        return kwargs.get("json")
+
+    headers = {key.lower(): value for key, value in (kwargs.get("headers") or {}).items()}
+    return json.loads(decompress(kwargs["data"], headers.get("content-encoding")))
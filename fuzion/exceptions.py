@@ -24,6 +24,11 @@ class FuzionError(Exception):
     def __str__(self):
         return self.message
 
+    def __reduce__(self):
+        # Lets errors raised in worker processes reach the parent,
+        # the request and response objects are not carried along
+        return self.__class__, (self.status, self.reason, self.message, None, None)
+
 
 class BadRequestError(FuzionError):
     """
@@ -96,3 +101,11 @@ class ImproperlyConfigured(Exception):
     """
 
     pass
+
+
+class RecordingNotFoundError(Exception):
+    """
+    A replayed request has no matching recording
+    """
+
+    pass
@@ -0,0 +1,481 @@
+"""
+Exports of the objects of events.
+
+`export_resource` writes all the objects of one resource, page by page, and can save its
+progress to a `Checkpoint` state file: an interrupted export resumes after the last written page,
+with the output truncated to that page so every object is written exactly once.
+
+`ExportOrchestrator` fetches every page of every (event, resource class) pair in a process pool:
+the workers send the requests, decode the responses and encode the records, the parent process
+plans the pages, paces the requests to a global rate budget and writes the encoded pages,
+in order, to one sink per event.
+
+The first page of every pair is fetched first, the others are planned from its `total_count`
+(pages are then requested one after the other if the server does not report it).
+
+Usage:
+-----
+from fuzion import Attendee
+from fuzion.export import ExportOrchestrator, export_resource
+from fuzion.sinks import NDJSONSink
+
+with NDJSONSink("exports/EV123") as sink:
+    export_resource(Attendee(fuzion_event_id="EV123"), sink, checkpoint="exports/EV123/Attendee.state")
+
+orchestrator = ExportOrchestrator(
+    ["EV1", "EV2", "EV3"],
+    directory="exports",  # exports/EV1/Attendee.ndjson, ...
+    max_workers=8,
+    rate=20,
+    progress=print,
+)
+progress = orchestrator.run()
+"""
+
+import collections
+import concurrent.futures
+import json
+import os
+import time
+
+import fuzion
+from fuzion import metrics
+from fuzion.exceptions import (
+    ImproperlyConfigured,
+    InternalServerError,
+    ResourceUnavailableError,
+    TooManyRequestsError,
+)
+from fuzion.mixins import ListObjectsMixin, ListObjectsPaginationMixin, is_last_page, page_step
+from fuzion.sinks import NDJSONSink, encode_ndjson
+
+RETRIED_EXCEPTIONS = (OSError, TooManyRequestsError, InternalServerError, ResourceUnavailableError)
+
+# A page fetched by a worker: its records encoded as NDJSON, the `page_size` and
+# `total_count` reported by the server, the response size and the request's duration
+Page = collections.namedtuple(
+    "Page", ["start", "count", "data", "page_size", "total_count", "response_bytes", "elapsed"]
+)
+
+# The transport of the current worker process
+_transport = None
+
+
+def listable_resources():
+    """
+    Returns the package's resource classes listing objects at the event level (not sub-resources)
+    """
+    classes = [getattr(fuzion, name) for name in fuzion.__all__]
+    return [
+        cls
+        for cls in classes
+        if isinstance(cls, type)
+        and issubclass(cls, (ListObjectsMixin, ListObjectsPaginationMixin))
+        and cls.path
+        and "{}" not in cls.path
+    ]
+
+
+class Checkpoint:
+    """
+    The progress of an export, kept in the JSON state file at `path`
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """
+        Returns the saved state, None if there is none
+        """
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def save(self, state):
+        # Written aside and renamed, a crash leaves either the previous or the new state
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def export_resource(resource, sink, checkpoint=None, page_size=500, **values):
+    """
+    Writes all the objects of `resource` (filtered on `values`) to `sink` (see `fuzion.sinks`),
+    as the output named after the resource class, one page at a time.
+    Returns the number of objects written.
+
+    With a `checkpoint` (a `Checkpoint` or the path of its state file), the position after every
+    written page is saved, and an export interrupted before completion resumes from it.
+    The state is removed once the export is complete
+    """
+    if isinstance(checkpoint, str):
+        checkpoint = Checkpoint(checkpoint)
+
+    name = resource.__class__.__name__
+    export = {
+        "resource": name,
+        "fuzion_event_id": resource.fuzion_event_id,
+        "page_size": page_size,
+        "values": json.loads(json.dumps(values, default=str)),
+    }
+
+    start, position, records = 0, 0, 0
+    state = checkpoint.load() if checkpoint is not None else None
+    if state is not None:
+        if {key: state.get(key) for key in export} != export:
+            raise ImproperlyConfigured(
+                "The checkpoint at {} belongs to another export".format(checkpoint.path)
+            )
+        start, position, records = state["start"], state["position"], state["records"]
+
+    # Anything written past the last saved page is dropped, its objects are fetched again
+    sink.open(name, position)
+
+    if isinstance(resource, ListObjectsPaginationMixin):
+        pages = resource.iter_payloads(page_size, start, **values)
+    else:
+        pages = [resource.query(**values) or []]
+
+    # Only one page is held in memory at a time
+    for page in pages:
+        sink.write(name, page)
+        start += len(page)
+        records += len(page)
+
+        if checkpoint is not None:
+            sink.flush(name)
+            checkpoint.save({**export, "start": start, "position": sink.position(name), "records": records})
+
+    sink.flush(name)
+    if checkpoint is not None:
+        checkpoint.clear()
+    return records
+
+
+def export_page(resource_class, fuzion_event_id, credentials, page_size, start):
+    """
+    Fetches one page and encodes its records, in a worker process
+    """
+    global _transport
+
+    resource = resource_class(fuzion_event_id, **credentials)
+    if resource.get_transport() is None:
+        if _transport is None:
+            from fuzion.transports import PooledTransport
+
+            _transport = PooledTransport()
+        resource.transport = _transport
+
+    paging = {}
+    if isinstance(resource, ListObjectsPaginationMixin):
+        paging = {"page_size": str(page_size), "start": str(start)}
+
+    started = time.perf_counter()
+    response = resource._send("get", resource.path, {}, paging)
+    if response.status_code != 200:
+        response.raise_for_status()
+    content = response.content
+    elapsed = time.perf_counter() - started
+
+    response_data = response.json()
+    records = resource.process_response_data(response_data, response) or []
+    if isinstance(records, dict):
+        records = [records]
+
+    return Page(
+        start,
+        len(records),
+        encode_ndjson(records),
+        response_data.get("page_size") or 0,
+        response_data.get("total_count") or 0,
+        len(content),
+        elapsed,
+    )
+
+
+class ExportProgress:
+    """
+    The counters of an export, passed to the `progress` callback and returned by `run`
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.finished = None
+        self.exports = 0  # (event, resource) pairs
+        self.exports_done = 0
+        self.pages_planned = 0
+        self.pages_done = 0
+        self.records = 0
+        self.bytes_written = 0
+        self.response_bytes = 0
+        self.retries = 0
+        self.errors = []  # (fuzion_event_id, resource class name, exception)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def records_per_second(self):
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self.response_bytes / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            "{}/{} exports, {}/{} pages, {} records in {:.1f}s "
+            "({:.0f} records/s, {:.1f} MB/s), {} retries, {} errors".format(
+                self.exports_done,
+                self.exports,
+                self.pages_done,
+                self.pages_planned,
+                self.records,
+                self.elapsed,
+                self.records_per_second,
+                self.bytes_per_second / 1e6,
+                self.retries,
+                len(self.errors),
+            )
+        )
+
+
+class _Export:
+    """
+    The pages of one resource class of one event
+    """
+
+    def __init__(self, fuzion_event_id, resource_class, page_size):
+        self.fuzion_event_id = fuzion_event_id
+        self.resource_class = resource_class
+        self.name = resource_class.__name__
+        self.paginated = issubclass(resource_class, ListObjectsPaginationMixin)
+        self.page_size = page_size
+        self.step = page_size
+        self.planned = False
+        self.written = 0  # `start` of the next page to write
+        self.completed = {}  # start -> fetched pages waiting for the ones before them
+        self.outstanding = 0
+        self.error = None
+
+
+class ExportOrchestrator:
+    """
+    Exports all the objects of `resources` (every listable resource class if not set)
+    for every event of `fuzion_event_ids`.
+
+    `sink_factory` is called with every event id and returns its sink (see `fuzion.sinks`),
+    by default an `NDJSONSink` in `<directory>/<fuzion_event_id>`, compressed if `compress` is set.
+
+    `max_workers` worker processes (see `concurrent.futures.ProcessPoolExecutor`) fetch
+    and decode the pages, with at most `max_in_flight` pages submitted at once.
+    `rate` caps the requests per second of all the workers together (`burst` at once).
+    Failed requests (connection errors, 429, 500 and 503) are retried `retries` times,
+    waiting `backoff` seconds, doubled on every attempt.
+
+    `progress` is called with the `ExportProgress` every `progress_interval` seconds and at the end
+    """
+
+    def __init__(
+        self,
+        fuzion_event_ids,
+        resources=None,
+        directory=".",
+        sink_factory=None,
+        compress=False,
+        page_size=500,
+        max_workers=None,
+        max_in_flight=None,
+        rate=None,
+        burst=None,
+        retries=3,
+        backoff=1.0,
+        progress=None,
+        progress_interval=1.0,
+        api_key=None,
+        api_secret_key=None,
+        host=None,
+        scheme="https",
+        mp_context=None,
+    ):
+        self.fuzion_event_ids = list(fuzion_event_ids)
+        self.resources = list(resources or listable_resources())
+        self.directory = directory
+        self.sink_factory = sink_factory or self._default_sink
+        self.compress = compress
+        self.page_size = page_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.max_workers * 2
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.mp_context = mp_context
+
+        # Resolved here, worker processes may not share the parent's settings
+        self.credentials = {
+            "api_key": api_key or fuzion.api_key,
+            "api_secret_key": api_secret_key or fuzion.api_secret_key,
+            "host": host or fuzion.host,
+            "scheme": scheme,
+        }
+
+    def _default_sink(self, fuzion_event_id):
+        return NDJSONSink(os.path.join(self.directory, fuzion_event_id), compress=self.compress)
+
+    def run(self):
+        """
+        Runs the export, returns the final `ExportProgress`.
+        Pairs that fail past the retries are reported in its `errors`, the others go on
+        """
+        from fuzion.clients import RateLimiter
+
+        progress = ExportProgress()
+        rate_limiter = RateLimiter(self.rate, self.burst) if self.rate else None
+
+        sinks = {}
+        remaining = collections.Counter()
+        queue = collections.deque()  # (export, start, attempt)
+        delayed = []  # (not before, export, start, attempt)
+
+        for fuzion_event_id in self.fuzion_event_ids:
+            for resource_class in self.resources:
+                export = _Export(fuzion_event_id, resource_class, self.page_size)
+                queue.append((export, 0, 0))
+                export.outstanding += 1
+                remaining[fuzion_event_id] += 1
+        progress.exports = progress.pages_planned = len(queue)
+
+        def finish(export):
+            progress.exports_done += 1
+            remaining[export.fuzion_event_id] -= 1
+            if not remaining[export.fuzion_event_id] and export.fuzion_event_id in sinks:
+                sinks.pop(export.fuzion_event_id).close()
+
+        def plan(export, page):
+            export.planned = True
+            if not page.start:
+                export.step = page_step(export.page_size, page.count)
+            if not export.paginated or is_last_page(page.start, page.count, page.total_count):
+                return
+            if page.total_count:
+                starts = range(page.start + export.step, page.total_count, export.step)
+            else:
+                # Without a total count, pages are requested one after the other
+                starts = [page.start + export.step]
+                export.planned = False
+            for start in starts:
+                queue.append((export, start, 0))
+                export.outstanding += 1
+                progress.pages_planned += 1
+
+        def write(export, page):
+            export.completed[page.start] = page
+            while export.written in export.completed:
+                page = export.completed.pop(export.written)
+                if page.data:
+                    sink = sinks.get(export.fuzion_event_id)
+                    if sink is None:
+                        sink = sinks[export.fuzion_event_id] = self.sink_factory(export.fuzion_event_id)
+                    sink.write_ndjson(export.name, page.data)
+                progress.records += page.count
+                progress.bytes_written += len(page.data)
+                export.written += export.step
+
+        executor = concurrent.futures.ProcessPoolExecutor(self.max_workers, mp_context=self.mp_context)
+        in_flight = {}
+        last_report = time.monotonic()
+        try:
+            while queue or delayed or in_flight:
+                now = time.monotonic()
+                for item in [item for item in delayed if item[0] <= now]:
+                    delayed.remove(item)
+                    queue.append(item[1:])
+
+                while queue and len(in_flight) < self.max_in_flight:
+                    export, start, attempt = queue.popleft()
+                    if export.error is not None:
+                        continue
+                    if rate_limiter is not None:
+                        rate_limiter.acquire()
+                    future = executor.submit(
+                        export_page,
+                        export.resource_class,
+                        export.fuzion_event_id,
+                        self.credentials,
+                        export.step,
+                        start,
+                    )
+                    in_flight[future] = (export, start, attempt)
+
+                timeout = self.progress_interval
+                if delayed:
+                    timeout = max(0, min(timeout, min(item[0] for item in delayed) - now))
+                done, _ = concurrent.futures.wait(
+                    in_flight, timeout=timeout, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+
+                for future in done:
+                    export, start, attempt = in_flight.pop(future)
+                    if export.error is not None:
+                        continue
+                    try:
+                        page = future.result()
+                    except RETRIED_EXCEPTIONS as e:
+                        if attempt < self.retries:
+                            progress.retries += 1
+                            metrics.registry.record_retry(
+                                metrics.path_template(export.resource_class, export.resource_class.path), "GET"
+                            )
+                            delayed.append(
+                                (time.monotonic() + self.backoff * 2 ** attempt, export, start, attempt + 1)
+                            )
+                            continue
+                        error = e
+                    except Exception as e:
+                        error = e
+                    else:
+                        error = None
+
+                    if error is not None:
+                        export.error = error
+                        progress.errors.append((export.fuzion_event_id, export.name, error))
+                        finish(export)
+                        continue
+
+                    progress.pages_done += 1
+                    progress.response_bytes += page.response_bytes
+                    export.outstanding -= 1
+                    if not export.planned:
+                        plan(export, page)
+                    write(export, page)
+                    if not export.outstanding:
+                        finish(export)
+
+                if self.progress is not None and time.monotonic() - last_report >= self.progress_interval:
+                    last_report = time.monotonic()
+                    self.progress(progress)
+        finally:
+            executor.shutdown(cancel_futures=True)
+            for sink in sinks.values():
+                sink.close()
+
+        progress.finished = time.monotonic()
+        if self.progress is not None:
+            self.progress(progress)
+        return progress
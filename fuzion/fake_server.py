@@ -0,0 +1,322 @@
+"""
+An in-process fake Fuzion HTTP server, for end-to-end tests and benchmarks.
+
+It serves every resource path of this package with Fuzion's response envelope
+(`error`, `status`, `payload`, `total_count`, ...), pages lists according to the
+`page_size` and `start` headers, filters on list parameters (`key[]`) and supports
+creating (one by one or from a list), updating and deleting objects and relationships.
+
+Latency, the maximum page and request body sizes, injected 429 responses and the size of the
+generated records are configurable. Compressed request bodies are accepted (`Content-Encoding`),
+responses are compressed for clients accepting it when `compress` is set.
+
+Usage:
+-----
+from fuzion import Attendee
+from fuzion.fake_server import FakeFuzionServer
+
+with FakeFuzionServer(latency=0.005, records=1000) as server:
+    attendees = server.resource(Attendee, fuzion_event_id="EV123").query_all()
+"""
+
+import datetime
+import itertools
+import json
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import fuzion
+from fuzion import compression
+from fuzion.resource import Resource
+
+_BUILD = "fake"
+
+
+def resource_classes(base=Resource):
+    """
+    Returns all the resource classes of the package that have a path
+    """
+    # Make sure all the (lazily imported) resource modules are loaded
+    for name in fuzion.__all__:
+        getattr(fuzion, name)
+
+    classes = []
+    for subclass in base.__subclasses__():
+        if subclass.path:
+            classes.append(subclass)
+        classes.extend(resource_classes(subclass))
+    return classes
+
+
+class FakeFuzionServer:
+    """
+    Serves the package's resource paths from in-memory records.
+
+    `records`: number of objects generated for every top level resource path,
+    `sub_records` for every sub-resource path (such as "exhibitors/E1/contacts")
+    `record_size`: approximate size in bytes of the generated records' free text
+    `latency`: seconds to wait before answering every request
+    `max_page_size`: caps the `page_size` header, as the real server does
+    `max_body_size`: answers requests with larger (decompressed) bodies with a 413 error (0 disables it)
+    `compress`: gzips or deflates the responses, according to the request's `Accept-Encoding`
+    `rate_limit_every`: answers every n-th request with a 429 error (0 disables it)
+    `api_secret_key`: if set, the partner app signature of every request is verified
+    """
+
+    def __init__(
+        self,
+        records=100,
+        sub_records=5,
+        record_size=200,
+        latency=0.0,
+        max_page_size=500,
+        max_body_size=0,
+        compress=False,
+        rate_limit_every=0,
+        api_key=None,
+        api_secret_key=None,
+        port=0,
+    ):
+        self.records = records
+        self.sub_records = sub_records
+        self.record_size = record_size
+        self.latency = latency
+        self.max_page_size = max_page_size
+        self.max_body_size = max_body_size
+        self.compress = compress
+        self.rate_limit_every = rate_limit_every
+        self.api_key = api_key
+        self.api_secret_key = api_secret_key
+        self.port = port
+
+        self.requests = 0
+        self.rate_limited = 0
+        self.store = {}
+
+        self._routes = [
+            (
+                re.compile(
+                    "^" + re.escape(cls.path).replace(re.escape("{}"), "[^/]+") + "(?:/(?P<object_id>[^/]+))?$"
+                ),
+                cls,
+            )
+            for cls in resource_classes()
+        ]
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def host(self):
+        return "127.0.0.1:{}/v1/".format(self.port)
+
+    def resource(self, resource_class, fuzion_event_id="EV1", **kwargs):
+        """
+        Returns an instance of `resource_class` that calls this server
+        """
+        kwargs.setdefault("api_key", self.api_key or "key")
+        kwargs.setdefault("api_secret_key", self.api_secret_key or "secret_key")
+        return resource_class(fuzion_event_id, host=self.host, scheme="http", **kwargs)
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                body = compression.decompress(body, self.headers.get("Content-Encoding"))
+                status, response = fake.handle(self.command, self.path, self.headers, body)
+                content = json.dumps(response).encode("UTF-8")
+                encoding = fake.compress and compression.accepted_encoding(self.headers.get("Accept-Encoding"))
+                if encoding:
+                    content = compression.compress(content, encoding)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _route(self, path):
+        for pattern, resource_class in self._routes:
+            match = pattern.match(path)
+            if match:
+                object_id = match.group("object_id")
+                collection = path[: -len(object_id) - 1] if object_id else path
+                return resource_class, collection, object_id
+        return None, None, None
+
+    def generate_record(self, resource_class, collection, index):
+        id_attr = resource_class.object_id_attr_name or "id"
+        now = datetime.datetime(2018, 1, 15, 14, 30, 32).isoformat() + ".000Z"
+        record = {
+            id_attr: "{}-{}".format(collection.replace("/", "-"), index),
+            "name": "{} {}".format(resource_class.__name__, index),
+            "number": index,
+            "status_flag": index % 3,
+            "custom_attributes": "x" * self.record_size,
+            "last_mod_timestamp": now,
+            "create_timestamp": now,
+        }
+        if resource_class.__name__ == "Attendee":
+            record["registration_number"] = "RN{}".format(index)
+            record["contact"] = {
+                "first_name": "First{}".format(index),
+                "last_name": "Last{}".format(index),
+                "email": "attendee{}@example.com".format(index),
+            }
+        return record
+
+    def _records(self, resource_class, collection):
+        records = self.store.get(collection)
+        if records is None:
+            count = self.sub_records if "/" in collection else self.records
+            records = self.store[collection] = {}
+            for index in range(count):
+                record = self.generate_record(resource_class, collection, index)
+                records[record[resource_class.object_id_attr_name or "id"]] = record
+        return records
+
+    def envelope(self, payload, status=200, message="Request was successful", page_size=0, start=0, total_count=0):
+        return {
+            "type": "json",
+            "build": _BUILD,
+            "status": status,
+            "reason": 0 if status == 200 else str(status),
+            "message": message,
+            "error": status != 200,
+            "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] + " UTC",
+            "page_size": page_size,
+            "start": start,
+            "total_count": total_count,
+            "payload": payload,
+        }
+
+    def _verify_signature(self, method, path, headers):
+        resource = Resource(
+            headers.get("fuzion_event_id"),
+            api_key=self.api_key,
+            api_secret_key=self.api_secret_key,
+            host=self.host,
+        )
+        expected = resource._generate_partner_app_signature(
+            headers.get("request_timestamp"), path, method
+        )
+        return headers.get("partner_app_key") == self.api_key and headers.get(
+            "partner_app_signature"
+        ) == expected
+
+    def handle(self, method, target, headers, body):
+        """
+        Answers a single request, returns the HTTP status and the JSON response
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.requests += 1
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return 200, self.envelope([], 429, "Too many requests")
+
+        url = urllib.parse.urlsplit(target)
+        path = url.path[len("/v1/"):] if url.path.startswith("/v1/") else url.path.lstrip("/")
+
+        if self.api_secret_key and not self._verify_signature(method, path, headers):
+            return 200, self.envelope([], 401, "Invalid partner app signature")
+
+        resource_class, collection, object_id = self._route(path)
+        if resource_class is None:
+            return 200, self.envelope([], 404, "Unknown path")
+
+        if self.max_body_size and len(body) > self.max_body_size:
+            return 200, self.envelope([], 413, "Payload too large")
+
+        id_attr = resource_class.object_id_attr_name or "id"
+        values = json.loads(body) if body else {}
+
+        with self._lock:
+            records = self._records(resource_class, collection)
+
+            if method == "GET" and object_id is None:
+                return 200, self._list(records, url.query, headers)
+
+            if method == "GET":
+                if object_id not in records:
+                    return 200, self.envelope({}, 404, "Not found")
+                return 200, self.envelope(records[object_id], total_count=1)
+
+            if method == "POST" and isinstance(values, list):
+                created = []
+                for item in values:
+                    object_id = "new-{}".format(next(self._ids))
+                    records[object_id] = {id_attr: object_id, **item}
+                    created.append(records[object_id])
+                return 200, self.envelope(created, total_count=len(created))
+
+            if method == "POST":
+                if object_id is None:
+                    object_id = "new-{}".format(next(self._ids))
+                record = {id_attr: object_id, **values}
+                records[object_id] = record
+                return 200, self.envelope(record, total_count=1)
+
+            if object_id not in records:
+                return 200, self.envelope({}, 404, "Not found")
+
+            if method == "PUT":
+                records[object_id].update(values)
+                return 200, self.envelope(records[object_id], total_count=1)
+
+            if method == "DELETE":
+                return 200, self.envelope(records.pop(object_id), total_count=1)
+
+        return 200, self.envelope([], 400, "Unsupported method")
+
+    def _list(self, records, query, headers):
+        page_size = min(int(headers.get("page_size") or self.max_page_size), self.max_page_size)
+        start = int(headers.get("start") or 0)
+
+        matching = list(records.values())
+        for key, values in urllib.parse.parse_qs(query).items():
+            key = key[:-2] if key.endswith("[]") else key
+            matching = [record for record in matching if str(record.get(key)) in values]
+
+        return self.envelope(
+            matching[start : start + page_size],
+            page_size=page_size,
+            start=start,
+            total_count=len(matching),
+        )
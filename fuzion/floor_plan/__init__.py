@@ -43,6 +43,8 @@ class FloorPlanObject(RetrieveNotSupportedMixin, Resource):
 class PlotCategory(RetrieveNotSupportedMixin, Resource):
     path = "plot-categories"
     object_id_attr_name = "fuzion_plot_category_id"
+    max_staleness = 60 * 60
+    stale_if_error = 24 * 60 * 60
 
     @property
     @has_object_id_set
@@ -53,6 +55,8 @@ class PlotCategory(RetrieveNotSupportedMixin, Resource):
 class PlotType(RetrieveNotSupportedMixin, Resource):
     path = "plot-types"
     object_id_attr_name = "fuzion_plot_type_id"
+    max_staleness = 60 * 60
+    stale_if_error = 24 * 60 * 60
 
     @property
     @has_object_id_set
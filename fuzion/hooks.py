@@ -0,0 +1,118 @@
+"""
+Request instrumentation hooks.
+
+Every hook registered here is called with a `RequestEvent` after each request made
+through `Resource._request`, successful or not. While no hook is registered requests
+are not timed at all.
+
+Usage:
+-----
+from fuzion import hooks
+
+@hooks.register
+def log_request(event):
+    print(event.resource_class.__name__, event.verb, event.path, event.status, event.timings)
+"""
+
+import time
+
+_hooks = []
+
+
+class RequestEvent:
+    """
+    Describes a single request.
+
+    `timings` maps the phases the request went through to their duration in seconds:
+    - `options`: building the request options in `extract_options`
+    - `sign`: generating the general request header and partner app signature
+    - `time_to_first_byte`: from sending the request until the response headers were read,
+      including connecting (`requests` does not report connection setup separately)
+    - `download`: reading the response body
+    - `decode`: decoding the JSON body in `process_response`
+    - `construct`: building the resulting object in `process_payload`, for a list only its `ResultList`
+      (the objects of a list are built when accessed, after the request)
+    - `total`: the whole call
+
+    `request_bytes` and `response_bytes` are the sizes of the (uncompressed) bodies,
+    `request_wire_bytes` and `response_wire_bytes` the bytes actually sent and received,
+    compressed if the body was.
+
+    `cache` is "hit", "stale", "stale-if-error" or "miss" when a cache is used, None otherwise.
+    `error` is the exception raised by the request, if any.
+    """
+
+    __slots__ = (
+        "resource_class",
+        "path",
+        "verb",
+        "status",
+        "request_bytes",
+        "response_bytes",
+        "request_wire_bytes",
+        "response_wire_bytes",
+        "timings",
+        "cache",
+        "error",
+    )
+
+    def __init__(self, resource_class, path, verb):
+        self.resource_class = resource_class
+        self.path = path
+        self.verb = verb
+        self.status = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.request_wire_bytes = 0
+        self.response_wire_bytes = 0
+        self.timings = {}
+        self.cache = None
+        self.error = None
+
+    def __repr__(self):
+        return "<RequestEvent {} {} {} {}>".format(
+            self.resource_class.__name__, self.verb, self.path, self.status
+        )
+
+
+def register(hook):
+    """
+    Registers `hook` to be called with every `RequestEvent`.
+    Returns the hook, so it can be used as a decorator
+    """
+    _hooks.append(hook)
+    return hook
+
+
+def unregister(hook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def clear():
+    del _hooks[:]
+
+
+def is_active():
+    return bool(_hooks)
+
+
+def emit(event):
+    for hook in list(_hooks):
+        hook(event)
+
+
+def timed(event, phase, func, *args, **kwargs):
+    """
+    Calls `func`, adding its duration to the `phase` timing of `event` if there is one
+    """
+    if event is None:
+        return func(*args, **kwargs)
+
+    started = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        event.timings[phase] = (
+            event.timings.get(phase, 0.0) + time.perf_counter() - started
+        )
@@ -0,0 +1,234 @@
+"""
+A metrics registry fed by the request hooks (see `fuzion.hooks`).
+
+Keeps, per resource path template and HTTP verb, a latency histogram and counters
+of requests, errors per exception class, retries, cache hits and bytes sent and received
+(as encoded in JSON and as transferred, compressed or not).
+Exportable as a plain dict snapshot or as Prometheus text.
+
+Usage:
+-----
+from fuzion import metrics
+
+metrics.registry.install()
+...
+metrics.registry.snapshot()["attendees GET"]["latency"]["p95"]
+print(metrics.registry.to_prometheus())
+"""
+
+import bisect
+import threading
+
+from fuzion import hooks
+
+# Upper bounds (in seconds) of the latency histogram buckets, 1.5x apart from 1ms to ~2 minutes
+DEFAULT_BUCKETS = tuple(round(0.001 * 1.5 ** i, 6) for i in range(30))
+
+
+class Histogram:
+    """
+    A fixed-bucket histogram, cheap to update and to estimate percentiles from
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def percentile(self, pct):
+        """
+        Estimates the `pct` percentile, interpolating linearly inside the bucket
+        """
+        if not self.count:
+            return 0.0
+
+        rank = pct / 100.0 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                if index == len(self.buckets):
+                    return lower
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+class EndpointMetrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.latency = Histogram(buckets)
+        self.requests = 0
+        self.errors = {}
+        self.retries = 0
+        self.cache_hits = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.request_wire_bytes = 0
+        self.response_wire_bytes = 0
+
+    def snapshot(self):
+        return {
+            "requests": self.requests,
+            "errors": dict(self.errors),
+            "retries": self.retries,
+            "cache_hits": self.cache_hits,
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes,
+            "request_wire_bytes": self.request_wire_bytes,
+            "response_wire_bytes": self.response_wire_bytes,
+            "latency": self.latency.snapshot(),
+        }
+
+
+def path_template(resource_class, path):
+    """
+    Returns the path template of a request, such as "exhibitors/{}/contacts/{}"
+    for "exhibitors/E123/contacts/C456", so requests aggregate per endpoint
+    """
+    template = resource_class.path or path
+    extra_segments = path.count("/") - template.count("/")
+    return template + "/{}" * max(extra_segments, 0)
+
+
+class MetricsRegistry:
+    """
+    Collects the metrics of every request once `install`ed as a request hook
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, path, verb):
+        key = (path, verb)
+        endpoint = self.endpoints.get(key)
+        if endpoint is None:
+            endpoint = self.endpoints.setdefault(key, EndpointMetrics(self.buckets))
+        return endpoint
+
+    def install(self):
+        hooks.register(self.record)
+        return self
+
+    def uninstall(self):
+        hooks.unregister(self.record)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+
+    def record(self, event):
+        """
+        Records a `fuzion.hooks.RequestEvent`
+        """
+        path = path_template(event.resource_class, event.path)
+        with self._lock:
+            endpoint = self._endpoint(path, event.verb)
+            endpoint.requests += 1
+            endpoint.latency.observe(event.timings.get("total", 0.0))
+            endpoint.request_bytes += event.request_bytes
+            endpoint.response_bytes += event.response_bytes
+            endpoint.request_wire_bytes += event.request_wire_bytes
+            endpoint.response_wire_bytes += event.response_wire_bytes
+            if event.cache in ("hit", "stale", "stale-if-error"):
+                endpoint.cache_hits += 1
+            if event.error is not None:
+                error = event.error.__class__.__name__
+                endpoint.errors[error] = endpoint.errors.get(error, 0) + 1
+
+    def record_retry(self, path, verb):
+        """
+        Counts a retried request of the given path template and verb
+        """
+        with self._lock:
+            self._endpoint(path, verb).retries += 1
+
+    def snapshot(self):
+        """
+        Returns the metrics as a dict keyed by "<path template> <verb>"
+        """
+        with self._lock:
+            return {
+                "{} {}".format(path, verb): endpoint.snapshot()
+                for (path, verb), endpoint in sorted(self.endpoints.items())
+            }
+
+    def to_prometheus(self, prefix="fuzion"):
+        """
+        Returns the metrics in Prometheus' text exposition format
+        """
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append("# HELP {}_{} {}".format(prefix, name, help_text))
+            lines.append("# TYPE {}_{} {}".format(prefix, name, kind))
+
+        def sample(name, labels, value):
+            label_text = ",".join(
+                '{}="{}"'.format(key, str(val).replace("\\", "\\\\").replace('"', '\\"'))
+                for key, val in labels
+            )
+            lines.append("{}_{}{{{}}} {}".format(prefix, name, label_text, value))
+
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+
+            counters = (
+                ("requests_total", "requests", "Requests sent"),
+                ("retries_total", "retries", "Requests retried"),
+                ("cache_hits_total", "cache_hits", "Requests served from the cache"),
+                ("request_bytes_total", "request_bytes", "Request body bytes sent"),
+                ("response_bytes_total", "response_bytes", "Response body bytes received"),
+                ("request_wire_bytes_total", "request_wire_bytes", "Request body bytes sent, once compressed"),
+                ("response_wire_bytes_total", "response_wire_bytes", "Response body bytes received, before decompression"),
+            )
+            for name, attr, help_text in counters:
+                metric(name, "counter", help_text)
+                for (path, verb), endpoint in endpoints:
+                    sample(name, (("path", path), ("verb", verb)), getattr(endpoint, attr))
+
+            metric("errors_total", "counter", "Failed requests per exception class")
+            for (path, verb), endpoint in endpoints:
+                for error, count in sorted(endpoint.errors.items()):
+                    sample(
+                        "errors_total",
+                        (("path", path), ("verb", verb), ("error", error)),
+                        count,
+                    )
+
+            metric("request_duration_seconds", "histogram", "Request latency")
+            for (path, verb), endpoint in endpoints:
+                histogram = endpoint.latency
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    sample(
+                        "request_duration_seconds_bucket",
+                        (("path", path), ("verb", verb), ("le", bound)),
+                        cumulative,
+                    )
+                sample("request_duration_seconds_sum", (("path", path), ("verb", verb)), histogram.sum)
+                sample("request_duration_seconds_count", (("path", path), ("verb", verb)), histogram.count)
+
+        return "\n".join(lines) + "\n"
+
+
+# The default registry, `install` it to start collecting
+registry = MetricsRegistry()
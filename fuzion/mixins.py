@@ -1,6 +1,47 @@
+import itertools
+
 from fuzion.exceptions import ObjectIdMissingError
 
 
+def page_step(page_size, count):
+    """
+    Returns the distance between the starts of consecutive pages requested with `page_size`,
+    from the `count` of records of the first page: servers capping the page size serve
+    fewer records than requested
+    """
+    return count if 0 < count < page_size else page_size
+
+
+def is_last_page(start, count, total_count=None):
+    """
+    Whether the page requested at `start`, holding `count` records, ends the pagination:
+    it is empty, or reaches the `total_count` reported by the server (if known)
+    """
+    return not count or bool(total_count) and start + count >= total_count
+
+
+def _split_list_values(values, size):
+    """
+    Returns the `values` with every list longer than `size` split in chunks of `size`,
+    one copy of `values` per combination of chunks
+    """
+    if not size:
+        return [values]
+
+    chunked = {
+        key: [value[i : i + size] for i in range(0, len(value), size)]
+        for key, value in values.items()
+        if isinstance(value, list) and len(value) > size
+    }
+    if not chunked:
+        return [values]
+
+    return [
+        {**values, **dict(zip(chunked, combination))}
+        for combination in itertools.product(*chunked.values())
+    ]
+
+
 class RetrieveObjectMixin:
     """
     Provides retrieving a single-object with GET
@@ -48,6 +89,113 @@ class ListObjectsPaginationMixin:
             paging={"page_size": str(page_size), "start": str(start)},
         )
 
+    def count(self, **values):
+        """
+        Returns the number of objects on the server (matching `values`), read from the
+        `total_count` of a single-object page
+        """
+        return self.query(page_size=1, **values).total_count
+
+    def iter_pages(self, page_size=500, start=0, **values):
+        """
+        Yields consecutive pages of objects starting at `start`, until the `total_count`
+        reported by the server is reached or an empty page comes back.
+
+        The server may serve smaller pages than `page_size`, every page starts
+        after the records actually received
+        """
+        return self._iter_pages(page_size, start, True, values)
+
+    def iter_payloads(self, page_size=500, start=0, **values):
+        """
+        As `iter_pages`, but yields the decoded payloads (lists of dicts) without building objects
+        """
+        return self._iter_pages(page_size, start, False, values)
+
+    def _iter_pages(self, page_size, start, construct, values):
+        page_size = page_size or 500
+        start = start or 0
+
+        while True:
+            page = self._request(
+                method="get",
+                path=self.path,
+                values=values,
+                paging={"page_size": str(page_size), "start": str(start)},
+                construct=construct,
+            ) or []
+            if page:
+                yield page
+            if is_last_page(start, len(page), getattr(page, "total_count", None)):
+                return
+            start += len(page)
+
+    def _iter_chunked_pages(self, page_size, start, construct, values):
+        """
+        As `_iter_pages`, but list filters longer than `list_chunk_size` are split in chunks
+        whose pages are fetched concurrently (`list_chunk_concurrency` chunks at a time).
+        The pages are yielded in chunk order, without the objects already yielded by a previous chunk
+        """
+        chunks = _split_list_values(values, self.list_chunk_size)
+        if len(chunks) == 1:
+            yield from self._iter_pages(page_size, start, construct, values)
+            return
+
+        import concurrent.futures
+
+        def fetch(chunk):
+            return list(self._iter_pages(page_size, start, construct, chunk))
+
+        seen = set()
+        object_id_attr_name = self.object_id_attr_name
+        workers = min(self.list_chunk_concurrency or 1, len(chunks))
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            for pages in executor.map(fetch, chunks):
+                for page in pages:
+                    if object_id_attr_name is None:
+                        yield page
+                        continue
+
+                    kept = []
+                    for obj in page:
+                        object_id = dict.get(obj, object_id_attr_name)
+                        if object_id is not None:
+                            if object_id in seen:
+                                continue
+                            seen.add(object_id)
+                        kept.append(obj)
+                    yield kept
+
+    def query_all(self, page_size=500, start=0, **values):
+        """
+        Retrieves all objects, going through all the pages.
+        Long list filters are split in chunks queried concurrently, see `_iter_chunked_pages`
+        """
+        return [
+            obj for page in self._iter_chunked_pages(page_size, start, True, values) for obj in page
+        ]
+
+    def query_columns(self, fields=None, page_size=500, start=0, numpy=None, **values):
+        """
+        Retrieves all objects as one array per field, NumPy arrays if available
+        (see `fuzion.columnar.build_columns`), without building an object per record.
+        Long list filters are split in chunks as in `query_all`
+        """
+        from fuzion.columnar import build_columns
+
+        return build_columns(
+            self._iter_chunked_pages(page_size, start, False, values), fields, numpy
+        )
+
+    def export(self, sink, checkpoint=None, page_size=500, **values):
+        """
+        Writes all objects to `sink`, page by page, resumable with a `checkpoint`
+        (see `fuzion.export.export_resource`)
+        """
+        from fuzion.export import export_resource
+
+        return export_resource(self, sink, checkpoint, page_size, **values)
+
 
 class CreateObjectMixin:
     """
@@ -57,6 +205,14 @@ class CreateObjectMixin:
     def post(self, **values):
         return self._request(method="post", path=self.path, values=values)
 
+    def post_many(self, records):
+        """
+        Creates the objects of `records` with POST requests of JSON arrays, where the API accepts them.
+        The records are split in as few requests as the path's `payload_limit` allows,
+        see `Resource._write_many`
+        """
+        return self._write_many("post", self.path, records)
+
 
 class UpdateObjectMixin:
     """
@@ -0,0 +1,279 @@
+"""
+An embedded asyncio HTTP receiver for Fuzion webhook deliveries
+(both `NotificationWebhook` and `ErrorWebhook`).
+
+Every POST is acknowledged as soon as its body was read and the decoded event
+is pushed into a bounded in-process queue. A consumer task drains the queue and hands
+the events to the `consumer` callback in batches.
+
+When the queue is full the receiver waits up to `enqueue_timeout` seconds for room
+and answers with 503 if there is none, so the sender retries the delivery later.
+
+Usage:
+-----
+from fuzion.receiver import WebhookReceiver
+
+def handle(events):
+    for event in events:
+        replica.apply(event)
+
+WebhookReceiver(handle, host="0.0.0.0", port=8080).run()
+"""
+
+import asyncio
+import json
+import logging
+
+from fuzion.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    414: "URI Too Long",
+    431: "Request Header Fields Too Large",
+    503: "Service Unavailable",
+}
+
+
+class WebhookReceiver:
+    """
+    Receives webhook deliveries and hands them to `consumer` in batches.
+
+    `consumer` is called with a list of decoded events, at most `batch_size` of them,
+    as soon as the batch is full or `batch_timeout` seconds passed since its first event.
+    It may be a regular function (run in the default executor so it doesn't block
+    the acknowledgements) or a coroutine function.
+
+    `path`, if set, is the only path deliveries are accepted on.
+    """
+
+    def __init__(
+        self,
+        consumer,
+        host="127.0.0.1",
+        port=8080,
+        path=None,
+        max_queue_size=10000,
+        batch_size=100,
+        batch_timeout=0.05,
+        enqueue_timeout=1.0,
+        max_body_size=1024 * 1024,
+    ):
+        if batch_size < 1:
+            raise ImproperlyConfigured("batch_size must be at least 1")
+
+        self.consumer = consumer
+        self.host = host
+        self.port = port
+        self.path = path
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.enqueue_timeout = enqueue_timeout
+        self.max_body_size = max_body_size
+
+        self.received = 0
+        self.rejected = 0
+        self.delivered = 0
+
+        self._queue = None
+        self._server = None
+        self._consumer_task = None
+
+    @property
+    def queue_size(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        # Port 0 lets the OS pick one, expose the actual one
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._consumer_task = asyncio.ensure_future(self._consume())
+
+    async def stop(self):
+        """
+        Stops accepting deliveries and waits until all queued events were consumed
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        if self._consumer_task is not None:
+            await self._queue.join()
+            self._consumer_task.cancel()
+            try:
+                await self._consumer_task
+            except asyncio.CancelledError:
+                pass
+            self._consumer_task = None
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    def run(self):
+        """
+        Blocks, serving deliveries until interrupted
+        """
+        try:
+            asyncio.run(self.serve_forever())
+        except KeyboardInterrupt:
+            pass
+
+    async def _enqueue(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self._queue.put(event), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                keep_alive = await self._handle_request(reader, writer)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader, writer):
+        """
+        Reads a single request off the connection and answers it.
+        Returns whether the connection should be kept open
+        """
+        # Lines over the reader's limit raise a ValueError
+        try:
+            request_line = await reader.readline()
+        except ValueError:
+            await self._respond(writer, 414, keep_alive=False)
+            return False
+        if not request_line:
+            return False
+
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            await self._respond(writer, 400, keep_alive=False)
+            return False
+
+        headers = {}
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                await self._respond(writer, 431, keep_alive=False)
+                return False
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        connection = headers.get("connection", "").lower()
+        if version == "HTTP/1.0":
+            keep_alive = connection == "keep-alive"
+        else:
+            keep_alive = connection != "close"
+
+        if "content-length" not in headers:
+            await self._respond(writer, 411, keep_alive=False)
+            return False
+
+        content_length = headers["content-length"]
+        if not (content_length.isascii() and content_length.isdigit()):
+            await self._respond(writer, 400, keep_alive=False)
+            return False
+
+        content_length = int(content_length)
+        if content_length > self.max_body_size:
+            await self._respond(writer, 413, keep_alive=False)
+            return False
+
+        body = await reader.readexactly(content_length)
+
+        if method != "POST":
+            await self._respond(writer, 405, keep_alive)
+            return keep_alive
+
+        if self.path is not None and target.split("?", 1)[0] != self.path:
+            await self._respond(writer, 404, keep_alive)
+            return keep_alive
+
+        try:
+            event = json.loads(body) if body else {}
+        except ValueError:
+            await self._respond(writer, 400, keep_alive)
+            return keep_alive
+
+        if await self._enqueue(event):
+            self.received += 1
+            await self._respond(writer, 200, keep_alive)
+        else:
+            self.rejected += 1
+            await self._respond(writer, 503, keep_alive, retry_after=1)
+        return keep_alive
+
+    async def _respond(self, writer, status, keep_alive, retry_after=None):
+        head = [
+            "HTTP/1.1 {} {}".format(status, _REASONS[status]),
+            "Content-Length: 0",
+            "Connection: {}".format("keep-alive" if keep_alive else "close"),
+        ]
+        if retry_after is not None:
+            head.append("Retry-After: {}".format(retry_after))
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def _next_batch(self):
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_timeout
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            try:
+                if asyncio.iscoroutinefunction(self.consumer):
+                    await self.consumer(batch)
+                else:
+                    await loop.run_in_executor(None, self.consumer, batch)
+                self.delivered += len(batch)
+            except Exception:
+                logger.exception("webhook consumer failed on a batch of %d events", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
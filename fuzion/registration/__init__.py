@@ -5,6 +5,8 @@ from fuzion.mixins import RetrieveNotSupportedMixin
 class Attendee(RetrieveNotSupportedMixin, Resource):
     path = "attendees"
     object_id_attr_name = "fuzion_attendee_id"
+    max_staleness = 30
+    stale_if_error = 10 * 60
 
 
 class Option(RetrieveNotSupportedMixin, Resource):
@@ -0,0 +1,310 @@
+"""
+A local, indexed replica of an event's resources.
+
+The replica bulk-loads the configured resources once and is then kept current
+by applying the notifications Fuzion delivers to a registered `NotificationWebhook`.
+Only the objects mentioned in a notification are re-fetched, reads never hit the API.
+
+Usage:
+-----
+from fuzion import Attendee, Exhibitor
+from fuzion.replica import Replica
+
+replica = Replica(fuzion_event_id="EV123",
+                  resources={"attendee": Attendee, "exhibitor": Exhibitor},
+                  indexes={"attendee": ["registration_number"]})
+replica.load()
+replica.subscribe(callback_url="https://example.com/fuzion/notifications/")
+
+# in the webhook view:
+replica.apply(notification)
+
+# or coalesce bursts of notifications (see `fuzion.coalesce`):
+coalescer = Coalescer(replica.resources, on_flush=replica.apply_dirty_set)
+coalescer.add(notification)
+
+replica.get("attendee", "A123")
+replica.find("attendee", registration_number="RN1234")
+"""
+
+import threading
+
+from fuzion.coalesce import fetch_objects, notification_object_id
+from fuzion.exceptions import ImproperlyConfigured
+from fuzion.notification_webhook import NotificationWebhook
+
+
+class ReplicaStore:
+    """
+    Thread-safe in-memory store of objects of a single resource class,
+    indexed by the object id and by any number of secondary attributes
+    """
+
+    def __init__(self, object_id_attr_name, indexes=()):
+        self.object_id_attr_name = object_id_attr_name
+        self.objects = {}
+        self.indexes = {attr: {} for attr in indexes}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __contains__(self, object_id):
+        return object_id in self.objects
+
+    def _index(self, obj):
+        object_id = dict.get(obj, self.object_id_attr_name)
+        for attr, index in self.indexes.items():
+            if attr in obj:
+                index.setdefault(obj[attr], set()).add(object_id)
+
+    def _unindex(self, obj):
+        object_id = dict.get(obj, self.object_id_attr_name)
+        for attr, index in self.indexes.items():
+            ids = index.get(dict.get(obj, attr))
+            if ids is not None:
+                ids.discard(object_id)
+                if not ids:
+                    del index[obj[attr]]
+
+    def put(self, obj):
+        object_id = dict.get(obj, self.object_id_attr_name)
+        if object_id is None:
+            return
+        with self._lock:
+            existing = self.objects.get(object_id)
+            if existing is not None:
+                self._unindex(existing)
+            self.objects[object_id] = obj
+            self._index(obj)
+
+    def remove(self, object_id):
+        with self._lock:
+            existing = self.objects.pop(object_id, None)
+            if existing is not None:
+                self._unindex(existing)
+            return existing
+
+    def clear(self):
+        with self._lock:
+            self.objects.clear()
+            for index in self.indexes.values():
+                index.clear()
+
+    def replace(self, objects, keep=()):
+        """
+        Replaces all the objects with `objects`, at once.
+        The objects of the ids in `keep` are left as they are (or absent), whatever `objects` holds
+        """
+        with self._lock:
+            kept = {object_id: self.objects[object_id] for object_id in keep if object_id in self.objects}
+            self.clear()
+            for obj in objects:
+                if dict.get(obj, self.object_id_attr_name) not in keep:
+                    self.put(obj)
+            for obj in kept.values():
+                self.put(obj)
+
+    def get(self, object_id, default=None):
+        return self.objects.get(object_id, default)
+
+    def all(self):
+        with self._lock:
+            return list(self.objects.values())
+
+    def find(self, **filters):
+        """
+        Returns all objects matching all the given attribute values.
+        Uses the secondary indexes where available, scanning otherwise
+        """
+        with self._lock:
+            candidates = None
+            for attr, value in filters.items():
+                if attr in self.indexes:
+                    ids = self.indexes[attr].get(value, set())
+                    candidates = ids if candidates is None else candidates & ids
+
+            if candidates is None:
+                objects = self.objects.values()
+            else:
+                objects = (self.objects[object_id] for object_id in candidates)
+
+            return [
+                obj
+                for obj in objects
+                if all(dict.get(obj, attr) == value for attr, value in filters.items())
+            ]
+
+
+class Replica:
+    """
+    Keeps a local copy of the resources of a single event.
+
+    `resources` maps the notification `entity_type` (as registered with the
+    `NotificationWebhook`) to the resource class holding that entity, i.e. `{"attendee": Attendee}`
+    `indexes` optionally maps an `entity_type` to the attributes to index for `find`
+
+    Credentials default to the package level ones, as for any `Resource`
+    """
+
+    operations = ("insert", "update", "delete")
+
+    def __init__(
+        self,
+        fuzion_event_id,
+        resources,
+        indexes=None,
+        api_key=None,
+        api_secret_key=None,
+        host=None,
+        page_size=500,
+    ):
+        if not resources:
+            raise ImproperlyConfigured("Replica requires at least one resource class")
+
+        self.fuzion_event_id = fuzion_event_id
+        self.resources = dict(resources)
+        self.credentials = {
+            "api_key": api_key,
+            "api_secret_key": api_secret_key,
+            "host": host,
+        }
+        self.page_size = page_size
+        indexes = indexes or {}
+        self.stores = {
+            entity_type: ReplicaStore(
+                resource_class.object_id_attr_name, indexes.get(entity_type, ())
+            )
+            for entity_type, resource_class in self.resources.items()
+        }
+        # The ids of the objects changed by notifications, per entity type being loaded
+        self._loading = {}
+        self._loading_lock = threading.Lock()
+
+    def _resource(self, entity_type, **kwargs):
+        try:
+            resource_class = self.resources[entity_type]
+        except KeyError:
+            raise ImproperlyConfigured(
+                "entity type `{}` is not replicated".format(entity_type)
+            )
+        return resource_class(self.fuzion_event_id, **self.credentials, **kwargs)
+
+    def load(self, entity_types=None):
+        """
+        Bulk-loads (or re-loads) all objects of the given entity types, all of them by default.
+
+        Notifications applied while the pages are fetched are newer than the loaded pages,
+        the objects they changed are kept as they were applied
+        """
+        for entity_type in entity_types or self.resources:
+            changed = set()
+            with self._loading_lock:
+                self._loading[entity_type] = changed
+            try:
+                objects = []
+                for page in self._resource(entity_type).iter_pages(page_size=self.page_size):
+                    objects.extend(page)
+
+                with self._loading_lock:
+                    self.stores[entity_type].replace(objects, keep=changed)
+            finally:
+                with self._loading_lock:
+                    if self._loading.get(entity_type) is changed:
+                        del self._loading[entity_type]
+
+    def _changed(self, entity_type, object_ids):
+        with self._loading_lock:
+            changed = self._loading.get(entity_type)
+            if changed is not None:
+                changed.update(object_ids)
+
+    def _put(self, entity_type, obj):
+        self._changed(entity_type, [dict.get(obj, self.stores[entity_type].object_id_attr_name)])
+        self.stores[entity_type].put(obj)
+
+    def _remove(self, entity_type, object_id):
+        self._changed(entity_type, [object_id])
+        self.stores[entity_type].remove(object_id)
+
+    def subscribe(self, callback_url, entity_types=None, operations=None):
+        """
+        Registers a `NotificationWebhook` for every entity type and operation.
+        Returns the created webhooks
+        """
+        webhook = NotificationWebhook(self.fuzion_event_id, **self.credentials)
+        return [
+            webhook.post(
+                callback_url=callback_url,
+                entity_type=entity_type,
+                entity_operation=operation,
+            )
+            for entity_type in entity_types or self.resources
+            for operation in operations or self.operations
+        ]
+
+    def fetch(self, entity_type, object_ids):
+        """
+        Fetches the current state of the given objects from the server
+        """
+        return fetch_objects(self._resource(entity_type), object_ids, self.page_size)
+
+    def refresh(self, entity_type, object_ids):
+        """
+        Re-fetches the given objects and applies their current state,
+        objects that no longer exist on the server are removed from the replica
+        """
+        object_ids = set(object_ids)
+        if not object_ids:
+            return
+
+        object_id_attr_name = self.stores[entity_type].object_id_attr_name
+        fetched = self.fetch(entity_type, object_ids)
+
+        for obj in fetched:
+            if dict.get(obj, object_id_attr_name) in object_ids:
+                self._put(entity_type, obj)
+
+        for object_id in object_ids - {dict.get(obj, object_id_attr_name) for obj in fetched}:
+            self._remove(entity_type, object_id)
+
+    def apply(self, notification):
+        """
+        Applies a single webhook notification.
+        Deletions are applied locally, any other operation re-fetches the affected object
+
+        Notifications for entity types that are not replicated are ignored
+        """
+        entity_type = notification.get("entity_type")
+        if entity_type not in self.resources:
+            return
+
+        object_id = notification_object_id(self.resources[entity_type], notification)
+        if object_id is None:
+            return
+
+        if notification.get("entity_operation") == "delete":
+            self._remove(entity_type, object_id)
+        else:
+            self.refresh(entity_type, [object_id])
+
+    def apply_dirty_set(self, dirty_set):
+        """
+        Applies a `fuzion.coalesce.DirtySet`, re-fetching all the changed objects
+        of an entity type at once
+        """
+        for entity_type in dirty_set.entities:
+            if entity_type not in self.resources:
+                continue
+            for object_id in dirty_set.deleted(entity_type):
+                self._remove(entity_type, object_id)
+            self.refresh(entity_type, dirty_set.changed(entity_type))
+
+    def get(self, entity_type, object_id, default=None):
+        return self.stores[entity_type].get(object_id, default)
+
+    def all(self, entity_type):
+        return self.stores[entity_type].all()
+
+    def find(self, entity_type, **filters):
+        return self.stores[entity_type].find(**filters)
@@ -1,7 +1,9 @@
-import requests
 import fuzion
+from fuzion import hooks
 import hashlib
 import hmac
+import json
+import threading
 import time
 import base64
 from fuzion.exceptions import (
@@ -13,6 +15,54 @@ from fuzion.exceptions import (
     InternalServerError,
     ResourceUnavailableError,
 )
+from fuzion.results import PAGE_METADATA, Page, ResultList
+
+# `requests` is only imported when the first request is sent, see `_requests`
+requests = None
+
+# Fuzion errors on which a stale cached response is served instead, up to the resource's `stale_if_error`
+STALE_IF_ERROR_EXCEPTIONS = (
+    TooManyRequestsError,
+    InternalServerError,
+    ResourceUnavailableError,
+)
+
+
+def _serves_stale(error):
+    """
+    Whether a stale cached response is served instead of raising `error`: on connection errors,
+    timeouts, HTTP 5xx and `STALE_IF_ERROR_EXCEPTIONS`, not on client errors (revoked credentials,
+    deleted objects...)
+    """
+    if isinstance(error, STALE_IF_ERROR_EXCEPTIONS):
+        return True
+    from requests import ConnectionError, HTTPError, Timeout
+
+    if isinstance(error, HTTPError):
+        return error.response is not None and error.response.status_code >= 500
+    return isinstance(error, (ConnectionError, Timeout))
+
+
+def _requests():
+    """
+    Returns the `requests` module, importing it on first use
+    """
+    global requests
+    if requests is None:
+        import requests as requests_module
+
+        requests = requests_module
+    return requests
+
+
+# Keys of the cache entries being refreshed in the background
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+# Largest request body size (in bytes) accepted and smallest rejected with a 413 error,
+# per host and resource path
+_payload_sizes = {}
+_payload_sizes_lock = threading.Lock()
 
 
 class Resource(dict):
@@ -22,14 +72,26 @@ class Resource(dict):
     options = {}
     valid_options = ["params", "headers"]
     object_id_attr_name = None  # The object's id ('attendee_id' for Attendee, etc..)
+    transport = None  # Sends the requests instead of `requests.request`, defaults to `fuzion.transport`
+    cache = None  # A `fuzion.caching.SQLiteCache` for GET responses, defaults to `fuzion.cache`
+    cache_ttl = None  # Seconds GET responses are cached for, defaults to the cache's ttl
+    max_staleness = 0  # Seconds past expiry a cached response is served while refreshed in the background
+    stale_if_error = 0  # Seconds past expiry a cached response is served when the server fails
+    client = None  # A `fuzion.clients.Client`, its transport and cache take precedence when set
+    list_chunk_size = 100  # List filters longer than this are split in chunks queried separately (`query_all`)
+    list_chunk_concurrency = 4  # Chunks queried at a time
+    max_payload_bytes = None  # Largest request body sent, otherwise learned from the server's 413 errors
+    compress_request_min_bytes = None  # Write bodies of at least this size are gzipped, if the server accepts it
 
     def __init__(
-        self, fuzion_event_id, api_key=None, api_secret_key=None, host=None, *args, **kwargs
+        self, fuzion_event_id, api_key=None, api_secret_key=None, host=None, *args, scheme=None, client=None, **kwargs
     ):
         self.fuzion_event_id = fuzion_event_id
         self.api_key = api_key or fuzion.api_key
         self.api_secret_key = api_secret_key or fuzion.api_secret_key
         self.host = host or fuzion.host
+        self.scheme = scheme or self.scheme
+        self.client = client or self.client
 
         # If the object's id attibute was sent, set it for this instance
         if self.object_id_attr_name in kwargs:
@@ -95,8 +157,12 @@ class Resource(dict):
         
         Returns the payload of the response (without the meta-data part)
         """
-        response_data = response.json()
+        return self.process_response_data(response.json(), response)
 
+    def process_response_data(self, response_data, response=None):
+        """
+        Same as `process_response`, for the already decoded response body
+        """
         if response_data["error"]:
             status = response_data["status"]
 
@@ -119,35 +185,44 @@ class Resource(dict):
                 status=status,
                 reason=response_data["reason"],
                 message=response_data["message"],
-                request=response.request,
+                request=getattr(response, "request", None),
                 response=response,
             )
 
         payload = response_data.get("payload", None)
         return payload
 
+    def _decode(self, response=None, body=None):
+        """
+        Decodes the response (or its already read `body`), see `process_response_data`.
+        Returns the payload and the page metadata of the response
+        """
+        response_data = response.json() if body is None else json.loads(body)
+        payload = self.process_response_data(response_data, response)
+        return payload, {key: response_data.get(key) for key in PAGE_METADATA}
+
     def process_payload(self, payload):
         return self.__class__.new(self.fuzion_event_id,
                                   payload, 
                                   api_key=self.api_key, 
                                   api_secret_key=self.api_secret_key, 
-                                  host=self.host)
+                                  host=self.host,
+                                  scheme=self.scheme,
+                                  client=self.client)
 
     @classmethod
     def new(cls, fuzion_event_id, item, *args, **kwargs):
         """
         Creates a new instance of the underlying class
         
-        If the payload is a list, creates a list of instances
+        If the payload is a list, returns a `ResultList` building the instances on access
         """
         if isinstance(item, list):
-            return list(
-                cls(fuzion_event_id, *args, **{**rec, **kwargs}) for rec in item
-            )
+            return ResultList(item, cls, fuzion_event_id, *args, **kwargs)
         else:
             return cls(fuzion_event_id, *args, **{**item, **kwargs})
 
-    def extract_options(self, path, http_verb, values):
+    def extract_options(self, path, http_verb, values, sign=True):
         """
         Builds the options (params, json, headers) that will be sent along with the request.
         
@@ -156,32 +231,116 @@ class Resource(dict):
         
         handles params as list if necessary
         
-        adds the general request header to the supplied header, if any
+        adds the general request header to the supplied header, if any (unless `sign` is False)
         """
         options = {k: v for k, v in list(values.items()) if k in self.valid_options}
         options.update(self.options)
 
+        options.setdefault("params", {}).update(self._params(values))
+        headers = options.setdefault("headers", {})
+        if sign:
+            headers.update(self._get_general_request_header(path, http_verb))
+
+        return options
+
+    def _params(self, values):
         params = {k: v for k, v in list(values.items()) if k not in self.valid_options}
         for k in list(params):
             if isinstance(params[k], list):
                 params[k + "[]"] = params.pop(k)
+        return params
 
-        options.setdefault("params", {}).update(params)
-        options.setdefault("headers", {}).update(
-            self._get_general_request_header(path, http_verb)
-        )
+    def payload_size(self, values):
+        """
+        Returns the size in bytes of the JSON body sent by a write request with `values`
+        (a list of objects for bulk writes)
+        """
+        if not isinstance(values, list):
+            values = self._params(values)
+        return len(json.dumps(values).encode("UTF-8"))
 
-        return options
+    @property
+    def payload_limit(self):
+        """
+        The largest request body size (in bytes) sent to this resource's path: `max_payload_bytes`,
+        or less if the server rejected smaller bodies. None if not known
+        """
+        _, rejected = _payload_sizes.get(self.host + self.__class__.path, (0, None))
+        limits = [self.max_payload_bytes, rejected - 1 if rejected is not None else None]
+        limits = [limit for limit in limits if limit is not None]
+        return min(limits) if limits else None
 
-    def _request(self, method, path, values, paging={}):
+    def _batch_payload_limit(self):
         """
-        Performs the actual request.
-        
-        if `paging` is supplied, adds it as a header option
+        The size bulk writes are split to: the largest body accepted by the server
+        once it rejected one, otherwise `payload_limit`
+        """
+        accepted, rejected = _payload_sizes.get(self.host + self.__class__.path, (0, None))
+        if rejected is not None and accepted:
+            return min(accepted, self.payload_limit)
+        return self.payload_limit
+
+    def _learn_payload_size(self, size, accepted):
+        with _payload_sizes_lock:
+            sizes = _payload_sizes.setdefault(self.host + self.__class__.path, [0, None])
+            if accepted:
+                sizes[0] = max(sizes[0], size)
+            elif sizes[1] is None or size < sizes[1]:
+                sizes[1] = size
+
+    def get_transport(self):
+        if self.client is not None:
+            return self.client
+        return self.transport if self.transport is not None else fuzion.transport
+
+    def get_cache(self):
+        if self.client is not None and self.client.cache is not None:
+            return self.client.cache
+        return self.cache if self.cache is not None else fuzion.cache
+
+    @property
+    def cache_scope(self):
+        """
+        The cache entries of this resource's path, invalidated together on writes
+        """
+        return "{}|{}{}".format(self.fuzion_event_id, self.host, self.path)
+
+    def _cache_key(self, http_verb, endpoint, values, paging):
+        """
+        Cache key of a request: everything that goes into it but the
+        request timestamp and signature
+        """
+        key = json.dumps(
+            [http_verb, endpoint, self.fuzion_event_id, self.api_key, values, paging],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(bytes(key, "UTF-8")).hexdigest()
+
+    def _send(self, method, path, values, paging, event=None):
+        """
+        Builds the request options, signs and sends the request
+        with the transport, if one is set.
+        Returns the `requests.Response`
+
+        When an `event` is given, the phases are timed and the response body is read
         """
         http_verb = method.upper()
 
-        options = self.extract_options(path, http_verb, values)
+        body = None
+        if isinstance(values, list):
+            # A bulk write, the objects are sent as a JSON array
+            values, body = {}, values
+
+        if event is None:
+            options = self.extract_options(path, http_verb, values)
+        else:
+            options = hooks.timed(
+                event, "options", self.extract_options, path, http_verb, values, sign=False
+            )
+            options["headers"].update(
+                hooks.timed(event, "sign", self._get_general_request_header, path, http_verb)
+            )
 
         if paging:
             headers = options.get("headers", {})
@@ -190,14 +349,258 @@ class Resource(dict):
 
         endpoint = self.scheme + "://" + self.host + path
 
+        body_bytes = None
         if method not in ["get", "head", "options"]:
-            # Always post as a JSON object
-            options["json"] = options.pop("params", {})
+            # Always post as a JSON object (or array)
+            params = options.pop("params", {})
+            body = params if body is None else body
+            options["json"] = body
+
+            if self.compress_request_min_bytes is not None:
+                # imported here as `gzip` is only needed once compression is enabled
+                from fuzion import compression
+
+                data = json.dumps(body, allow_nan=False).encode("UTF-8")
+                if len(data) >= self.compress_request_min_bytes:
+                    body_bytes = len(data)
+                    del options["json"]
+                    options["data"] = compression.compress(data, "gzip")
+                    options["headers"].update(
+                        {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+                    )
 
-        response = requests.request(method, endpoint, **options)
+        transport = self.get_transport()
+        send = _requests().request if transport is None else transport.request
+
+        if event is None:
+            return send(method, endpoint, **options)
+
+        response = hooks.timed(
+            event, "time_to_first_byte", send, method, endpoint, stream=True, **options
+        )
+        content = hooks.timed(event, "download", getattr, response, "content")
+        request_body = getattr(response.request, "body", None)
+
+        event.status = response.status_code
+        event.request_wire_bytes = len(request_body) if request_body else 0
+        event.request_bytes = body_bytes if body_bytes is not None else event.request_wire_bytes
+        event.response_bytes = len(content) if content else 0
+
+        # Bytes read from the connection, before decompression
+        raw = getattr(response, "raw", None)
+        wire_bytes = raw.tell() if hasattr(raw, "tell") else None
+        event.response_wire_bytes = wire_bytes if isinstance(wire_bytes, int) else event.response_bytes
+        return response
+
+    def _request(self, method, path, values, paging={}, construct=True):
+        """
+        Performs the actual request.
+        
+        if `paging` is supplied, adds it as a header option
+
+        Returns the objects built by `process_payload`, or the decoded payload if `construct` is False.
+        Lists of objects (`ResultList`) and of records (`Page`) carry the page metadata of the response
+
+        GET responses are served from and stored in the cache, if one is set.
+        Any other successful request invalidates the cached responses of this resource's path
+
+        Reports a `fuzion.hooks.RequestEvent` to the registered hooks, if any
+        """
+        if not hooks.is_active():
+            return self._perform(method, path, values, paging, construct=construct)
+
+        event = hooks.RequestEvent(self.__class__, path, method.upper())
+        started = time.perf_counter()
+        try:
+            return self._perform(method, path, values, paging, event, construct)
+        except Exception as e:
+            event.error = e
+            raise
+        finally:
+            event.timings["total"] = time.perf_counter() - started
+            hooks.emit(event)
+
+    def _construct(self, payload, event=None, construct=True, metadata=None):
+        if not construct:
+            if metadata and isinstance(payload, list):
+                payload = Page(payload)
+                for key, value in metadata.items():
+                    setattr(payload, key, value)
+            return payload
+        # for a list payload, this times the `ResultList` only, its objects are built when accessed
+        result = hooks.timed(event, "construct", self.process_payload, payload)
+        if metadata and isinstance(result, ResultList):
+            for key, value in metadata.items():
+                setattr(result, key, value)
+        return result
+
+    def _perform(self, method, path, values, paging, event=None, construct=True):
+        cache = self.get_cache()
+        if cache is not None and method == "get":
+            return self._cached_request(cache, method, path, values, paging, event, construct)
+
+        size = None
+        if method not in ["get", "head", "options"]:
+            size = self.payload_size(values)
+            limit = self.payload_limit
+            if limit is not None and size > limit:
+                raise PayloadTooLargeError(
+                    status=413,
+                    reason=None,
+                    message="Request body of {} bytes over the {} bytes limit of {}".format(
+                        size, limit, self.__class__.path
+                    ),
+                    request=None,
+                    response=None,
+                )
+
+        response = self._send(method, path, values, paging, event)
+
+        if response.status_code == 200:
+            try:
+                payload, metadata = hooks.timed(event, "decode", self._decode, response)
+            except PayloadTooLargeError:
+                if size is not None:
+                    self._learn_payload_size(size, accepted=False)
+                raise
+            if size is not None:
+                self._learn_payload_size(size, accepted=True)
+            if cache is not None:
+                cache.invalidate(self.cache_scope)
+            return self._construct(payload, event, construct, metadata)
+
+        if response.status_code == 413 and size is not None:
+            # Gateways and proxies reject large bodies with an HTTP 413 rather than in the envelope
+            self._learn_payload_size(size, accepted=False)
+            raise PayloadTooLargeError(
+                status=413,
+                reason=response.reason,
+                message="Request body of {} bytes rejected by {}".format(size, self.__class__.path),
+                request=getattr(response, "request", None),
+                response=response,
+            )
+
+        response.raise_for_status()
+
+    def _write_many(self, method, path, records):
+        """
+        Sends the `records` as JSON arrays, in as few requests as the path's `payload_limit` allows.
+
+        Batches over the limit are split before being sent, to the size of the largest body
+        the server accepted if it rejected one. A batch rejected by the server as too large
+        is split again with what was learned from the error.
+        Returns the objects built from all the responses
+        """
+        results = []
+        batches = [list(records)]
+        while batches:
+            batch = batches.pop()
+            if not batch:
+                continue
+
+            size = self.payload_size(batch)
+            limit = self.payload_limit
+            if limit is not None and size > limit and len(batch) > 1:
+                pieces = max(2, -(-size // self._batch_payload_limit()))
+                piece = -(-len(batch) // pieces)
+                batches.extend(
+                    reversed([batch[i : i + piece] for i in range(0, len(batch), piece)])
+                )
+                continue
+
+            try:
+                written = self._request(method=method, path=path, values=batch)
+            except PayloadTooLargeError:
+                limit = self.payload_limit
+                if len(batch) == 1 or limit is None or size <= limit:
+                    raise
+                batches.append(batch)
+                continue
+
+            results.extend(written or [])
+        return results
+
+    def _fetch_into_cache(self, cache, cache_key, method, path, values, paging, event=None):
+        """
+        Sends a GET request and stores its successful response in the cache.
+        Returns the response payload and page metadata
+        """
+        response = self._send(method, path, values, paging, event)
 
         if response.status_code == 200:
-            payload = self.process_response(response)
-            return self.process_payload(payload)
+            decoded = hooks.timed(event, "decode", self._decode, response)
+            cache.set(
+                cache_key,
+                response.content,
+                self.cache_ttl,
+                self.cache_scope,
+                max(self.max_staleness, self.stale_if_error),
+            )
+            return decoded
 
         response.raise_for_status()
+
+    def _revalidate(self, cache, cache_key, method, path, values, paging):
+        """
+        Refreshes a stale cache entry in a background thread,
+        at most one refresh per entry at a time
+        """
+        with _revalidating_lock:
+            if cache_key in _revalidating:
+                return
+            _revalidating.add(cache_key)
+
+        def refresh():
+            try:
+                self._fetch_into_cache(cache, cache_key, method, path, values, paging)
+            except Exception:
+                # The stale entry keeps being served until `max_staleness`
+                pass
+            finally:
+                with _revalidating_lock:
+                    _revalidating.discard(cache_key)
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def _process_cached(self, body, event=None, construct=True):
+        payload, metadata = hooks.timed(event, "decode", self._decode, body=body)
+        return self._construct(payload, event, construct, metadata)
+
+    def _cached_request(self, cache, method, path, values, paging, event=None, construct=True):
+        """
+        Serves a GET request from the cache.
+
+        Fresh entries are served as-is. Entries that expired less than `max_staleness`
+        seconds ago are served right away and refreshed in the background.
+        Otherwise the request is sent, and if the server fails, entries that expired less than
+        `stale_if_error` seconds ago are served instead of raising
+        """
+        endpoint = self.scheme + "://" + self.host + path
+        cache_key = self._cache_key(method.upper(), endpoint, values, paging)
+
+        entry = cache.get_entry(cache_key)
+        if entry is not None:
+            staleness = entry.staleness()
+            if staleness <= self.max_staleness:
+                if staleness > 0:
+                    self._revalidate(cache, cache_key, method, path, values, paging)
+                if event is not None:
+                    event.cache = "hit" if staleness <= 0 else "stale"
+                    event.response_bytes = len(entry.value)
+                return self._process_cached(entry.value, event, construct)
+
+        if event is not None:
+            event.cache = "miss"
+
+        try:
+            payload, metadata = self._fetch_into_cache(
+                cache, cache_key, method, path, values, paging, event
+            )
+        except Exception as e:
+            if entry is None or entry.staleness() > self.stale_if_error or not _serves_stale(e):
+                raise
+            if event is not None:
+                event.cache = "stale-if-error"
+            return self._process_cached(entry.value, event, construct)
+
+        return self._construct(payload, event, construct, metadata)
@@ -0,0 +1,147 @@
+"""
+The results of list requests.
+
+`ResultList` is a list holding the decoded records of a list payload, building the resource object
+of a record only when it is accessed, so counting the results, looking at a few of them or encoding
+them to JSON does not build an object per record.
+
+Usage:
+-----
+attendees = Attendee(fuzion_event_id="EV123").query()  # a `ResultList`, no `Attendee` built yet
+len(attendees)
+attendees[0].put(first_name="John")  # builds the first `Attendee` only
+attendees.records[1]["contact"]  # the decoded record, as returned by the server
+attendees.total_count  # the number of attendees on the server, from the response's page metadata
+"""
+
+# The fields of the response envelope describing the page, kept on the `Page` and `ResultList`
+PAGE_METADATA = ("page_size", "start", "total_count", "date", "build")
+
+
+class Page(list):
+    """
+    The decoded records of a list payload, with the page metadata of the response
+    (`page_size`, `start`, `total_count`, `date` and `build`, None if not known)
+    """
+
+    __slots__ = PAGE_METADATA
+
+    def __init__(self, records=()):
+        list.__init__(self, records)
+        for key in PAGE_METADATA:
+            setattr(self, key, None)
+
+    @property
+    def has_more(self):
+        """
+        Whether the server holds objects past this page, None if its `total_count` is not known
+        """
+        if self.total_count is None:
+            return None
+        return (self.start or 0) + len(self) < self.total_count
+
+
+class ResultList(Page):
+    """
+    A list of `resource_class` objects built on access from the decoded `records`,
+    with `fuzion_event_id` and the given arguments (credentials, parent object...).
+
+    The list holds the decoded records and replaces each of them with its object the first time
+    it is read, accessing it again returns the same object. Records added as plain dicts are built
+    on access too. `json.dumps` encodes the list as is, without building the objects.
+
+    The page metadata of the response (`page_size`, `start`, `total_count`, `date` and `build`)
+    is set by the resource once the list is built, slices do not keep it
+    """
+
+    __slots__ = ("records", "resource_class", "fuzion_event_id", "args", "kwargs")
+
+    def __init__(self, records, resource_class, fuzion_event_id, *args, **kwargs):
+        Page.__init__(self, records)
+        self.records = records
+        self.resource_class = resource_class
+        self.fuzion_event_id = fuzion_event_id
+        self.args = args
+        self.kwargs = kwargs
+
+    def _build(self, item):
+        if type(item) is dict:
+            return self.resource_class(self.fuzion_event_id, *self.args, **{**item, **self.kwargs})
+        return item
+
+    def _object(self, index):
+        item = list.__getitem__(self, index)
+        obj = self._build(item)
+        if obj is not item:
+            list.__setitem__(self, index, obj)
+        return obj
+
+    def _build_all(self):
+        for index in range(len(self)):
+            self._object(index)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            sliced = ResultList(
+                list.__getitem__(self, index), self.resource_class, self.fuzion_event_id, *self.args, **self.kwargs
+            )
+            sliced.records = self.records[index]
+            return sliced
+        return self._object(index)
+
+    def __iter__(self):
+        return (self._object(index) for index in range(len(self)))
+
+    def __reversed__(self):
+        return (self._object(index) for index in range(len(self) - 1, -1, -1))
+
+    def __contains__(self, value):
+        return any(obj == value for obj in self)
+
+    def index(self, value, *args):
+        self._build_all()
+        return list.index(self, value, *args)
+
+    def count(self, value):
+        self._build_all()
+        return list.count(self, value)
+
+    def remove(self, value):
+        self._build_all()
+        list.remove(self, value)
+
+    def pop(self, index=-1):
+        return self._build(list.pop(self, index))
+
+    def sort(self, *args, **kwargs):
+        self._build_all()
+        list.sort(self, *args, **kwargs)
+
+    def copy(self):
+        return self[:]
+
+    def __eq__(self, other):
+        self._build_all()
+        if isinstance(other, ResultList):
+            other._build_all()
+        return list.__eq__(self, other)
+
+    def __ne__(self, other):
+        self._build_all()
+        if isinstance(other, ResultList):
+            other._build_all()
+        return list.__ne__(self, other)
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __mul__(self, count):
+        return list(self) * count
+
+    __rmul__ = __mul__
+
+    def __repr__(self):
+        return repr(list(self))
@@ -0,0 +1,248 @@
+"""
+Sinks the exported records are written to.
+
+A sink holds the records of one export target (such as an event), one output file per
+resource type, written incrementally: only the page being written is held in memory.
+
+`NDJSONSink` writes newline-delimited JSON, `CSVSink` comma-separated values.
+Both can gzip their outputs, every write is then a gzip member of its own so that
+the outputs remain valid (and resumable) wherever the export stops.
+
+Nested objects (such as an attendee's `contact`) can be flattened to dotted keys
+(`contact.first_name`), they always are in CSV outputs.
+
+Usage:
+-----
+from fuzion.sinks import CSVSink, NDJSONSink
+
+with NDJSONSink("exports/EV123") as sink:
+    sink.write("Attendee", Attendee(fuzion_event_id="EV123").query())
+
+# or, page by page and resumable (see `fuzion.export.export_resource`)
+with CSVSink("exports/EV123", compress=True) as sink:
+    Attendee(fuzion_event_id="EV123").export(sink, checkpoint="exports/EV123/Attendee.state")
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import threading
+
+from fuzion.exceptions import ImproperlyConfigured
+
+
+def encode_ndjson(records):
+    """
+    Encodes the records as newline-delimited JSON, one record per line
+    """
+    if not records:
+        return b""
+    return (
+        "\n".join(json.dumps(record, separators=(",", ":"), default=str) for record in records) + "\n"
+    ).encode("UTF-8")
+
+
+def decode_ndjson(data):
+    return [json.loads(line) for line in data.decode("UTF-8").splitlines() if line]
+
+
+def flatten(record, separator=".", prefix=""):
+    """
+    Returns the record with its nested dicts merged into it, their keys prefixed
+    with the parent's key and `separator`: {"contact": {"email": ...}} -> {"contact.email": ...}.
+    Empty nested dicts have no keys to merge and are left out
+    """
+    flat = {}
+    for key, value in record.items():
+        key = prefix + str(key)
+        if isinstance(value, dict):
+            flat.update(flatten(value, separator, key + separator))
+        else:
+            flat[key] = value
+    return flat
+
+
+class Sink:
+    """
+    Base class of the sinks writing every resource type's records to `<directory>/<name><extension>`,
+    with ".gz" appended if `compress` is set (at `compress_level`).
+    Nested objects are flattened when `flatten` is set.
+
+    Subclasses implement `encode`
+    """
+
+    extension = ""
+
+    def __init__(self, directory, compress=False, compress_level=6, flatten=False):
+        self.directory = directory
+        self.compress = compress
+        self.compress_level = compress_level
+        self.flatten = flatten
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, name + self.extension + (".gz" if self.compress else ""))
+
+    def encode(self, name, records):
+        """
+        Returns the records encoded for the output of `name`
+        """
+        raise NotImplementedError
+
+    def _file(self, name):
+        f = self._files.get(name)
+        if f is None:
+            os.makedirs(self.directory, exist_ok=True)
+            f = self._files[name] = open(self.path(name), "wb")
+        return f
+
+    def open(self, name, position=0):
+        """
+        Opens the output of `name` for writing at `position`, dropping anything written past it
+        """
+        with self._lock:
+            if name in self._files:
+                self._files.pop(name).close()
+            os.makedirs(self.directory, exist_ok=True)
+            f = open(self.path(name), "ab")
+            f.truncate(position)
+            f.seek(position)
+            self._files[name] = f
+
+    def position(self, name):
+        """
+        Returns the size of the output of `name` written so far
+        """
+        with self._lock:
+            return self._file(name).tell()
+
+    def flush(self, name):
+        """
+        Makes sure the output of `name` written so far is on disk
+        """
+        with self._lock:
+            f = self._file(name)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write(self, name, data):
+        if not data:
+            return
+        if self.compress:
+            data = gzip.compress(data, self.compress_level)
+        self._file(name).write(data)
+
+    def write(self, name, records):
+        """
+        Appends the records to the output of `name`
+        """
+        with self._lock:
+            if self.flatten:
+                records = [flatten(record) for record in records]
+            self._write(name, self.encode(name, records))
+
+    def write_ndjson(self, name, data):
+        """
+        Appends records encoded by `encode_ndjson` to the output of `name`
+        """
+        self.write(name, decode_ndjson(data))
+
+    def close(self):
+        with self._lock:
+            for f in self._files.values():
+                f.close()
+            self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class NDJSONSink(Sink):
+    """
+    Writes newline-delimited JSON records
+    """
+
+    extension = ".ndjson"
+
+    def encode(self, name, records):
+        return encode_ndjson(records)
+
+    def write_ndjson(self, name, data):
+        if self.flatten:
+            return Sink.write_ndjson(self, name, data)
+        with self._lock:
+            self._write(name, data)
+
+
+class CSVSink(Sink):
+    """
+    Writes CSV records, after a header line.
+
+    The columns are `columns` if set (other keys are left out), otherwise the keys of the first records
+    written: later records with other non-null keys raise `ImproperlyConfigured` rather than losing them,
+    set `columns` for records whose fields vary. Lists are written as JSON, None as an empty value,
+    empty objects are left out
+    """
+
+    extension = ".csv"
+
+    def __init__(self, directory, columns=None, compress=False, compress_level=6, dialect="excel"):
+        Sink.__init__(self, directory, compress, compress_level, flatten=True)
+        self.columns = columns
+        self.dialect = dialect
+        self._columns = {}
+
+    def open(self, name, position=0):
+        Sink.open(self, name, position)
+        if position:
+            # Resuming, the header was already written
+            opener = gzip.open if self.compress else open
+            with opener(self.path(name), "rt", encoding="UTF-8", newline="") as f:
+                self._columns[name] = next(csv.reader(f, self.dialect))
+        else:
+            self._columns.pop(name, None)
+
+    def _value(self, value):
+        if value is None:
+            return ""
+        if isinstance(value, (list, dict)):
+            return json.dumps(value, separators=(",", ":"), default=str)
+        return value
+
+    def encode(self, name, records):
+        if not records:
+            return b""
+
+        output = io.StringIO(newline="")
+        columns = self._columns.get(name)
+        if columns is None:
+            columns = self.columns
+            if columns is None:
+                columns = list(dict.fromkeys(key for record in records for key in record))
+            self._columns[name] = columns
+            csv.writer(output, self.dialect).writerow(columns)
+        elif self.columns is None:
+            # Null fields are written blank whether they are in the header or not
+            known = set(columns)
+            missing = list(
+                dict.fromkeys(
+                    key for record in records for key, value in record.items() if key not in known and value is not None
+                )
+            )
+            if missing:
+                raise ImproperlyConfigured(
+                    "{} records have fields missing from the CSV header ({}), set the sink's `columns`".format(
+                        name, ", ".join(missing)
+                    )
+                )
+
+        writer = csv.DictWriter(output, columns, restval="", extrasaction="ignore", dialect=self.dialect)
+        for record in records:
+            writer.writerow({key: self._value(value) for key, value in record.items()})
+        return output.getvalue().encode("UTF-8")
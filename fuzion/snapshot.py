@@ -0,0 +1,229 @@
+"""
+All the objects of an event, fetched concurrently.
+
+`snapshot` fully paginates every listable resource class (or the given ones) of an event
+with a single pool of `concurrency` threads, and returns an `EventSnapshot` holding the objects
+and the timing of every resource class.
+
+Pages are fetched `window` at a time per resource class after the first one, the size of the pages
+actually served by the server and its `total_count` known. Without a `total_count`, pages are fetched
+until an empty one comes back.
+Objects are kept in page order, and an object shifted to the next page by concurrent changes
+on the server is only kept once.
+
+Usage:
+-----
+from fuzion import Attendee, Exhibitor
+from fuzion.snapshot import snapshot
+
+event = snapshot("EV123", concurrency=8)
+attendees = event[Attendee]
+print(event.timings["Exhibitor"])
+"""
+
+import collections
+import concurrent.futures
+import time
+
+from fuzion.mixins import ListObjectsPaginationMixin, is_last_page, page_step
+
+# `started` is the offset from the start of the snapshot, `elapsed` the time until the last page,
+# `request_time` the sum of the time spent in the requests of the resource class
+ResourceTiming = collections.namedtuple(
+    "ResourceTiming", ["pages", "records", "started", "elapsed", "request_time"]
+)
+
+
+class EventSnapshot:
+    """
+    The objects of an event, by resource class name
+    """
+
+    def __init__(self, fuzion_event_id):
+        self.fuzion_event_id = fuzion_event_id
+        self.objects = {}
+        self.timings = {}
+        self.errors = {}
+        self.started = time.time()
+        self.elapsed = None
+
+    def _name(self, key):
+        return key if isinstance(key, str) else key.__name__
+
+    def __getitem__(self, key):
+        return self.objects[self._name(key)]
+
+    def __contains__(self, key):
+        return self._name(key) in self.objects
+
+    def __iter__(self):
+        return iter(self.objects)
+
+    def __len__(self):
+        return len(self.objects)
+
+    @property
+    def records(self):
+        return sum(len(objects) for objects in self.objects.values())
+
+    def __repr__(self):
+        return "<EventSnapshot {}: {} resources, {} records>".format(
+            self.fuzion_event_id, len(self.objects), self.records
+        )
+
+
+class _Pagination:
+    """
+    The pages of one resource class
+    """
+
+    def __init__(self, resource, page_size):
+        self.resource = resource
+        self.name = resource.__class__.__name__
+        self.paginated = isinstance(resource, ListObjectsPaginationMixin)
+        self.page_size = page_size
+        self.step = page_size  # The size of the pages served, known once the first page came back
+        self.planned = False
+        self.pages = {}
+        self.next_start = 0
+        self.outstanding = 0
+        self.end = None  # `start` of the last page
+        self.total_count = None
+        self.started = None
+        self.finished = None
+        self.request_time = 0.0
+        self.error = None
+
+    def fetch(self, start):
+        started = time.perf_counter()
+        if self.paginated:
+            page = self.resource.query(page_size=self.page_size, start=start)
+        else:
+            page = self.resource.query()
+        return page or [], time.perf_counter() - started
+
+    def objects(self):
+        """
+        Returns the objects of all the pages in order, without duplicates
+        """
+        seen = set()
+        objects = []
+        object_id_attr_name = self.resource.object_id_attr_name
+        for start in sorted(self.pages):
+            if self.end is not None and start > self.end:
+                continue
+            for obj in self.pages[start]:
+                object_id = dict.get(obj, object_id_attr_name) if object_id_attr_name else None
+                if object_id is not None:
+                    if object_id in seen:
+                        continue
+                    seen.add(object_id)
+                objects.append(obj)
+        return objects
+
+
+def snapshot(
+    fuzion_event_id,
+    resources=None,
+    concurrency=8,
+    page_size=500,
+    window=4,
+    raise_errors=True,
+    client=None,
+    **credentials
+):
+    """
+    Fetches all the objects of `resources` (every listable resource class if not set)
+    of the event, at most `concurrency` requests at a time.
+
+    Requests are sent through `client` (see `fuzion.clients`) if set, otherwise with
+    the given `api_key`, `api_secret_key`, `host` and `scheme` or the package's defaults.
+
+    If a resource class fails, the first error is raised once the requests in flight are done,
+    unless `raise_errors` is False, then the errors are set on the snapshot's `errors`
+    """
+    from fuzion.export import listable_resources
+
+    event = EventSnapshot(fuzion_event_id)
+    started = time.perf_counter()
+
+    paginations = []
+    for resource_class in resources or listable_resources():
+        if client is not None:
+            resource = client.resource(resource_class, fuzion_event_id)
+        else:
+            resource = resource_class(fuzion_event_id, **credentials)
+        paginations.append(_Pagination(resource, page_size))
+
+    futures = {}
+
+    def submit(pagination):
+        if pagination.started is None:
+            pagination.started = time.perf_counter()
+        futures[executor.submit(pagination.fetch, pagination.next_start)] = (
+            pagination,
+            pagination.next_start,
+        )
+        pagination.next_start += pagination.step
+        pagination.outstanding += 1
+
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        for pagination in paginations:
+            submit(pagination)
+
+        while futures:
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                pagination, start = futures.pop(future)
+                pagination.outstanding -= 1
+                if pagination.error is not None:
+                    continue
+
+                try:
+                    page, elapsed = future.result()
+                except Exception as e:
+                    pagination.error = event.errors[pagination.name] = e
+                    if raise_errors:
+                        for pending in futures:
+                            pending.cancel()
+                    continue
+
+                pagination.pages[start] = page
+                pagination.request_time += elapsed
+                pagination.finished = time.perf_counter()
+
+                total_count = getattr(page, "total_count", None)
+                if total_count:
+                    pagination.total_count = total_count
+
+                if not pagination.planned:
+                    pagination.planned = True
+                    pagination.step = page_step(pagination.page_size, len(page))
+                    pagination.next_start = start + pagination.step
+
+                if not pagination.paginated or is_last_page(start, len(page), pagination.total_count):
+                    if pagination.end is None or start < pagination.end:
+                        pagination.end = start
+                elif pagination.end is None and not (raise_errors and event.errors):
+                    while pagination.outstanding < window and (
+                        pagination.total_count is None or pagination.next_start < pagination.total_count
+                    ):
+                        submit(pagination)
+
+    if raise_errors and event.errors:
+        raise next(iter(event.errors.values()))
+
+    for pagination in paginations:
+        if pagination.error is not None:
+            continue
+        objects = event.objects[pagination.name] = pagination.objects()
+        event.timings[pagination.name] = ResourceTiming(
+            pages=len([start for start, page in pagination.pages.items() if page and start <= pagination.end]),
+            records=len(objects),
+            started=pagination.started - started,
+            elapsed=pagination.finished - pagination.started,
+            request_time=pagination.request_time,
+        )
+
+    event.elapsed = time.perf_counter() - started
+    return event
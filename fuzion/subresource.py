@@ -37,6 +37,8 @@ class SubResource(Resource):
         kwargs.setdefault("api_key", self.parent_object.api_key)
         kwargs.setdefault("api_secret_key", self.parent_object.api_secret_key)
         kwargs.setdefault("host", self.parent_object.host)
+        kwargs.setdefault("scheme", self.parent_object.scheme)
+        kwargs.setdefault("client", self.parent_object.client)
         
         Resource.__init__(self, *args, **kwargs)
 
@@ -1,3 +1,6 @@
+import json
+import os
+import tempfile
 import unittest
 
 from unittest.mock import patch
@@ -37,10 +40,15 @@ class MockResource:
 
 
 class Response:
-    def __init__(self, payload):
+    def __init__(self, payload, status_code=200):
         self.payload = payload
+        self.status_code = status_code
         self.request = {}
 
+    @property
+    def content(self):
+        return json.dumps(self.payload).encode("UTF-8")
+
     def json(self):
         """
         Mocks requests.Response by providing this method
@@ -48,6 +56,34 @@ class Response:
         return self.payload
 
 
+def numpy_available():
+    import importlib.util
+
+    return importlib.util.find_spec("numpy") is not None
+
+
+def success_response(payload, **meta):
+    """
+    Wraps the payload with Fuzion's successful response envelope
+    """
+    return Response(
+        {
+            "type": "json",
+            "build": "0.1.8",
+            "status": 200,
+            "reason": 0,
+            "message": "Request was successful",
+            "error": False,
+            "date": "2018-01-15 14:30:32.123 EST",
+            "page_size": 500,
+            "start": 0,
+            "total_count": len(payload) if isinstance(payload, list) else 1,
+            "payload": payload,
+            **meta,
+        }
+    )
+
+
 class TestResource(unittest.TestCase):
     def test_generate_partner_app_signature(self):
         request_timestamp = "1539596918424"
@@ -1932,5 +1968,1624 @@ class TestErrorWebhook(unittest.TestCase):
         )
 
 
+class TestPagination(unittest.TestCase):
+    def test_page_step_and_last_page(self):
+        from fuzion.mixins import is_last_page, page_step
+
+        self.assertEqual(page_step(1000, 1000), 1000)
+        self.assertEqual(page_step(1000, 500), 500)
+        self.assertEqual(page_step(1000, 0), 1000)
+
+        self.assertTrue(is_last_page(0, 0))
+        self.assertFalse(is_last_page(0, 500))
+        self.assertFalse(is_last_page(0, 500, 1200))
+        self.assertTrue(is_last_page(1000, 200, 1200))
+
+    @patch("fuzion.resource.requests")
+    def test_iter_pages_stops_at_total_count(self, requests):
+        requests.request.side_effect = [
+            success_response([{"fuzion_attendee_id": "1"}, {"fuzion_attendee_id": "2"}], total_count=3),
+            success_response([{"fuzion_attendee_id": "3"}], total_count=3),
+        ]
+        attendees = MockResource.new(Attendee(fuzion_event_id="123"))
+
+        pages = list(attendees.iter_pages(page_size=2))
+
+        self.assertEqual([len(page) for page in pages], [2, 1])
+        self.assertEqual(
+            requests.request.call_args_list[1][1]["headers"]["start"], "2"
+        )
+
+    @patch("fuzion.resource.requests")
+    def test_query_all(self, requests):
+        requests.request.side_effect = [
+            success_response([{"fuzion_attendee_id": "1"}, {"fuzion_attendee_id": "2"}]),
+            success_response([]),
+        ]
+        attendees = MockResource.new(Attendee(fuzion_event_id="123")).query_all(page_size=2)
+        self.assertEqual([a.fuzion_attendee_id for a in attendees], ["1", "2"])
+
+    @patch("fuzion.resource.requests")
+    def test_without_total_count_stops_on_empty_page(self, requests):
+        requests.request.side_effect = [
+            success_response([{"fuzion_attendee_id": "1"}], total_count=0),
+            success_response([{"fuzion_attendee_id": "2"}], total_count=0),
+            success_response([], total_count=0),
+        ]
+        pages = list(Attendee(fuzion_event_id="123").iter_payloads(page_size=2))
+
+        self.assertEqual([len(page) for page in pages], [1, 1])
+        self.assertEqual(requests.request.call_args_list[1][1]["headers"]["start"], "1")
+
+    def test_server_capped_page_size(self):
+        from fuzion.columnar import ColumnarSnapshot, write_resource
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.sinks import NDJSONSink, decode_ndjson
+
+        with FakeFuzionServer(records=1200, max_page_size=500) as server, tempfile.TemporaryDirectory() as directory:
+            attendees = server.resource(Attendee)
+
+            numbers = [attendee["number"] for attendee in attendees.query_all(page_size=1000)]
+            self.assertEqual(numbers, list(range(1200)))
+            self.assertEqual(len(attendees.query_columns(page_size=1000, numpy=False)["number"]), 1200)
+
+            with NDJSONSink(directory) as sink:
+                self.assertEqual(attendees.export(sink, page_size=1000), 1200)
+            with open(os.path.join(directory, "Attendee.ndjson"), "rb") as f:
+                self.assertEqual(len(decode_ndjson(f.read())), 1200)
+
+            path = os.path.join(directory, "attendees.fzc")
+            self.assertEqual(write_resource(attendees, path, page_size=1000), 1200)
+            snapshot = ColumnarSnapshot(path)
+            self.assertEqual(len(snapshot), 1200)
+            snapshot.close()
+
+    @patch("fuzion.resource.requests")
+    def test_page_metadata(self, requests):
+        requests.request.return_value = success_response(
+            [{"fuzion_attendee_id": "3"}, {"fuzion_attendee_id": "4"}], start=2, page_size=2, total_count=5
+        )
+        page = Attendee(fuzion_event_id="123").query(page_size=2, start=2)
+
+        self.assertEqual((page.page_size, page.start, page.total_count), (2, 2, 5))
+        self.assertEqual(page.date, "2018-01-15 14:30:32.123 EST")
+        self.assertEqual(page.build, "0.1.8")
+        self.assertTrue(page.has_more)
+
+    def test_count(self):
+        from fuzion.caching import SQLiteCache
+        from fuzion.fake_server import FakeFuzionServer
+
+        with FakeFuzionServer(records=25) as server:
+            self.assertEqual(server.resource(Attendee).count(), 25)
+            self.assertEqual(server.requests, 1)
+
+            # Served from the cache, with its metadata
+            with tempfile.TemporaryDirectory() as directory:
+                attendees = server.resource(Attendee)
+                attendees.cache = SQLiteCache(os.path.join(directory, "cache.sqlite3"), ttl=60)
+                self.assertEqual(attendees.query(page_size=10, start=20).total_count, 25)
+                page = attendees.query(page_size=10, start=20)
+                self.assertEqual(server.requests, 2)
+        self.assertEqual(len(page), 5)
+        self.assertFalse(page.has_more)
+
+
+class TestChunkedQueries(unittest.TestCase):
+    def test_split_list_values(self):
+        from fuzion.mixins import _split_list_values
+
+        values = {"a[]": None, "ids": [1, 2, 3], "flags": [1, 2, 3, 4, 5], "name": "x"}
+        self.assertEqual(_split_list_values(values, 5), [values])
+        self.assertEqual(_split_list_values(values, 0), [values])
+
+        chunks = _split_list_values(values, 2)
+        self.assertEqual(len(chunks), 6)
+        self.assertEqual(chunks[0], {"a[]": None, "ids": [1, 2], "flags": [1, 2], "name": "x"})
+        self.assertEqual(chunks[-1], {"a[]": None, "ids": [3], "flags": [5], "name": "x"})
+
+    def test_query_all(self):
+        from fuzion.fake_server import FakeFuzionServer
+
+        with FakeFuzionServer(records=40) as server:
+            attendees = server.resource(Attendee)
+            attendees.list_chunk_size = 10
+
+            # The last chunk only holds attendees of the first one
+            found = attendees.query_all(number=list(range(30)) + [0, 1, 2], status_flag=[0, 1, 2])
+            self.assertEqual(server.requests, 4)
+
+            columns = attendees.query_columns(fields=["number"], number=list(range(25)), numpy=False)
+
+        self.assertEqual([attendee["number"] for attendee in found], list(range(30)))
+        self.assertIsInstance(found[0], Attendee)
+        self.assertEqual(list(columns["number"]), list(range(25)))
+
+
+class TestPayloadLimits(unittest.TestCase):
+    def tearDown(self):
+        import fuzion.resource
+
+        fuzion.resource._payload_sizes.clear()
+
+    @patch("fuzion.resource.requests")
+    def test_refused_before_sending(self, requests):
+        attendee = Attendee(fuzion_event_id="123")
+        attendee.max_payload_bytes = 20
+
+        self.assertEqual(attendee.payload_size({"name": "x", "headers": {}}), len('{"name": "x"}'))
+        with self.assertRaises(PayloadTooLargeError):
+            attendee.post(name="x" * 20)
+        requests.request.assert_not_called()
+
+    @patch("fuzion.resource.requests")
+    def test_limit_learned_per_path(self, requests):
+        requests.request.return_value = success_response([], error=True, status=413, reason="", message="")
+        attendee = Attendee(fuzion_event_id="123")
+        size = attendee.payload_size({"name": "x" * 100})
+
+        with self.assertRaises(PayloadTooLargeError):
+            attendee.post(name="x" * 100)
+        self.assertEqual(attendee.payload_limit, size - 1)
+        self.assertIsNone(Exhibitor(fuzion_event_id="123").payload_limit)
+
+        with self.assertRaises(PayloadTooLargeError):
+            Attendee(fuzion_event_id="123").put(fuzion_attendee_id="A1", name="x" * 100)
+        self.assertEqual(requests.request.call_count, 1)
+
+    def test_post_many_splits_batches(self):
+        from fuzion.fake_server import FakeFuzionServer
+
+        records = [{"name": "Attendee {}".format(i), "notes": "x" * 100} for i in range(50)]
+        with FakeFuzionServer(records=0, max_body_size=2000) as server:
+            attendees = server.resource(Attendee)
+
+            created = attendees.post_many(records)
+            self.assertEqual([attendee["name"] for attendee in created], [r["name"] for r in records])
+            self.assertLess(attendees.payload_limit, attendees.payload_size(records))
+            first_requests = server.requests
+
+            # Split right away with the learned limit
+            self.assertEqual(len(attendees.post_many(records)), 50)
+            self.assertLess(server.requests - first_requests, first_requests)
+            self.assertEqual(attendees.count(), 100)
+
+            with self.assertRaises(PayloadTooLargeError):
+                attendees.post_many([{"notes": "x" * 3000}])
+
+
+    def test_post_many_splits_on_http_413(self):
+        import requests
+        from fuzion.compression import request_body
+
+        class GatewayTransport:
+            """
+            Rejects bodies over 2000 bytes with an HTTP 413, as gateways and proxies do
+            """
+
+            calls = 0
+
+            def request(self, method, url, **kwargs):
+                self.calls += 1
+                body = request_body(kwargs)
+                if len(json.dumps(body)) > 2000:
+                    response = requests.Response()
+                    response.status_code = 413
+                    response.reason = "Request Entity Too Large"
+                    response.url = url
+                    return response
+                return success_response(body)
+
+        records = [{"name": "Attendee {}".format(i), "notes": "x" * 100} for i in range(50)]
+        attendees = Attendee(fuzion_event_id="123", api_key="key", api_secret_key="secret_key")
+        attendees.transport = GatewayTransport()
+
+        created = attendees.post_many(records)
+        self.assertEqual([attendee["name"] for attendee in created], [r["name"] for r in records])
+        self.assertLess(attendees.payload_limit, attendees.payload_size(records))
+        with self.assertRaises(PayloadTooLargeError):
+            attendees.post_many([{"notes": "x" * 3000}])
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        from fuzion.metrics import MetricsRegistry
+
+        self.registry = MetricsRegistry().install()
+
+    def tearDown(self):
+        self.registry.uninstall()
+
+    def test_accepted_encoding(self):
+        from fuzion.compression import accepted_encoding
+
+        self.assertEqual(accepted_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(accepted_encoding("br, gzip;q=0, deflate"), "deflate")
+        self.assertIsNone(accepted_encoding("identity"))
+        self.assertIsNone(accepted_encoding(None))
+
+    @patch("fuzion.resource.requests")
+    def test_large_bodies_are_gzipped(self, requests):
+        import gzip
+
+        attendee = Attendee(fuzion_event_id="123")
+        attendee.compress_request_min_bytes = 100
+
+        attendee.post(name="short")
+        self.assertEqual(requests.request.call_args[1]["json"], {"name": "short"})
+
+        attendee.post(name="x" * 200)
+        kwargs = requests.request.call_args[1]
+        self.assertNotIn("json", kwargs)
+        self.assertEqual(kwargs["headers"]["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(kwargs["data"])), {"name": "x" * 200})
+
+    def test_wire_bytes(self):
+        from fuzion.fake_server import FakeFuzionServer
+
+        with FakeFuzionServer(records=50, compress=True) as server:
+            attendees = server.resource(Attendee)
+            self.assertEqual(len(attendees.query()), 50)
+
+            attendees.compress_request_min_bytes = 1000
+            created = attendees.post(name="New", notes="x" * 5000)
+            self.assertEqual(dict.get(created, "notes"), "x" * 5000)
+
+        metrics = self.registry.snapshot()
+        get, post = metrics["attendees GET"], metrics["attendees POST"]
+        self.assertGreater(get["response_bytes"], 10000)
+        self.assertLess(get["response_wire_bytes"], get["response_bytes"] / 4)
+        self.assertGreater(post["request_bytes"], 5000)
+        self.assertLess(post["request_wire_bytes"], 1000)
+
+
+class TestReplica(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        from fuzion.replica import Replica
+
+        self.replica = Replica(
+            fuzion_event_id="123",
+            resources={"attendee": Attendee},
+            indexes={"attendee": ["registration_number"]},
+        )
+
+    @patch("fuzion.resource.requests")
+    def test_resources_with_get(self, requests):
+        from fuzion.replica import Replica
+
+        replica = Replica(fuzion_event_id="123", resources={"exhibitor": Exhibitor}, indexes={"exhibitor": ["name"]})
+        requests.request.return_value = success_response(
+            [{"fuzion_exhibitor_id": "E1", "name": "One"}, {"fuzion_exhibitor_id": "E2", "name": "Two"}]
+        )
+        replica.load()
+
+        self.assertEqual(replica.get("exhibitor", "E2")["name"], "Two")
+        self.assertEqual([e["fuzion_exhibitor_id"] for e in replica.find("exhibitor", name="One")], ["E1"])
+
+    @patch("fuzion.resource.requests")
+    def test_load_and_read(self, requests):
+        requests.request.return_value = success_response(
+            [
+                {"fuzion_attendee_id": "1", "registration_number": "RN1"},
+                {"fuzion_attendee_id": "2", "registration_number": "RN2"},
+            ]
+        )
+        self.replica.load()
+        requests.reset_mock()
+
+        self.assertEqual(self.replica.get("attendee", "1")["registration_number"], "RN1")
+        self.assertEqual(
+            [a["fuzion_attendee_id"] for a in self.replica.find("attendee", registration_number="RN2")],
+            ["2"],
+        )
+        self.assertEqual(len(self.replica.all("attendee")), 2)
+        requests.request.assert_not_called()
+
+    @patch("fuzion.resource.requests")
+    def test_apply_notifications(self, requests):
+        requests.request.return_value = success_response(
+            [{"fuzion_attendee_id": "1", "registration_number": "RN1"}]
+        )
+        self.replica.load()
+
+        requests.request.return_value = success_response(
+            [{"fuzion_attendee_id": "1", "registration_number": "RN9"}]
+        )
+        self.replica.apply(
+            {"entity_type": "attendee", "entity_operation": "update", "fuzion_attendee_id": "1"}
+        )
+        self.assertEqual(requests.request.call_args[1]["params"], {"fuzion_attendee_id[]": ["1"]})
+        self.assertEqual(self.replica.find("attendee", registration_number="RN1"), [])
+        self.assertEqual(len(self.replica.find("attendee", registration_number="RN9")), 1)
+
+        self.replica.apply(
+            {"entity_type": "attendee", "entity_operation": "delete", "fuzion_attendee_id": "1"}
+        )
+        self.assertIsNone(self.replica.get("attendee", "1"))
+
+    @patch("fuzion.resource.requests")
+    def test_notifications_applied_during_load_are_kept(self, requests):
+        pages = [
+            [
+                {"fuzion_attendee_id": "1", "registration_number": "RN1"},
+                {"fuzion_attendee_id": "2", "registration_number": "RN2"},
+            ],
+            [{"fuzion_attendee_id": "3", "registration_number": "RN3"}],
+        ]
+
+        def iter_pages(resource, page_size=500, start=0, **values):
+            yield pages[0]
+            # Notified while the second page is fetched
+            requests.request.return_value = success_response(
+                [{"fuzion_attendee_id": "1", "registration_number": "RN9"}]
+            )
+            self.replica.apply({"entity_type": "attendee", "entity_operation": "update", "fuzion_attendee_id": "1"})
+            self.replica.apply({"entity_type": "attendee", "entity_operation": "delete", "fuzion_attendee_id": "2"})
+            yield pages[1]
+
+        with patch.object(Attendee, "iter_pages", iter_pages):
+            self.replica.load()
+
+        self.assertEqual(self.replica.get("attendee", "1")["registration_number"], "RN9")
+        self.assertEqual(self.replica.find("attendee", registration_number="RN1"), [])
+        self.assertIsNone(self.replica.get("attendee", "2"))
+        self.assertIsNotNone(self.replica.get("attendee", "3"))
+        self.assertEqual(self.replica._loading, {})
+
+    @patch("fuzion.resource.requests")
+    def test_subscribe(self, requests):
+        self.replica.subscribe(callback_url="https://example.com/hook/")
+        self.assertEqual(requests.request.call_count, 3)
+        self.assertEqual(
+            requests.request.call_args[1]["json"],
+            {
+                "callback_url": "https://example.com/hook/",
+                "entity_type": "attendee",
+                "entity_operation": "delete",
+            },
+        )
+
+
+class TestWebhookReceiver(unittest.TestCase):
+    def post(self, port, bodies, path="/hook/"):
+        import asyncio
+
+        async def send():
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            statuses = []
+            for body in bodies:
+                writer.write(
+                    "POST {} HTTP/1.1\r\nContent-Length: {}\r\n\r\n".format(path, len(body)).encode()
+                    + body
+                )
+                status_line = await reader.readline()
+                while (await reader.readline()) != b"\r\n":
+                    pass
+                statuses.append(int(status_line.split()[1]))
+            writer.close()
+            return statuses
+
+        return send()
+
+    def test_deliveries_are_batched(self):
+        import asyncio
+        from fuzion.receiver import WebhookReceiver
+
+        batches = []
+
+        async def scenario():
+            receiver = WebhookReceiver(batches.append, port=0, path="/hook/", batch_size=2)
+            await receiver.start()
+            statuses = await self.post(
+                receiver.port, [b'{"id": 1}', b'{"id": 2}', b'{"id": 3}', b"not json"]
+            )
+            await receiver.stop()
+            return statuses
+
+        statuses = asyncio.run(scenario())
+        self.assertEqual(statuses, [200, 200, 200, 400])
+        self.assertEqual([event["id"] for batch in batches for event in batch], [1, 2, 3])
+        self.assertTrue(all(len(batch) <= 2 for batch in batches))
+
+    def test_full_queue_is_rejected(self):
+        import asyncio
+        from fuzion.receiver import WebhookReceiver
+
+        async def scenario():
+            blocked = asyncio.Event()
+
+            async def consumer(events):
+                await blocked.wait()
+
+            receiver = WebhookReceiver(
+                consumer, port=0, max_queue_size=1, batch_size=1, enqueue_timeout=0.01
+            )
+            await receiver.start()
+            statuses = await self.post(receiver.port, [b"{}", b"{}", b"{}"], path="/any/")
+            blocked.set()
+            await receiver.stop()
+            return statuses, receiver.rejected
+
+        statuses, rejected = asyncio.run(scenario())
+        self.assertEqual(statuses, [200, 200, 503])
+        self.assertEqual(rejected, 1)
+
+    def test_invalid_content_length(self):
+        import asyncio
+        from fuzion.receiver import WebhookReceiver
+
+        async def send(port, content_length):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write("POST /hook/ HTTP/1.1\r\nContent-Length: {}\r\n\r\n{{}}".format(content_length).encode())
+            response = await reader.read()
+            writer.close()
+            return response
+
+        async def scenario():
+            receiver = WebhookReceiver(lambda events: None, port=0)
+            await receiver.start()
+            responses = [await send(receiver.port, value) for value in ("abc", "-1", "+2")]
+            await receiver.stop()
+            return responses
+
+        for response in asyncio.run(scenario()):
+            self.assertTrue(response.startswith(b"HTTP/1.1 400 "))
+            self.assertIn(b"Connection: close", response)
+
+    def test_lines_over_the_limit(self):
+        import asyncio
+        from fuzion.receiver import WebhookReceiver
+
+        async def send(port, request):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(request)
+            response = await reader.read()
+            writer.close()
+            return response
+
+        async def scenario():
+            receiver = WebhookReceiver(lambda events: None, port=0)
+            await receiver.start()
+            responses = [
+                await send(receiver.port, b"POST /hook/?" + b"a" * 70000 + b" HTTP/1.1\r\n\r\n"),
+                await send(receiver.port, b"POST /hook/ HTTP/1.1\r\nX-Large: " + b"a" * 70000 + b"\r\n\r\n"),
+            ]
+            await receiver.stop()
+            return responses
+
+        uri, header = asyncio.run(scenario())
+        self.assertTrue(uri.startswith(b"HTTP/1.1 414 "))
+        self.assertTrue(header.startswith(b"HTTP/1.1 431 "))
+        self.assertIn(b"Connection: close", header)
+
+
+class TestCoalescer(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        from fuzion.coalesce import Coalescer
+
+        self.flushed = []
+        self.coalescer = Coalescer(
+            resources={"attendee": Attendee, "exhibitor": Exhibitor},
+            on_flush=self.flushed.append,
+            window=60,
+        )
+
+    def tearDown(self):
+        self.coalescer.close()
+
+    def test_notifications_are_deduplicated(self):
+        self.coalescer.add_many(
+            [
+                {"entity_type": "attendee", "entity_operation": "insert", "fuzion_attendee_id": "1"},
+                {"entity_type": "attendee", "entity_operation": "update", "fuzion_attendee_id": "1"},
+                {"entity_type": "attendee", "entity_operation": "update", "fuzion_attendee_id": "2"},
+                {"entity_type": "attendee", "entity_operation": "delete", "fuzion_attendee_id": "3"},
+                {"entity_type": "exhibitor", "entity_operation": "update", "fuzion_exhibitor_id": "E1"},
+                {"entity_type": "unknown", "entity_operation": "update", "entity_id": "X"},
+            ]
+        )
+        self.assertEqual(self.flushed, [])
+
+        self.coalescer.flush()
+        dirty_set = self.flushed[0]
+
+        self.assertEqual(len(dirty_set), 4)
+        self.assertEqual(dirty_set.changed("attendee"), {"1", "2"})
+        self.assertEqual(dirty_set.deleted("attendee"), {"3"})
+        self.assertEqual(self.coalescer.burst_factor, 5 / 4)
+
+        self.coalescer.flush()
+        self.assertEqual(len(self.flushed), 1)
+
+    def test_window_expiry_flushes(self):
+        import time
+        from fuzion.coalesce import Coalescer
+
+        coalescer = Coalescer({"attendee": Attendee}, self.flushed.append, window=0.01)
+        coalescer.add({"entity_type": "attendee", "entity_operation": "update", "fuzion_attendee_id": "1"})
+        deadline = time.time() + 5
+        while not self.flushed and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.flushed[0].changed("attendee"), {"1"})
+
+    @patch("fuzion.resource.requests")
+    def test_refetch_is_batched_per_path(self, requests):
+        requests.request.return_value = success_response([])
+        self.coalescer.add_many(
+            [
+                {"entity_type": "attendee", "entity_operation": "update", "fuzion_attendee_id": "1"},
+                {"entity_type": "attendee", "entity_operation": "update", "fuzion_attendee_id": "2"},
+                {"entity_type": "attendee", "entity_operation": "update", "fuzion_attendee_id": "1"},
+            ]
+        )
+        self.coalescer.flush()
+        self.flushed[0].refetch(fuzion_event_id="123")
+
+        self.assertEqual(requests.request.call_count, 1)
+        self.assertEqual(
+            sorted(requests.request.call_args[1]["params"]["fuzion_attendee_id[]"]), ["1", "2"]
+        )
+
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        from fuzion.caching import SQLiteCache
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = SQLiteCache(os.path.join(self.directory.name, "cache.sqlite3"), ttl=60)
+
+    def tearDown(self):
+        Attendee.cache = None
+        self.directory.cleanup()
+
+    def test_set_get_and_expiry(self):
+        self.cache.set("key", b"value" * 100)
+        self.assertEqual(self.cache.get("key"), b"value" * 100)
+        self.assertLess(self.cache.size(), 100)
+
+        self.cache.set("expired", b"value", ttl=-1)
+        self.assertIsNone(self.cache.get("expired"))
+        self.assertIsNone(self.cache.get("missing"))
+
+    def test_size_eviction(self):
+        self.cache.max_size = 3000
+        for i in range(5):
+            self.cache.set("key{}".format(i), os.urandom(1000))
+        self.cache.evict()
+
+        self.assertLessEqual(self.cache.size(), 3000)
+        self.assertIsNone(self.cache.get("key0"))
+        self.assertIsNotNone(self.cache.get("key4"))
+
+    @patch("fuzion.resource.requests")
+    def test_resource_reads_through_cache(self, requests):
+        Attendee.cache = self.cache
+        requests.request.return_value = success_response([{"fuzion_attendee_id": "1"}])
+
+        first = MockResource.new(Attendee(fuzion_event_id="123")).query()
+        second = MockResource.new(Attendee(fuzion_event_id="123")).query()
+        self.assertEqual(requests.request.call_count, 1)
+        self.assertEqual(second[0].fuzion_attendee_id, first[0].fuzion_attendee_id)
+
+        MockResource.new(Attendee(fuzion_event_id="123")).query(page_size=10)
+        MockResource.new(Attendee(fuzion_event_id="456")).query()
+        self.assertEqual(requests.request.call_count, 3)
+
+        MockResource.new(Attendee(fuzion_event_id="123")).put(fuzion_attendee_id="1", first_name="A")
+        MockResource.new(Attendee(fuzion_event_id="123")).query()
+        self.assertEqual(requests.request.call_count, 5)
+
+
+class TestStaleCache(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        from fuzion.caching import SQLiteCache
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = SQLiteCache(os.path.join(self.directory.name, "cache.sqlite3"), ttl=60)
+        Attendee.cache = self.cache
+
+    def tearDown(self):
+        Attendee.cache = None
+        self.directory.cleanup()
+
+    def age(self, seconds):
+        with self.cache._connection() as connection:
+            connection.execute(
+                "UPDATE fuzion_cache SET expires_at = expires_at - ?", (60 + seconds,)
+            )
+
+    @patch("fuzion.resource.requests")
+    def test_stale_while_revalidate(self, requests):
+        import time
+
+        requests.request.return_value = success_response([{"fuzion_attendee_id": "1"}])
+        MockResource.new(Attendee(fuzion_event_id="123")).query()
+        self.age(Attendee.max_staleness / 2)
+
+        requests.request.return_value = success_response([{"fuzion_attendee_id": "2"}])
+        stale = MockResource.new(Attendee(fuzion_event_id="123")).query()
+        self.assertEqual(stale[0].fuzion_attendee_id, "1")
+
+        from fuzion.resource import _revalidating
+
+        deadline = time.time() + 5
+        while (requests.request.call_count < 2 or _revalidating) and time.time() < deadline:
+            time.sleep(0.01)
+
+        fresh = MockResource.new(Attendee(fuzion_event_id="123")).query()
+        self.assertEqual(fresh[0].fuzion_attendee_id, "2")
+        self.assertEqual(requests.request.call_count, 2)
+
+    @patch("fuzion.resource.requests")
+    def test_stale_if_error(self, requests):
+        requests.request.return_value = success_response([{"fuzion_attendee_id": "1"}])
+        MockResource.new(Attendee(fuzion_event_id="123")).query()
+        self.age(Attendee.max_staleness + 1)
+
+        requests.request.return_value = success_response([], error=True, status=503, reason="", message="down")
+        stale = MockResource.new(Attendee(fuzion_event_id="123")).query()
+        self.assertEqual(stale[0].fuzion_attendee_id, "1")
+
+        self.age(Attendee.stale_if_error)
+        self.assertRaises(
+            ResourceUnavailableError, MockResource.new(Attendee(fuzion_event_id="123")).query
+        )
+
+    def test_stale_if_error_http_status(self):
+        import requests
+
+        class StatusTransport:
+            def __init__(self, status):
+                self.status = status
+
+            def request(self, method, url, **kwargs):
+                if self.status is None:
+                    raise requests.ConnectionError("refused")
+                if self.status == 200:
+                    return success_response([{"fuzion_attendee_id": "1"}])
+                response = requests.Response()
+                response.status_code = self.status
+                response.url = url
+                return response
+
+        attendees = Attendee(fuzion_event_id="123", api_key="key", api_secret_key="secret_key")
+        attendees.transport = StatusTransport(200)
+        attendees.query()
+        self.age(Attendee.max_staleness + 1)
+
+        attendees.transport = StatusTransport(502)
+        self.assertEqual(attendees.query()[0].fuzion_attendee_id, "1")
+
+        # Revoked credentials and deleted objects are not masked by the cache
+        for status in (401, 403, 404):
+            attendees.transport = StatusTransport(status)
+            self.assertRaises(requests.HTTPError, attendees.query)
+
+        attendees.transport = StatusTransport(None)
+        self.assertEqual(attendees.query()[0].fuzion_attendee_id, "1")
+
+
+class TestHooks(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        from fuzion import hooks
+
+        self.hooks = hooks
+        self.events = []
+        hooks.register(self.events.append)
+
+    def tearDown(self):
+        self.hooks.unregister(self.events.append)
+
+    @patch("fuzion.resource.requests")
+    def test_request_event(self, requests):
+        requests.request.return_value = success_response([{"fuzion_attendee_id": "1"}])
+        MockResource.new(Attendee(fuzion_event_id="123")).query()
+
+        event = self.events[0]
+        self.assertEqual(event.resource_class, Attendee)
+        self.assertEqual((event.verb, event.path, event.status), ("GET", "attendees", 200))
+        self.assertEqual(event.response_bytes, len(requests.request.return_value.content))
+        self.assertIsNone(event.error)
+        self.assertEqual(
+            set(event.timings),
+            {"options", "sign", "time_to_first_byte", "download", "decode", "construct", "total"},
+        )
+        self.assertTrue(requests.request.call_args[1]["stream"])
+
+    @patch("fuzion.resource.requests")
+    def test_error_event(self, requests):
+        requests.request.return_value = success_response(
+            [], error=True, status=404, reason="", message="not found"
+        )
+        self.assertRaises(NotFoundError, MockResource.new(Attendee(fuzion_event_id="123")).query)
+        self.assertIsInstance(self.events[0].error, NotFoundError)
+
+    @patch("fuzion.resource.requests")
+    def test_no_hooks_no_timing(self, requests):
+        self.hooks.unregister(self.events.append)
+        MockResource.new(Attendee(fuzion_event_id="123")).query()
+        self.assertEqual(self.events, [])
+        self.assertNotIn("stream", requests.request.call_args[1])
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        from fuzion.metrics import MetricsRegistry
+
+        self.registry = MetricsRegistry().install()
+
+    def tearDown(self):
+        self.registry.uninstall()
+
+    def test_histogram_percentiles(self):
+        from fuzion.metrics import Histogram
+
+        histogram = Histogram(buckets=(0.01, 0.1, 1))
+        for value in [0.005] * 50 + [0.05] * 45 + [0.5] * 5:
+            histogram.observe(value)
+
+        self.assertLessEqual(histogram.percentile(50), 0.01)
+        self.assertTrue(0.01 < histogram.percentile(95) <= 0.1)
+        self.assertTrue(0.1 < histogram.percentile(99) <= 1)
+
+    @patch("fuzion.resource.requests")
+    def test_requests_are_recorded_per_endpoint(self, requests):
+        requests.request.return_value = success_response([{"fuzion_contact_id": "1"}])
+        exhibitor = MockResource.new(Exhibitor(fuzion_event_id="123", fuzion_exhibitor_id="E1"))
+        MockResource.new(exhibitor.contacts).query()
+        MockResource.new(exhibitor.contacts).query()
+
+        requests.request.return_value = success_response(
+            [], error=True, status=429, reason="", message="slow down"
+        )
+        self.assertRaises(
+            TooManyRequestsError,
+            MockResource.new(exhibitor.contacts).put,
+            fuzion_contact_id="1",
+        )
+        self.registry.record_retry("exhibitors/{}/contacts/{}", "PUT")
+
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot["exhibitors/{}/contacts GET"]["requests"], 2)
+        self.assertEqual(
+            snapshot["exhibitors/{}/contacts/{} PUT"]["errors"], {"TooManyRequestsError": 1}
+        )
+        self.assertEqual(snapshot["exhibitors/{}/contacts/{} PUT"]["retries"], 1)
+        self.assertGreater(snapshot["exhibitors/{}/contacts GET"]["response_bytes"], 0)
+
+        text = self.registry.to_prometheus()
+        self.assertIn('fuzion_requests_total{path="exhibitors/{}/contacts",verb="GET"} 2', text)
+        self.assertIn(
+            'fuzion_request_duration_seconds_count{path="exhibitors/{}/contacts",verb="GET"} 2', text
+        )
+
+
+class TestFakeFuzionServer(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        from fuzion.fake_server import FakeFuzionServer
+
+        self.server = FakeFuzionServer(
+            records=25, max_page_size=10, api_key="key", api_secret_key="secret_key"
+        ).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_pagination_and_filters(self):
+        attendees = self.server.resource(Attendee)
+        self.assertEqual(len(attendees.query(page_size=100)), 10)
+        self.assertEqual(len(attendees.query_all(page_size=10)), 25)
+        self.assertEqual(
+            [a["registration_number"] for a in attendees.query(registration_number=["RN1", "RN2"])],
+            ["RN1", "RN2"],
+        )
+
+    def test_crud_and_sub_resources(self):
+        exhibitor = self.server.resource(Exhibitor).post(exhibitor_name="New")
+        self.assertEqual(exhibitor["exhibitor_name"], "New")
+        self.assertEqual(exhibitor.put(exhibitor_name="Newer")["exhibitor_name"], "Newer")
+        self.assertEqual(len(exhibitor.contacts.query()), 5)
+        exhibitor.delete()
+        self.assertRaises(NotFoundError, exhibitor.put, exhibitor_name="Gone")
+
+    def test_signature_and_rate_limit(self):
+        self.assertRaises(
+            UnautorizedError,
+            self.server.resource(Attendee, api_secret_key="wrong").query,
+        )
+
+        self.server.requests = 0
+        self.server.rate_limit_every = 2
+        attendees = self.server.resource(Attendee)
+        attendees.query()
+        self.assertRaises(TooManyRequestsError, attendees.query)
+
+
+class TestCassette(unittest.TestCase):
+    def setUp(self):
+        unittest.TestCase.setUp(self)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "sync.cassette.gz")
+
+    def tearDown(self):
+        fuzion.transport = None
+        self.directory.cleanup()
+
+    def test_record_and_replay(self):
+        import gzip
+        from fuzion.cassette import RecordingTransport, ReplayTransport
+        from fuzion.fake_server import FakeFuzionServer
+
+        with FakeFuzionServer(records=15, max_page_size=10) as server:
+            with RecordingTransport(self.path) as fuzion.transport:
+                attendees = server.resource(Attendee).query_all(page_size=10)
+                exhibitor = server.resource(Exhibitor).post(exhibitor_name="New")
+
+        with gzip.open(self.path, "rt") as f:
+            recorded = f.read()
+        self.assertNotIn("secret_key", recorded)
+        self.assertIn('"partner_app_signature":"REDACTED"', recorded)
+
+        fuzion.transport = ReplayTransport(self.path, latency_scale=0)
+        self.assertEqual(len(fuzion.transport), 3)
+        self.assertEqual(server.resource(Attendee).query_all(page_size=10), attendees)
+        self.assertEqual(server.resource(Exhibitor).post(exhibitor_name="New"), exhibitor)
+
+        self.assertRaises(
+            RecordingNotFoundError, server.resource(Attendee).query, page_size=5
+        )
+
+
+class TestLazyImport(unittest.TestCase):
+    def test_only_used_modules_are_imported(self):
+        import subprocess
+        import sys
+
+        output = subprocess.check_output(
+            [
+                sys.executable,
+                "-c",
+                "import sys; from fuzion import Attendee; "
+                "print(sorted(m for m in sys.modules if m in ('requests', 'gzip', 'concurrent.futures') or m.startswith('fuzion.')))",
+            ]
+        )
+        modules = output.decode().strip()
+        self.assertNotIn("requests", modules)
+        self.assertNotIn("gzip", modules)
+        self.assertNotIn("fuzion.compression", modules)
+        self.assertNotIn("concurrent.futures", modules)
+        self.assertNotIn("fuzion.exhibitor", modules)
+        self.assertIn("fuzion.registration", modules)
+
+    def test_public_attributes(self):
+        self.assertIs(fuzion.Exhibitor, Exhibitor)
+        self.assertIn("PlotType", dir(fuzion))
+        self.assertRaises(AttributeError, getattr, fuzion, "Missing")
+
+
+class TestPooledTransport(unittest.TestCase):
+    def tearDown(self):
+        fuzion.transport = None
+
+    def test_connections_are_reused(self):
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.transports import PooledTransport
+
+        fuzion.transport = PooledTransport()
+        with FakeFuzionServer(records=5) as server:
+            server.resource(Attendee).query()
+            session = fuzion.transport.session
+            server.resource(Attendee).query()
+            self.assertIs(fuzion.transport.session, session)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires os.fork")
+    def test_child_process_builds_its_own_session(self):
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.transports import PooledTransport
+
+        fuzion.transport = PooledTransport()
+        with FakeFuzionServer(records=5) as server:
+            server.resource(Attendee).query()
+            parent_session = id(fuzion.transport.session)
+
+            read_end, write_end = os.pipe()
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    unused = fuzion.transport._session is None
+                    count = len(server.resource(Attendee).query())
+                    reused = id(fuzion.transport.session) == parent_session
+                    os.write(write_end, json.dumps([unused, count, reused]).encode())
+                finally:
+                    os._exit(0)
+
+            os.waitpid(pid, 0)
+            os.close(write_end)
+            unused, count, reused = json.loads(os.read(read_end, 1024))
+            os.close(read_end)
+
+            self.assertTrue(unused)
+            self.assertEqual(count, 5)
+            self.assertFalse(reused)
+            self.assertEqual(id(fuzion.transport.session), parent_session)
+
+
+class TestClients(unittest.TestCase):
+    def test_scheduler_hands_slots_to_tenants_in_turn(self):
+        import threading
+        import time
+        from fuzion.clients import FairScheduler
+
+        scheduler = FairScheduler(concurrency=1)
+        scheduler.acquire("busy")
+
+        order = []
+
+        def request(tenant):
+            with scheduler.slot(tenant):
+                order.append(tenant)
+
+        threads = []
+        for count, tenant in enumerate(["export", "export", "export", "interactive"], 1):
+            thread = threading.Thread(target=request, args=(tenant,))
+            thread.start()
+            threads.append(thread)
+            while scheduler.waiting < count:
+                time.sleep(0.001)
+
+        scheduler.release()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(order, ["export", "interactive", "export", "export"])
+        self.assertEqual(scheduler.active, 0)
+
+    def test_rate_limiter(self):
+        from fuzion.clients import RateLimiter
+
+        limiter = RateLimiter(rate=100, burst=2)
+        waited = sum(limiter.acquire() for _ in range(6))
+        self.assertGreater(waited, 0.03)
+
+    def test_registry_keeps_one_client_per_tenant(self):
+        from fuzion.clients import ClientRegistry
+
+        clients = ClientRegistry(rate=50)
+        first = clients.get("key1", "secret1", "host1/")
+        self.assertIs(clients.get("key1", "secret1", "host1/"), first)
+        self.assertIsNot(clients.get("key2", "secret2", "host1/"), first)
+        self.assertIsNot(clients.get("key1", "secret1", "host2/"), first)
+        self.assertEqual(len(clients), 3)
+        self.assertEqual(first.rate_limiter.rate, 50)
+        self.assertIs(first.scheduler, clients.scheduler)
+
+        clients.remove("key1", "secret1", "host1/")
+        self.assertEqual(len(clients), 2)
+
+    def test_resources_use_their_client(self):
+        from fuzion.clients import ClientRegistry
+        from fuzion.fake_server import FakeFuzionServer
+
+        with FakeFuzionServer(records=5) as server, tempfile.TemporaryDirectory() as cache_dir:
+            clients = ClientRegistry(concurrency=2, cache_dir=cache_dir)
+            tenant = clients.get("key1", "secret1", server.host, scheme="http")
+            other = clients.get("key2", "secret2", server.host, scheme="http")
+
+            exhibitors = tenant.resource(Exhibitor, "EV1").query()
+            self.assertEqual(len(exhibitors), 5)
+            self.assertIs(exhibitors[0].client, tenant)
+            self.assertIs(exhibitors[0].contacts.client, tenant)
+            self.assertEqual(exhibitors[0].contacts.api_key, "key1")
+
+            requests = server.requests
+            tenant.resource(Exhibitor, "EV1").query()
+            self.assertEqual(server.requests, requests)
+
+            other.resource(Exhibitor, "EV1").query()
+            self.assertEqual(server.requests, requests + 1)
+            self.assertEqual(clients.scheduler.active, 0)
+            clients.close()
+
+
+class TestExportOrchestrator(unittest.TestCase):
+    def test_errors_can_be_pickled(self):
+        import pickle
+
+        error = TooManyRequestsError(429, "429", "Too many requests", None, None)
+        unpickled = pickle.loads(pickle.dumps(error))
+        self.assertIsInstance(unpickled, TooManyRequestsError)
+        self.assertEqual(unpickled.status, 429)
+        self.assertEqual(str(unpickled), "Too many requests")
+
+    def test_server_capped_page_size(self):
+        import multiprocessing
+        from fuzion.export import ExportOrchestrator
+        from fuzion.fake_server import FakeFuzionServer
+
+        with FakeFuzionServer(records=1200, max_page_size=500) as server, tempfile.TemporaryDirectory() as directory:
+            progress = ExportOrchestrator(
+                ["EV1"],
+                resources=[Attendee],
+                directory=directory,
+                page_size=1000,
+                max_workers=2,
+                host=server.host,
+                scheme="http",
+                mp_context=multiprocessing.get_context("fork"),
+            ).run()
+            with open(os.path.join(directory, "EV1", "Attendee.ndjson")) as f:
+                numbers = [json.loads(line)["number"] for line in f]
+
+        self.assertEqual(progress.errors, [])
+        self.assertEqual(progress.records, 1200)
+        self.assertEqual(numbers, list(range(1200)))
+
+    def test_listable_resources(self):
+        from fuzion.export import listable_resources
+
+        resources = listable_resources()
+        self.assertIn(Attendee, resources)
+        self.assertIn(NotificationWebhook, resources)
+        self.assertTrue(all("{}" not in cls.path for cls in resources))
+
+    def test_export(self):
+        import multiprocessing
+        from fuzion.export import ExportOrchestrator
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.metrics import MetricsRegistry
+
+        reports = []
+        with FakeFuzionServer(records=23, rate_limit_every=7) as server, tempfile.TemporaryDirectory() as directory:
+            orchestrator = ExportOrchestrator(
+                ["EV1", "EV2"],
+                resources=[Attendee, Exhibitor, NotificationWebhook],
+                directory=directory,
+                page_size=5,
+                max_workers=2,
+                rate=1000,
+                backoff=0.01,
+                progress=reports.append,
+                host=server.host,
+                scheme="http",
+                mp_context=multiprocessing.get_context("fork"),
+            )
+            registry = MetricsRegistry()
+            with patch("fuzion.metrics.registry", registry):
+                progress = orchestrator.run()
+
+            self.assertEqual(progress.errors, [])
+            self.assertEqual(progress.exports_done, 6)
+            self.assertEqual(progress.pages_done, 2 * (5 + 5 + 1))
+            self.assertEqual(progress.records, 6 * 23)
+            self.assertGreater(progress.retries, 0)
+            self.assertEqual(
+                sum(endpoint["retries"] for endpoint in registry.snapshot().values()), progress.retries
+            )
+            self.assertIs(reports[-1], progress)
+
+            for fuzion_event_id in ["EV1", "EV2"]:
+                with open(os.path.join(directory, fuzion_event_id, "Attendee.ndjson")) as f:
+                    records = [json.loads(line) for line in f]
+                self.assertEqual([record["number"] for record in records], list(range(23)))
+
+    def test_failed_exports_are_reported(self):
+        import multiprocessing
+        from fuzion.export import ExportOrchestrator
+        from fuzion.fake_server import FakeFuzionServer
+
+        with FakeFuzionServer(records=3, api_key="key", api_secret_key="other") as server, \
+                tempfile.TemporaryDirectory() as directory:
+            progress = ExportOrchestrator(
+                ["EV1"],
+                resources=[Attendee],
+                directory=directory,
+                max_workers=1,
+                host=server.host,
+                scheme="http",
+                mp_context=multiprocessing.get_context("fork"),
+            ).run()
+
+        self.assertEqual(progress.exports_done, 1)
+        self.assertEqual(len(progress.errors), 1)
+        self.assertIsInstance(progress.errors[0][2], UnautorizedError)
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_snapshot(self):
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.snapshot import snapshot
+
+        with FakeFuzionServer(records=23) as server:
+            event = snapshot(
+                "EV1",
+                resources=[Attendee, Exhibitor, PlotType, NotificationWebhook],
+                page_size=5,
+                concurrency=4,
+                host=server.host,
+                scheme="http",
+            )
+
+        self.assertEqual(len(event), 4)
+        self.assertEqual([attendee["number"] for attendee in event[Attendee]], list(range(23)))
+        self.assertEqual(len(event["NotificationWebhook"]), 23)
+        self.assertIsInstance(event[Exhibitor][0], Exhibitor)
+        self.assertEqual(event.records, 4 * 23)
+
+        timing = event.timings["Attendee"]
+        self.assertEqual(timing.pages, 5)
+        self.assertEqual(timing.records, 23)
+        self.assertGreater(timing.request_time, 0)
+        self.assertEqual(event.timings["NotificationWebhook"].pages, 1)
+
+    def test_snapshot_through_client(self):
+        from fuzion.clients import ClientRegistry
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.snapshot import snapshot
+
+        with FakeFuzionServer(records=12) as server:
+            client = ClientRegistry(concurrency=2).get("key1", "secret1", server.host, scheme="http")
+            event = snapshot("EV1", resources=[Attendee], page_size=5, client=client)
+
+        self.assertEqual(len(event[Attendee]), 12)
+        self.assertIs(event[Attendee][0].client, client)
+
+    def test_pages_up_to_total_count(self):
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.snapshot import snapshot
+
+        with FakeFuzionServer(records=20) as server:
+            event = snapshot(
+                "EV1", resources=[Attendee], page_size=5, window=8, host=server.host, scheme="http"
+            )
+            # No page requested past the 20 attendees, not even an empty one
+            self.assertEqual(server.requests, 4)
+        self.assertEqual(len(event[Attendee]), 20)
+
+    def test_server_capped_page_size(self):
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.snapshot import snapshot
+
+        with FakeFuzionServer(records=1200, max_page_size=500) as server:
+            event = snapshot("EV1", resources=[Attendee], page_size=1000, host=server.host, scheme="http")
+            self.assertEqual(server.requests, 3)
+
+        self.assertEqual([attendee["number"] for attendee in event[Attendee]], list(range(1200)))
+        self.assertEqual(event.timings["Attendee"].pages, 3)
+
+    def test_duplicates_across_pages_are_dropped(self):
+        from fuzion.snapshot import snapshot
+
+        pages = {
+            "0": [{"fuzion_attendee_id": "A1"}, {"fuzion_attendee_id": "A2"}],
+            "2": [{"fuzion_attendee_id": "A2"}, {"fuzion_attendee_id": "A3"}],
+            "4": [],
+        }
+
+        def request(method, url, headers=None, **kwargs):
+            return success_response(pages.get(headers["start"], []), total_count=3)
+
+        with patch("fuzion.resource.requests") as requests:
+            requests.request.side_effect = request
+            event = snapshot("EV1", resources=[Attendee], page_size=2)
+
+        self.assertEqual(
+            [attendee["fuzion_attendee_id"] for attendee in event[Attendee]], ["A1", "A2", "A3"]
+        )
+
+    def test_errors(self):
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.snapshot import snapshot
+
+        with FakeFuzionServer(records=3, api_key="key", api_secret_key="other") as server:
+            with self.assertRaises(UnautorizedError):
+                snapshot("EV1", resources=[Attendee], host=server.host, scheme="http")
+
+            event = snapshot(
+                "EV1", resources=[Attendee], raise_errors=False, host=server.host, scheme="http"
+            )
+        self.assertNotIn(Attendee, event)
+        self.assertIsInstance(event.errors["Attendee"], UnautorizedError)
+
+
+class TestCheckpointedExport(unittest.TestCase):
+    def setUp(self):
+        from fuzion.fake_server import FakeFuzionServer
+
+        self.server = FakeFuzionServer(records=23).start()
+        self.directory = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.directory, "Attendee.state")
+
+    def tearDown(self):
+        import shutil
+
+        self.server.stop()
+        shutil.rmtree(self.directory)
+
+    def read(self):
+        with open(os.path.join(self.directory, "Attendee.ndjson")) as f:
+            return [json.loads(line)["number"] for line in f]
+
+    def test_export(self):
+        from fuzion.sinks import NDJSONSink
+
+        with NDJSONSink(self.directory) as sink:
+            count = self.server.resource(Attendee).export(sink, checkpoint=self.state_path, page_size=5)
+
+        self.assertEqual(count, 23)
+        self.assertEqual(self.read(), list(range(23)))
+        self.assertFalse(os.path.exists(self.state_path))
+
+    def test_resume_after_a_crash(self):
+        from fuzion.sinks import NDJSONSink
+
+        class CrashingSink(NDJSONSink):
+            writes = 0
+
+            def write(self, name, records):
+                NDJSONSink.write(self, name, records)
+                self.writes += 1
+                if self.writes == 3:
+                    # The page is written but its checkpoint is not saved
+                    self.flush(name)
+                    raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt), CrashingSink(self.directory) as sink:
+            self.server.resource(Attendee).export(sink, checkpoint=self.state_path, page_size=5)
+        self.assertEqual(len(self.read()), 15)
+
+        self.server.requests = 0
+        with NDJSONSink(self.directory) as sink:
+            count = self.server.resource(Attendee).export(sink, checkpoint=self.state_path, page_size=5)
+
+        self.assertEqual(count, 23)
+        self.assertEqual(self.read(), list(range(23)))
+        # Pages 10, 15 and 20 are fetched again
+        self.assertEqual(self.server.requests, 3)
+
+    def test_checkpoint_of_another_export(self):
+        from fuzion.export import Checkpoint
+        from fuzion.sinks import NDJSONSink
+
+        Checkpoint(self.state_path).save(
+            {"resource": "Attendee", "fuzion_event_id": "EV1", "page_size": 100, "values": {},
+             "start": 100, "position": 0, "records": 100}
+        )
+        with self.assertRaises(ImproperlyConfigured), NDJSONSink(self.directory) as sink:
+            self.server.resource(Attendee).export(sink, checkpoint=self.state_path, page_size=5)
+
+
+class TestSinks(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+
+        shutil.rmtree(self.directory)
+
+    def test_flatten(self):
+        from fuzion.sinks import flatten
+
+        self.assertEqual(
+            flatten({"id": 1, "contact": {"name": "J", "address": {"city": "C"}}, "empty": {}, "tags": [1]}),
+            {"id": 1, "contact.name": "J", "contact.address.city": "C", "tags": [1]},
+        )
+
+    def test_ndjson(self):
+        from fuzion.sinks import NDJSONSink, encode_ndjson
+
+        with NDJSONSink(self.directory, flatten=True) as sink:
+            sink.write("Attendee", [{"id": 1, "contact": {"name": "J"}}])
+            sink.write_ndjson("Attendee", encode_ndjson([{"id": 2, "contact": {"name": "K"}}]))
+
+        with open(os.path.join(self.directory, "Attendee.ndjson")) as f:
+            self.assertEqual(
+                [json.loads(line) for line in f],
+                [{"id": 1, "contact.name": "J"}, {"id": 2, "contact.name": "K"}],
+            )
+
+    def test_csv(self):
+        import csv
+        from fuzion.sinks import CSVSink
+
+        with CSVSink(self.directory) as sink:
+            sink.write("Attendee", [{"id": 1, "contact": {"name": "J"}, "tags": ["a"], "note": None}])
+            sink.write("Attendee", [{"id": 2, "contact": {"name": "K"}}])
+            # A nested object null or empty on a later page is blank under its dotted columns
+            sink.write("Attendee", [{"id": 4, "contact": None, "note": "n"}, {"id": 5, "contact": {}}])
+            # A field first seen after the header was written is not dropped silently
+            with self.assertRaises(ImproperlyConfigured):
+                sink.write("Attendee", [{"id": 3, "contact": {"name": "L", "email": "l@example.com"}}])
+
+        with open(os.path.join(self.directory, "Attendee.csv"), newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(
+            rows,
+            [
+                ["id", "contact.name", "tags", "note"],
+                ["1", "J", '["a"]', ""],
+                ["2", "K", "", ""],
+                ["4", "", "", "n"],
+                ["5", "", "", ""],
+            ],
+        )
+
+        with CSVSink(self.directory, columns=["id", "contact.name"]) as sink:
+            sink.write("Exhibitor", [{"id": 1, "contact": {"name": "J"}, "unknown": "x"}])
+        with open(os.path.join(self.directory, "Exhibitor.csv"), newline="") as f:
+            self.assertEqual(list(csv.reader(f)), [["id", "contact.name"], ["1", "J"]])
+
+    def test_compressed_csv_export_resumes(self):
+        import csv
+        import gzip
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.sinks import CSVSink
+
+        state_path = os.path.join(self.directory, "Attendee.state")
+
+        class CrashingSink(CSVSink):
+            writes = 0
+
+            def write(self, name, records):
+                CSVSink.write(self, name, records)
+                self.writes += 1
+                if self.writes == 3:
+                    raise KeyboardInterrupt
+
+        with FakeFuzionServer(records=23) as server:
+            with self.assertRaises(KeyboardInterrupt), CrashingSink(self.directory, compress=True) as sink:
+                server.resource(Attendee).export(sink, checkpoint=state_path, page_size=5)
+            with CSVSink(self.directory, compress=True) as sink:
+                server.resource(Attendee).export(sink, checkpoint=state_path, page_size=5)
+
+        with gzip.open(os.path.join(self.directory, "Attendee.csv.gz"), "rt", newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual([int(row["number"]) for row in rows], list(range(23)))
+        self.assertEqual(rows[3]["contact.first_name"], "First3")
+
+    def test_export_memory_is_bounded(self):
+        import tracemalloc
+        from fuzion.fake_server import FakeFuzionServer
+        from fuzion.sinks import NDJSONSink
+
+        with FakeFuzionServer(records=3000, record_size=500) as server:
+            attendees = server.resource(Attendee)
+            attendees.query(page_size=1)  # generates the server's records
+
+            tracemalloc.start()
+            with NDJSONSink(self.directory, compress=True) as sink:
+                count = attendees.export(sink, page_size=100)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        self.assertEqual(count, 3000)
+        # A page of 100 records, decoded and encoded, far from the 3000 records
+        self.assertLess(peak, 3000 * 500)
+
+
+class TestColumnar(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "snapshot.fzc")
+
+    def tearDown(self):
+        import shutil
+
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        from fuzion.columnar import ColumnarSnapshot, ColumnarWriter
+
+        records = [
+            {"id": "B", "number": 1, "amount": 1, "paid": True, "mixed": 1, "contact": {"name": "J"}, "tags": ["a"]},
+            {"id": "A", "number": 2, "amount": 2.5, "paid": False, "mixed": "two", "contact": {"name": "K"}},
+            {"id": "C", "number": None, "mixed": True, "extra": "e"},
+        ]
+        with ColumnarWriter(self.path, object_id_attr_name="id", metadata={"resource": "Test"}) as writer:
+            writer.add_many(records)
+
+        with ColumnarSnapshot(self.path) as snapshot:
+            self.assertEqual(len(snapshot), 3)
+            self.assertEqual(snapshot.metadata, {"resource": "Test"})
+            self.assertEqual(
+                snapshot[0],
+                {"id": "B", "number": 1, "amount": 1.0, "paid": True, "mixed": 1,
+                 "contact": {"name": "J"}, "tags": ["a"], "extra": None},
+            )
+            self.assertEqual(snapshot.get("C")["extra"], "e")
+            self.assertEqual(snapshot.get("A")["contact"], {"name": "K"})
+            self.assertIsNone(snapshot.get("D"))
+
+            self.assertEqual(snapshot.column("number").type, "int")
+            self.assertEqual(snapshot.column("amount").type, "float")
+            self.assertEqual(list(snapshot.column("mixed")), [1, "two", True])
+            self.assertEqual(snapshot.column("contact.name")[-2:], ["K", None])
+            self.assertEqual(list(snapshot.column("amount").raw), [1.0, 2.5, 0.0])
+            self.assertEqual([record["id"] for record in snapshot[1:]], ["A", "C"])
+
+    def test_round_trip_sometimes_empty_nested_fields(self):
+        from fuzion.columnar import ColumnarSnapshot, ColumnarWriter
+
+        for records in (
+            [
+                {"id": "a", "contact": {}},
+                {"id": "b", "contact": {"first_name": "J", "address": {"city": "C"}}},
+                {"id": "c", "contact": None},
+                {"id": "d", "contact": {"address": {}}},
+            ],
+            [
+                {"id": "b", "contact": {"first_name": "J", "address": {"city": "C"}}},
+                {"id": "d", "contact": {"address": {}}},
+                {"id": "a", "contact": {}},
+                {"id": "c", "contact": None},
+            ],
+        ):
+            with ColumnarWriter(self.path, object_id_attr_name="id") as writer:
+                writer.add_many(records)
+
+            with ColumnarSnapshot(self.path) as snapshot:
+                self.assertEqual(list(snapshot), records)
+
+    def test_not_a_snapshot(self):
+        from fuzion.columnar import ColumnarSnapshot
+
+        with open(self.path, "wb") as f:
+            f.write(b"{}" * 16)
+        with self.assertRaises(ImproperlyConfigured):
+            ColumnarSnapshot(self.path)
+
+    def test_write_resource(self):
+        from fuzion.columnar import ColumnarSnapshot, write_resource
+        from fuzion.fake_server import FakeFuzionServer
+
+        with FakeFuzionServer(records=23) as server:
+            count = write_resource(server.resource(Attendee), self.path, page_size=5)
+
+        self.assertEqual(count, 23)
+        with ColumnarSnapshot(self.path) as attendees:
+            self.assertEqual(attendees.metadata["resource"], "Attendee")
+            self.assertEqual(attendees.object_id_attr_name, "fuzion_attendee_id")
+            self.assertEqual(sum(attendees.column("number").raw), sum(range(23)))
+            attendee = attendees.get(attendees[7]["fuzion_attendee_id"])
+            self.assertEqual(attendee["contact"]["first_name"], "First7")
+
+
+class TestQueryColumns(unittest.TestCase):
+    payload = [
+        {"fuzion_transaction_id": "T1", "amount": 10, "quantity": 1, "paid": True, "currency": "USD"},
+        {"fuzion_transaction_id": "T2", "amount": 12.5, "paid": False, "currency": "EUR",
+         "option": {"code": "OPT1"}},
+        {"fuzion_transaction_id": "T3", "amount": 5, "quantity": 3, "currency": "USD"},
+    ]
+
+    @patch("fuzion.resource.requests")
+    def test_without_numpy(self, requests):
+        import array
+
+        requests.request.return_value = success_response(self.payload)
+        with patch.object(Transaction, "new") as new:
+            columns = Transaction(fuzion_event_id="123").query_columns(numpy=False)
+            new.assert_not_called()
+
+        self.assertEqual(columns.rows, 3)
+        self.assertEqual(columns["amount"], array.array("d", [10.0, 12.5, 5.0]))
+        self.assertEqual(columns["quantity"], [1, None, 3])
+        self.assertEqual(columns["paid"], [True, False, None])
+        self.assertEqual(columns["currency"], ["USD", "EUR", "USD"])
+        self.assertEqual(columns["option.code"], [None, "OPT1", None])
+
+    @patch("fuzion.resource.requests")
+    def test_fields(self, requests):
+        requests.request.return_value = success_response(self.payload)
+        columns = Transaction(fuzion_event_id="123").query_columns(
+            fields=["amount", "missing"], numpy=False
+        )
+        self.assertEqual(sorted(columns), ["amount", "missing"])
+        self.assertEqual(columns["missing"], [None, None, None])
+
+    @patch("fuzion.resource.requests")
+    def test_paginates(self, requests):
+        requests.request.side_effect = [
+            success_response(self.payload[:2], total_count=3),
+            success_response(self.payload[2:], total_count=3),
+        ]
+        columns = Transaction(fuzion_event_id="123").query_columns(page_size=2, numpy=False)
+        self.assertEqual(columns["fuzion_transaction_id"], ["T1", "T2", "T3"])
+        self.assertEqual(requests.request.call_count, 2)
+
+    @unittest.skipUnless(numpy_available(), "requires numpy")
+    @patch("fuzion.resource.requests")
+    def test_numpy(self, requests):
+        import numpy
+
+        requests.request.return_value = success_response(self.payload)
+        columns = Transaction(fuzion_event_id="123").query_columns(numpy=True)
+
+        self.assertEqual(columns["amount"].dtype, numpy.float64)
+        self.assertEqual(columns["amount"].sum(), 27.5)
+        self.assertEqual(numpy.nansum(columns["quantity"]), 4)
+        self.assertEqual(list(columns["currency"] == "USD"), [True, False, True])
+
+    @unittest.skipIf(numpy_available(), "numpy is installed")
+    @patch("fuzion.resource.requests")
+    def test_numpy_required(self, requests):
+        requests.request.return_value = success_response(self.payload)
+        with self.assertRaises(ImportError):
+            Transaction(fuzion_event_id="123").query_columns(numpy=True)
+
+
+class TestResultList(unittest.TestCase):
+    payload = [
+        {"fuzion_transaction_id": "T1", "amount": 10},
+        {"fuzion_transaction_id": "T2", "amount": 12},
+        {"fuzion_transaction_id": "T3", "amount": 5},
+    ]
+
+    @patch("fuzion.resource.requests")
+    def test_builds_objects_on_access(self, requests):
+        from fuzion.results import ResultList
+
+        requests.request.return_value = success_response(self.payload)
+        transactions = Transaction(fuzion_event_id="123", api_key="other").query()
+
+        self.assertIsInstance(transactions, ResultList)
+        self.assertEqual(len(transactions), 3)
+        self.assertEqual(transactions.records[1]["amount"], 12)
+        self.assertEqual([type(item) for item in list.__iter__(transactions)], [dict, dict, dict])
+
+        transaction = transactions[-1]
+        self.assertEqual([type(item) for item in list.__iter__(transactions)], [dict, dict, Transaction])
+
+        self.assertIsInstance(transaction, Transaction)
+        self.assertEqual(transaction.internal_object_id, "T3")
+        self.assertEqual(transaction.fuzion_event_id, "123")
+        self.assertEqual(transaction.api_key, "other")
+        self.assertIs(transactions[2], transaction)
+        with self.assertRaises(IndexError):
+            transactions[3]
+
+    @patch("fuzion.resource.requests")
+    def test_sequence(self, requests):
+        requests.request.return_value = success_response(self.payload)
+        transactions = Transaction(fuzion_event_id="123").query()
+        first = transactions[0]
+
+        sliced = transactions[:2]
+        self.assertEqual(len(sliced), 2)
+        self.assertIs(sliced[0], first)
+        self.assertEqual([dict.get(t, "amount") for t in transactions], [10, 12, 5])
+        self.assertEqual(transactions, [Transaction("123", **record) for record in self.payload])
+        self.assertEqual(len(transactions + sliced), 5)
+        self.assertEqual(json.loads(json.dumps(transactions.records)), self.payload)
+
+    @patch("fuzion.resource.requests")
+    def test_list_compatibility(self, requests):
+        requests.request.return_value = success_response(self.payload)
+        transactions = Transaction(fuzion_event_id="123").query()
+        first = transactions[0]
+
+        self.assertIsInstance(transactions, list)
+        self.assertEqual(json.loads(json.dumps(transactions)), self.payload)
+        self.assertIs(transactions[0], first)
+
+        transactions.append({"fuzion_transaction_id": "T4", "amount": 1})
+        self.assertIsInstance(transactions[3], Transaction)
+        self.assertEqual(transactions.pop().internal_object_id, "T4")
+
+        transactions.sort(key=lambda t: dict.get(t, "amount"))
+        self.assertEqual([t.internal_object_id for t in transactions], ["T3", "T1", "T2"])
+        self.assertIn(first, transactions)
+        self.assertEqual(transactions.index(first), 1)
+        self.assertEqual([t.internal_object_id for t in reversed(transactions)], ["T2", "T1", "T3"])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,92 @@
+"""
+Transports that send the requests of `Resource._request` (see `fuzion.transport`).
+
+`PooledTransport` keeps warm connections in a `requests.Session` and is safe to create
+before forking (gunicorn/celery prefork workers): every process lazily builds its own
+session on its first request, a session is never shared across a fork.
+
+Usage:
+-----
+import fuzion
+from fuzion.transports import PooledTransport
+
+fuzion.transport = PooledTransport(pool_maxsize=20, timeout=30)
+"""
+
+import os
+import threading
+import weakref
+
+from fuzion import resource
+
+
+def _forget_session(transport_ref):
+    transport = transport_ref()
+    if transport is not None:
+        transport._forget_session()
+
+
+class PooledTransport:
+    """
+    Sends requests through a per-process `requests.Session`.
+
+    `pool_connections` and `pool_maxsize` size the connection pool (see `requests.adapters.HTTPAdapter`),
+    `timeout`, if set, is used for every request not given its own
+    """
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, timeout=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+        if hasattr(os, "register_at_fork"):
+            transport = weakref.ref(self)
+            os.register_at_fork(after_in_child=lambda: _forget_session(transport))
+
+    def _forget_session(self):
+        # The parent's connections must not be used (nor closed) by the child,
+        # just drop the reference, a new session is built on the next request
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _build_session(self):
+        requests = resource._requests()
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @property
+    def session(self):
+        """
+        The session of the current process, built on first use
+        """
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def request(self, method, url, **kwargs):
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def close(self):
+        """
+        Closes the connections of the current process' session
+        """
+        if self._session is not None and self._pid == os.getpid():
+            self._session.close()
+        self._session = None
+        self._pid = None
@@ -14,6 +14,7 @@ setuptools.setup(
     url="https://github.com/everthere-co/fuzion",
     packages=setuptools.find_packages(),
     install_requires=["requests"],
+    extras_require={"numpy": ["numpy"]},
     python_requires=">=3",
     classifiers=[
         "Development Status :: 3 - Alpha",